@@ -0,0 +1,154 @@
+# dicom_sources.py
+import os
+import io
+import csv
+import tarfile
+import zipfile
+
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz')
+DICOM_EXTENSIONS = ('.dcm', '.DCM')
+
+# 128 byte preamble followed by the DICM prefix
+PREAMBLE_SIZE = 132
+
+# Columns of the DICOM file index written by tools/DICOMRenamer.py
+FILE_INDEX_COLUMNS = ('Path', 'Size', 'Modality', 'SOPClassUID', 'StudyDate')
+
+
+def is_archive(path):
+    """Check if path is a ZIP or TAR archive by its extension"""
+    return path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def is_file_index(path):
+    """Check if path is a DICOM file index (CSV) instead of a directory"""
+    return os.path.isfile(path) and path.lower().endswith('.csv')
+
+
+def write_file_index(path, rows):
+    """Write DICOM file index rows (dicts with FILE_INDEX_COLUMNS) through a temporary file"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=FILE_INDEX_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+
+
+def read_file_index(path):
+    """Yield rows of a DICOM file index"""
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        missing = set(FILE_INDEX_COLUMNS) - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError(f"{path} is not a DICOM file index, missing columns {sorted(missing)}")
+        yield from reader
+
+
+def has_dicom_preamble(header):
+    """Check the DICM prefix after the 128 byte preamble"""
+    return len(header) >= PREAMBLE_SIZE and header[128:132] == b'DICM'
+
+
+def source_name(source):
+    """Get printable name of a file path or an archive member Dataset"""
+    if isinstance(source, str):
+        return source
+    return str(getattr(source, 'filename', None) or source.get('SOPInstanceUID', ''))
+
+
+def read_member(fileobj, name, seekable=True, debug=False):
+    """Header-only read of an archive member stream, None if it is not DICOM"""
+    import pydicom
+    header = fileobj.read(PREAMBLE_SIZE)
+    if not has_dicom_preamble(header):
+        return None
+    try:
+        if seekable:
+            fileobj.seek(0)
+        else:
+            # Streamed tar members can't seek back, continue from the bytes read so far
+            fileobj = io.BytesIO(header + fileobj.read())
+        dcm = pydicom.dcmread(fileobj, stop_before_pixels=True)
+    except Exception as e:
+        if debug:
+            print(f"DEBUG: Error reading archive member {name}: {str(e)}")
+        return None
+    dcm.filename = name
+    return dcm
+
+
+def iter_zip(path, debug=False):
+    """Yield header-only Datasets of DICOM members of a ZIP archive"""
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or info.file_size < PREAMBLE_SIZE:
+                continue
+            with archive.open(info) as member:
+                dcm = read_member(member, f"{path}/{info.filename}", True, debug)
+            if dcm is not None:
+                yield dcm
+
+
+def iter_tar(path, debug=False):
+    """Yield header-only Datasets of DICOM members of a TAR archive in one sequential pass"""
+    with tarfile.open(path, mode='r|*') as archive:
+        for info in archive:
+            if not info.isfile() or info.size < PREAMBLE_SIZE:
+                continue
+            member = archive.extractfile(info)
+            if member is None:
+                continue
+            dcm = read_member(member, f"{path}/{info.name}", False, debug)
+            if dcm is not None:
+                yield dcm
+
+
+def iter_archive(path, debug=False, broken=None):
+    """Yield header-only Datasets of DICOM members of a ZIP or TAR archive
+
+    Archives that can't be read are appended to broken as (path, error).
+    """
+    if debug:
+        print(f"DEBUG: Reading archive {path}")
+    try:
+        if path.lower().endswith('.zip'):
+            yield from iter_zip(path, debug)
+        else:
+            yield from iter_tar(path, debug)
+    except (zipfile.BadZipFile, tarfile.TarError, OSError) as e:
+        if broken is not None:
+            broken.append((path, str(e)))
+        if debug:
+            print(f"DEBUG: Error reading archive {path}: {str(e)}")
+
+
+def iter_source_files(directory, recursive=True):
+    """Yield paths of .dcm files and archives in a directory, or the path itself if it is a file"""
+    if os.path.isfile(directory):
+        yield directory
+        return
+
+    if recursive:
+        walk = os.walk(directory)
+    else:
+        walk = [(directory, None, [f for f in os.listdir(directory)
+                                   if os.path.isfile(os.path.join(directory, f))])]
+    for root, _, files in walk:
+        for file in files:
+            if file.endswith(DICOM_EXTENSIONS) or is_archive(file):
+                yield os.path.join(root, file)
+
+
+def iter_dicom_sources(directory, recursive=True, debug=False, broken=None):
+    """Yield DICOM file paths and Datasets of DICOM members of archives
+
+    Regular files are yielded as paths when they have a .dcm extension,
+    archives (.zip, .tar, .tar.gz) are treated as virtual directories,
+    those that can't be read are appended to broken.
+    """
+    for file_path in iter_source_files(directory, recursive):
+        if is_archive(file_path):
+            yield from iter_archive(file_path, debug, broken)
+        else:
+            yield file_path
@@ -0,0 +1,300 @@
+# dose_extractor.py
+import os
+from datetime import datetime, date
+import traceback
+from scan_profile import NULL_PROFILER
+from skin_dose import irradiation_events, peak_skin_dose
+from field_spec import get_field_spec
+
+# Modalities with DRLs and reports, the "All" scan mode routes images of every field spec modality
+SUPPORTED_MODALITIES = ("CT", "DX", "XA", "MG")
+
+# Structured report SOP classes that may carry a radiation dose report
+RDSR_SOP_CLASS_UIDS = (
+    "1.2.840.10008.5.1.4.1.1.88.67",  # X-Ray Radiation Dose SR
+    "1.2.840.10008.5.1.4.1.1.88.73",  # Patient Radiation Dose SR
+    "1.2.840.10008.5.1.4.1.1.88.22",  # Enhanced SR
+    "1.2.840.10008.5.1.4.1.1.88.33",  # Comprehensive SR
+)
+
+# Accumulated fluoroscopy totals, present with zero values in some radiography RDSRs
+FLUORO_TOTAL_CONCEPTS = ("Fluoro Dose Area Product Total", "Fluoro Dose (RP) Total", "Total Fluoro Time")
+# Irradiation event types only angiography and fluoroscopy units report
+FLUORO_EVENT_TYPES = ("Fluoroscopy", "Rotational Acquisition", "Stepping Acquisition")
+
+class PlainVar:
+    """Plain stand-in for tkinter variables when running without the GUI"""
+    def __init__(self, value=False):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+class DoseExtractor:
+    """Dose data extraction from RDSR and DICOM image objects"""
+    # Replaced by a ScanProfiler for the duration of a scan
+    profiler = NULL_PROFILER
+    # Exception of the last extraction that failed on a broken file, reset by the caller
+    extract_error = None
+
+    def __init__(self, debug=False):
+        self.debug_mode = PlainVar(debug)
+
+    def route_dicom(self, dcm):
+        """Return (modality, data source) of a DICOM object for the "All" mode"""
+        dcm_modality = dcm.get('Modality', '')
+        if dcm_modality == "SR":
+            if str(dcm.get('SOPClassUID', '')) not in RDSR_SOP_CLASS_UIDS:
+                if self.debug_mode.get():
+                    print("DEBUG: SR is not a dose report SOP class")
+                return None, None
+            return self.detect_rdsr_modality(dcm), "RDSR"
+        if dcm_modality in get_field_spec().modalities:
+            return dcm_modality, "IMAGE"
+        return None, None
+
+    def detect_rdsr_modality(self, dcm):
+        """Detect which modality an RDSR describes from its template and concepts
+
+        Projection X-ray reports (TID 10001) of radiography units may carry
+        fluoroscopy totals of zero, so they are XA only with fluoroscopic or
+        rotational irradiation events or non-zero fluoroscopy totals.
+        """
+        templates = {str(template.get('TemplateIdentifier', ''))
+                     for template in dcm.get('ContentTemplateSequence', [])}
+        if '10011' in templates:
+            return "CT"
+        
+        # Concept names, coded values and fluoroscopy totals of the first two content levels
+        meanings = []
+        coded = []
+        fluoro_total = 0.0
+        items = list(dcm.get('ContentSequence', []))
+        for item in items + [child for item in items for child in item.get('ContentSequence', [])]:
+            names = [str(code.get('CodeMeaning', '')) for code in item.get('ConceptNameCodeSequence', [])]
+            meanings.extend(names)
+            coded.extend(str(code.get('CodeMeaning', '')) for code in item.get('ConceptCodeSequence', []))
+            if any(name in FLUORO_TOTAL_CONCEPTS for name in names):
+                try:
+                    fluoro_total += abs(float(item.MeasuredValueSequence[0].NumericValue))
+                except (AttributeError, IndexError, TypeError, ValueError):
+                    pass
+        
+        if any(m.startswith('CT ') for m in meanings):
+            detected = "CT"
+        elif any('Mammography' in m or 'Glandular' in m for m in meanings + coded):
+            detected = "MG"
+        elif any(value in FLUORO_EVENT_TYPES for value in coded) or fluoro_total > 0:
+            detected = "XA"
+        elif '10001' in templates or any('X-Ray Dose' in m or 'Dose Area Product' in m for m in meanings):
+            detected = "DX"
+        else:
+            detected = None
+        if self.debug_mode.get():
+            print(f"DEBUG: Detected RDSR modality: {detected}")
+        return detected
+
+    def extract_data(self, source, modality, data_source):
+        """Run the extractor for a given modality and data source"""
+        if data_source == "RDSR":
+            return self.extract_rdsr_data(source)
+        if modality in get_field_spec().modalities:
+            return self.extract_image_data(source, modality)
+        return None
+
+    def extract_routed_data(self, file_path):
+        """Read a file once, route it by Modality/SOPClassUID and extract its data"""
+        try:
+            dcm = self.read_dataset(file_path)
+        except Exception as e:
+            self.extract_error = e
+            if self.debug_mode.get():
+                print(f"DEBUG: Error reading file {file_path}: {str(e)}")
+            return None
+        
+        modality, data_source = self.route_dicom(dcm)
+        if not modality:
+            if self.debug_mode.get():
+                print("DEBUG: File could not be routed to an extractor")
+            return None
+        if self.debug_mode.get():
+            print(f"DEBUG: Routed to {modality} {data_source}")
+        
+        data = self.extract_data(dcm, modality, data_source)
+        if data:
+            data['Modality'] = modality
+            data['DataSource'] = data_source
+        return data
+
+    def read_dataset(self, source, specific_tags=None):
+        """Return a pydicom Dataset for a file path or an already read Dataset
+
+        specific_tags limits reading to these top level elements.
+        """
+        import pydicom
+        if isinstance(source, pydicom.Dataset):
+            return source
+        with self.profiler.stage('dcmread'):
+            dcm = pydicom.dcmread(source, specific_tags=specific_tags)
+        if isinstance(source, str):
+            self.profiler.count('bytes_read', os.path.getsize(source))
+        return dcm
+    def extract_patient_data(self, dcm):
+        """Extract common patient data from DICOM file"""
+        if self.debug_mode.get():
+            print("\nDEBUG: Extracting patient data")
+        filename = getattr(dcm, 'filename', None)
+        patient_data = {
+            # Datasets received over the network have no file, use the SOP Instance UID
+            'File': os.path.basename(filename) if isinstance(filename, str) else str(dcm.get('SOPInstanceUID', ''))
+        }
+        patient_data.update(get_field_spec().extract_common(dcm))
+        
+        if patient_data['PatientBirthDate']:
+            try:
+                birth_date = datetime.strptime(patient_data['PatientBirthDate'], '%Y%m%d').date()
+                study_date = datetime.strptime(dcm.get('StudyDate', date.today().strftime('%Y%m%d')), '%Y%m%d').date()
+                patient_data['CalculatedAge'] = (study_date - birth_date).days // 365
+                if self.debug_mode.get():
+                    print(f"DEBUG: Calculated age: {patient_data['CalculatedAge']}")
+            except Exception as e:
+                if self.debug_mode.get():
+                    print(f"DEBUG: Error calculating age: {str(e)}")
+        
+        if self.debug_mode.get():
+            print("DEBUG: Patient data extracted successfully")
+        return patient_data
+
+    def extract_rdsr_data(self, file_path):
+        """Extract dose data from RDSR DICOM file"""
+        if self.debug_mode.get():
+            print("\nDEBUG: Starting RDSR data extraction")
+        # Loaded outside the per file error handling, a spec error stops the scan
+        get_field_spec()
+        try:
+            dcm = self.read_dataset(file_path)
+            
+            if dcm.get('Modality', '') != 'SR':
+                if self.debug_mode.get():
+                    print("DEBUG: Not an RDSR file")
+                return None
+                
+            patient_data = self.extract_patient_data(dcm)
+            
+            if hasattr(dcm, 'ContentSequence'):
+                if self.debug_mode.get():
+                    print("DEBUG: Processing RDSR content sequence")
+                with self.profiler.stage('content_sequence'):
+                    self.process_content_sequence(dcm.ContentSequence, patient_data)
+                with self.profiler.stage('skin_dose'):
+                    self.add_skin_dose(dcm.ContentSequence, patient_data)
+            else:
+                if self.debug_mode.get():
+                    print("DEBUG: No content sequence found")
+            
+            return patient_data
+        except Exception as e:
+            self.extract_error = e
+            if self.debug_mode.get():
+                print(f"DEBUG: Error processing RDSR file: {str(e)}")
+                print(f"DEBUG: Full error: {traceback.format_exc()}")
+            return None
+
+    def add_skin_dose(self, sequence, patient_data):
+        """Add peak skin dose of fluoroscopy irradiation events with positioner geometry"""
+        events = [event for event in irradiation_events(sequence) if 'primary_angle' in event]
+        if not events:
+            return
+        peak, mapped = peak_skin_dose(events)
+        if self.debug_mode.get():
+            print(f"DEBUG: Mapped {mapped} of {len(events)} irradiation events, peak skin dose: {peak}")
+        if mapped:
+            patient_data['PeakSkinDose'] = round(peak, 4)
+            patient_data['SkinDoseEvents'] = mapped
+
+    def process_content_sequence(self, sequence, patient_data):
+        """Process DICOM SR content sequence"""
+        if self.debug_mode.get():
+            print("\nDEBUG: Processing content sequence")
+        if not sequence:
+            if self.debug_mode.get():
+                print("DEBUG: Empty sequence")
+            return
+            
+        for content_item in sequence:
+            if hasattr(content_item, 'ConceptNameCodeSequence'):
+                concept_name = content_item.ConceptNameCodeSequence[0].CodeMeaning
+                if self.debug_mode.get():
+                    print(f"DEBUG: Found concept: {concept_name}")
+                
+                if 'Acquisition Protocol' in concept_name and hasattr(content_item, 'TextValue'):
+                    patient_data['AcquisitionProtocol'] = str(content_item.TextValue)
+                    if self.debug_mode.get():
+                        print(f"DEBUG: Protocol: {patient_data['AcquisitionProtocol']}")
+                elif 'Mean CTDIvol' in concept_name and hasattr(content_item, 'MeasuredValueSequence'):
+                    try:
+                        patient_data['CTDIvol'] = float(content_item.MeasuredValueSequence[0].NumericValue)
+                        if self.debug_mode.get():
+                            print(f"DEBUG: CTDIvol: {patient_data['CTDIvol']}")
+                    except:
+                        if self.debug_mode.get():
+                            print("DEBUG: Error extracting CTDIvol")
+                elif 'DLP' in concept_name and hasattr(content_item, 'MeasuredValueSequence'):
+                    try:
+                        patient_data['TotalDLP'] = float(content_item.MeasuredValueSequence[0].NumericValue)
+                        if self.debug_mode.get():
+                            print(f"DEBUG: DLP: {patient_data['TotalDLP']}")
+                    except:
+                        if self.debug_mode.get():
+                            print("DEBUG: Error extracting DLP")
+                elif 'Dose Area Product' in concept_name and hasattr(content_item, 'MeasuredValueSequence'):
+                    try:
+                        patient_data['TotalDoseAreaProduct'] = float(content_item.MeasuredValueSequence[0].NumericValue)
+                        if self.debug_mode.get():
+                            print(f"DEBUG: DAP: {patient_data['TotalDoseAreaProduct']}")
+                    except:
+                        if self.debug_mode.get():
+                            print("DEBUG: Error extracting DAP")
+                elif 'Average Glandular Dose' in concept_name and hasattr(content_item, 'MeasuredValueSequence'):
+                    try:
+                        patient_data['AverageGlandularDose'] = float(content_item.MeasuredValueSequence[0].NumericValue)
+                        if self.debug_mode.get():
+                            print(f"DEBUG: AGD: {patient_data['AverageGlandularDose']}")
+                    except:
+                        if self.debug_mode.get():
+                            print("DEBUG: Error extracting AGD")
+                        
+            if hasattr(content_item, 'ContentSequence'):
+                self.process_content_sequence(content_item.ContentSequence, patient_data)
+    def extract_image_data(self, file_path, modality):
+        """Extract dose data from a DICOM image file with the fields of the field spec"""
+        if self.debug_mode.get():
+            print(f"\nDEBUG: Starting {modality} dose data extraction")
+        spec = get_field_spec()
+        try:
+            dcm = self.read_dataset(file_path, spec.specific_tags[modality])
+            
+            if dcm.get('Modality', '') != modality:
+                if self.debug_mode.get():
+                    print(f"DEBUG: Not a {modality} image")
+                return None
+                
+            patient_data = self.extract_patient_data(dcm)
+            
+            # Modality specific exposure data
+            if self.debug_mode.get():
+                print(f"DEBUG: Extracting {modality}-specific data")
+            patient_data.update(spec.extract(dcm, modality))
+            
+            if self.debug_mode.get():
+                print(f"DEBUG: {modality} dose data extracted successfully")
+            return patient_data
+        except Exception as e:
+            self.extract_error = e
+            if self.debug_mode.get():
+                print(f"DEBUG: Error processing {modality} file: {str(e)}")
+                print(f"DEBUG: Full error: {traceback.format_exc()}")
+            return None
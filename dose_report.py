@@ -0,0 +1,629 @@
+# dose_report.py
+import os
+from datetime import datetime
+import traceback
+from html import escape
+
+# Column the DRL comparison groups protocols by
+PROTOCOL_COLUMNS = {
+    "CT": 'AcquisitionProtocol',
+    "XA": 'ProtocolName',
+    "DX": 'ProtocolName',
+    "MG": 'AcquisitionProtocol'
+}
+
+# Studies listed in the peak skin dose table, and the dose (Gy) needing follow-up (NCRP 168)
+SKIN_DOSE_ROWS = 20
+SKIN_DOSE_ALERT_GY = 3.0
+
+
+class DoseReport:
+    """DRL comparison, Excel and PDF report of extracted dose data
+
+    Mixin expecting drl_config, modality, data_source, date_from, date_to and
+    debug_mode attributes (tkinter variables or PlainVar), a profiler and a
+    frame_cache (None until results are tabulated).
+    """
+    # Exception of the last DRL comparison that failed, None after one that completed
+    comparison_error = None
+
+    def calculate_drl_comparison(self, df, modality=None):
+        """Calculate DRL comparison data for the report"""
+        import pandas as pd
+        self.comparison_error = None
+        if self.debug_mode.get():
+            print("\nDEBUG: Starting DRL comparison calculation")
+            print("Input DataFrame:")
+            print(df.head())
+            print("\nDataFrame columns:", df.columns.tolist())
+        
+        comparison_data = []
+        if modality is None:
+            modality = self.modality.get()
+        if self.debug_mode.get():
+            print(f"\nDEBUG: Processing {modality} data")
+        
+        try:
+            if modality == "CT":
+                grouped_stats = df.groupby('AcquisitionProtocol').agg({
+                    'TotalDLP': 'mean',
+                    'CTDIvol': 'mean',
+                    'DeviceObserverModelName': 'first'
+                }).round(2)
+                
+            elif modality in ["XA", "DX"]:
+                grouped_stats = df.groupby('ProtocolName').agg({
+                    'ImageAndFluoroscopyAreaDoseProduct': 'mean',
+                    'EntranceDose': 'mean',
+                    'DeviceObserverModelName': 'first'
+                }).round(2)
+                
+            elif modality == "MG":
+                grouped_stats = df.groupby(['AcquisitionProtocol', 'BodyPartThickness']).agg({
+                    'OrganDose': 'mean',
+                    'EntranceDose': 'mean',
+                    'DeviceObserverModelName': 'first'
+                }).round(2)
+            
+            if self.debug_mode.get():
+                print("\nDEBUG: Grouped statistics:")
+                print(grouped_stats)
+            
+            if modality == "CT":
+                # Ages of each protocol's children, banded per protocol; without ages adult DRLs apply
+                if 'CalculatedAge' in df:
+                    child_ages = pd.to_numeric(df['CalculatedAge'], errors='coerce')
+                else:
+                    child_ages = pd.Series(float('nan'), index=df.index)
+                child_ages = child_ages[child_ages <= 18].groupby(df['AcquisitionProtocol'])
+
+            if modality == "MG":
+                # Thickness groups of a protocol are banded together
+                protocol_rows = grouped_stats.groupby(level=0, sort=False)
+            else:
+                protocol_rows = grouped_stats.iterrows()
+
+            # Process each protocol
+            for protocol, stats in protocol_rows:
+                if self.debug_mode.get():
+                    print(f"\nDEBUG: Processing protocol: {protocol}")
+                drl_protocol, drl_data = self.drl_config.get_matching_protocol(modality, protocol)
+                if self.debug_mode.get():
+                    print(f"DEBUG: DRL data found: {drl_data}")
+                
+                if drl_data:
+                    if modality == "CT":
+                        ages = child_ages.get_group(protocol) if protocol in child_ages.groups else []
+                        self.add_ct_comparison(comparison_data, protocol, stats, drl_data, ages,
+                                               self.drl_config.get_band_table(modality, drl_protocol))
+                    elif modality in ["XA", "DX"]:
+                        self.add_xray_comparison(comparison_data, protocol, stats, drl_data, df)
+                    elif modality == "MG":
+                        self.add_mg_comparison(comparison_data, protocol, stats,
+                                               self.drl_config.get_band_table(modality, drl_protocol))
+        
+        except Exception as e:
+            self.comparison_error = e
+            if self.debug_mode.get():
+                print(f"DEBUG: Error in comparison calculation: {str(e)}")
+                print(f"DEBUG: Full error: {traceback.format_exc()}")
+        
+        if self.debug_mode.get():
+            print("\nDEBUG: Final comparison data:")
+            print(comparison_data)
+        return comparison_data
+
+    def add_ct_comparison(self, comparison_data, protocol, stats, drl_data, child_ages, bands):
+        """Add CT comparison data, child_ages are the protocol's ages up to 18 years"""
+        if self.debug_mode.get():
+            print(f"\nDEBUG: Adding CT comparison for protocol: {protocol}")
+            print(f"DEBUG: Number of child records: {len(child_ages)}")
+        
+        # Choose appropriate DRL, the first configured age group with records
+        assigned = bands.assign(child_ages)
+        assigned = assigned[assigned >= 0]
+        if len(assigned) > 0:
+            band = assigned[bands.order[assigned].argmin()]
+            drl_level = bands.values[band]['DLP']
+            if self.debug_mode.get():
+                print(f"DEBUG: Using child DRL for age {bands.labels[band]}: {drl_level}")
+        else:
+            drl_level = drl_data['adult']['DLP']
+            if self.debug_mode.get():
+                print(f"DEBUG: Using adult DRL: {drl_level}")
+        
+        # Calculate comparison
+        percentage = (stats['TotalDLP'] / drl_level) * 100
+        relative_percentage = percentage - 100
+        if self.debug_mode.get():
+            print(f"DEBUG: Calculated percentage: {percentage}%")
+        
+        self.add_comparison_result(comparison_data, protocol, stats, 
+                                 drl_level, relative_percentage)
+
+    def add_xray_comparison(self, comparison_data, protocol, stats, drl_data, df):
+        """Add X-ray comparison data"""
+        if self.debug_mode.get():
+            print(f"\nDEBUG: Adding X-ray comparison for protocol: {protocol}")
+        # Check for pediatric cases
+        child_records = df[
+            (df['ProtocolName'] == protocol) & 
+            (df['CalculatedAge'] <= 18)
+        ]
+        if self.debug_mode.get():
+            print(f"DEBUG: Number of child records: {len(child_records)}")
+        
+        if len(child_records) > 0 and 'child' in drl_data:
+            drl_level = drl_data['child']['DAP']
+            if self.debug_mode.get():
+                print(f"DEBUG: Using child DRL: {drl_level}")
+        else:
+            drl_level = drl_data['adult']['DAP']
+            if self.debug_mode.get():
+                print(f"DEBUG: Using adult DRL: {drl_level}")
+        
+        # Calculate comparison
+        dose_value = stats['ImageAndFluoroscopyAreaDoseProduct']
+        percentage = (dose_value / drl_level) * 100
+        relative_percentage = percentage - 100
+        if self.debug_mode.get():
+            print(f"DEBUG: Dose value: {dose_value}, DRL: {drl_level}, Percentage: {percentage}%")
+        
+        self.add_comparison_result(comparison_data, protocol, stats, 
+                                 drl_level, relative_percentage)
+
+    def add_mg_comparison(self, comparison_data, protocol, thickness_stats, bands):
+        """Add mammography comparison data of a protocol's thickness groups"""
+        import pandas as pd
+        if self.debug_mode.get():
+            print(f"\nDEBUG: Adding mammography comparison for protocol: {protocol}")
+        # Find matching thickness range of all groups at once
+        thicknesses = thickness_stats.index.get_level_values(1)
+        assigned = bands.assign(pd.to_numeric(thicknesses, errors='coerce'))
+        for thickness, (_, stats), band in zip(thicknesses, thickness_stats.iterrows(), assigned):
+            if band < 0:
+                continue
+            drl_level = bands.values[band]
+            percentage = (stats['OrganDose'] / drl_level) * 100
+            relative_percentage = percentage - 100
+            if self.debug_mode.get():
+                print(f"DEBUG: Thickness range {bands.labels[band]}: Value {stats['OrganDose']}, DRL {drl_level}")
+            
+            protocol_with_thickness = f"{protocol} ({thickness}mm)"
+            self.add_comparison_result(comparison_data, protocol_with_thickness, 
+                                     stats, drl_level, relative_percentage)
+
+    def add_comparison_result(self, comparison_data, protocol, stats, drl_level, relative_percentage):
+        """Add comparison result with status and color"""
+        if self.debug_mode.get():
+            print(f"\nDEBUG: Adding comparison result for {protocol}")
+        percentage = relative_percentage + 100
+        
+        if percentage <= 85:
+            status = "Optimals"
+            color = "#90EE90"  # Light green
+        elif percentage <= 100:
+            status = "Pienemams"
+            color = "#FFD700"  # Gold
+        else:
+            status = "Parsniegts"
+            color = "#FFB6C6"  # Light red
+        
+        if self.debug_mode.get():
+            print(f"DEBUG: Status: {status}, Percentage: {percentage}%")
+        
+        comparison_data.append({
+            'protocol': protocol,
+            'device_model': stats['DeviceObserverModelName'],
+            'avg_value': stats.get('TotalDLP', stats.get('DoseAreaProduct', stats.get('OrganDose'))),
+            'drl_level': drl_level,
+            'percentage': relative_percentage,
+            'status': status,
+            'color': color
+        })
+
+    def get_filename_base(self):
+        """Generate report filename based on date range and modality"""
+        filename_base = f"DICOM_Dose_{self.modality.get()}"
+        if self.date_from.get() and self.date_to.get():
+            filename_base += f"_{self.date_from.get()}-{self.date_to.get()}"
+        elif self.date_from.get():
+            filename_base += f"_{self.date_from.get()}"
+        elif self.date_to.get():
+            filename_base += f"_{self.date_to.get()}"
+        if self.debug_mode.get():
+            print(f"DEBUG: Generated filename base: {filename_base}")
+        return filename_base
+
+    def build_frame(self, results):
+        """Build results DataFrame, reused while the same results list is re-evaluated"""
+        import pandas as pd
+        if self.frame_cache is not None and self.frame_cache[0] is results \
+                and self.frame_cache[1] == len(results):
+            return self.frame_cache[2]
+        with self.profiler.stage('dataframe'):
+            df = pd.DataFrame(results)
+        if self.modality.get() != "ALL" and self.data_source.get() == "RDSR":
+            df['Modality'] = df['Modality'].replace('SR', self.modality.get())
+            if self.debug_mode.get():
+                print("DEBUG: Replaced SR modality with selected modality")
+        self.frame_cache = (results, len(results), df)
+        return df
+
+    def write_results(self, results, excel_path):
+        """Save results to Excel and generate PDF report with the same name"""
+        import pandas as pd
+        if self.debug_mode.get():
+            print(f"DEBUG: Saving Excel to: {excel_path}")
+        df = self.build_frame(results)
+        if self.modality.get() == "ALL":
+            # One sheet per modality and data source
+            with self.profiler.stage('to_excel'), pd.ExcelWriter(excel_path) as writer:
+                for (modality, source), group in self.split_by_modality(df):
+                    group.to_excel(writer, sheet_name=f"{modality} {source}", index=False)
+        else:
+            with self.profiler.stage('to_excel'):
+                df.to_excel(excel_path, index=False)
+        if self.debug_mode.get():
+            print("DEBUG: Excel saved successfully")
+        
+        # Generate PDF with same name but .pdf extension
+        pdf_path = os.path.splitext(excel_path)[0] + ".pdf"
+        if self.debug_mode.get():
+            print(f"DEBUG: Generating PDF: {pdf_path}")
+        self.generate_pdf_report(df, pdf_path)
+        return pdf_path
+
+    def compare_drl_sets(self, df, proposed_config, modality=None, failed=None):
+        """Side by side DRL comparison with the current and a proposed DRL configuration
+
+        Comparisons that raised are appended to failed as (DRL set, error).
+        """
+        current = self.calculate_drl_comparison(df, modality)
+        if self.comparison_error is not None and failed is not None:
+            failed.append(("current", self.comparison_error))
+        drl_config = self.drl_config
+        self.drl_config = proposed_config
+        try:
+            proposed = {row['protocol']: row for row in self.calculate_drl_comparison(df, modality)}
+            if self.comparison_error is not None and failed is not None:
+                failed.append(("proposed", self.comparison_error))
+        finally:
+            self.drl_config = drl_config
+
+        rows = []
+        for row in current:
+            other = proposed.pop(row['protocol'], None)
+            rows.append(self.what_if_row(row['protocol'], row, other))
+        # Protocols only the proposed configuration maps
+        for protocol, other in proposed.items():
+            rows.append(self.what_if_row(protocol, None, other))
+        return rows
+
+    def what_if_row(self, protocol, current, proposed):
+        """Combine current and proposed comparison results of a protocol"""
+        row = {'Protocol': protocol,
+               'Average': (current or proposed)['avg_value']}
+        for prefix, result in (('Current', current), ('Proposed', proposed)):
+            row[f'{prefix} DRL'] = result['drl_level'] if result else None
+            row[f'{prefix} %'] = round(result['percentage'], 1) if result else None
+            row[f'{prefix} status'] = result['status'] if result else ''
+        return row
+
+    def write_what_if(self, results, proposed_config, excel_path):
+        """Save current vs proposed DRL comparison to Excel and PDF, returns the PDF path"""
+        import pandas as pd
+        df = self.build_frame(results)
+        if self.modality.get() == "ALL":
+            groups = [(modality, group) for (modality, _), group in self.split_by_modality(df)]
+        else:
+            groups = [(self.modality.get(), df)]
+        rows = []
+        not_compared = []
+        for modality, group in groups:
+            failed = []
+            for row in self.compare_drl_sets(group, proposed_config, modality, failed):
+                rows.append({'Modality': modality, **row})
+            not_compared += [{'Modality': modality, 'DRL set': drl_set, 'Error': f"{type(e).__name__}: {e}"}
+                             for drl_set, e in failed]
+        with pd.ExcelWriter(excel_path) as writer:
+            pd.DataFrame(rows).to_excel(writer, sheet_name="What-if", index=False)
+            if not_compared:
+                pd.DataFrame(not_compared).to_excel(writer, sheet_name="Not compared", index=False)
+
+        pdf_path = os.path.splitext(excel_path)[0] + ".pdf"
+        self.generate_what_if_pdf(rows, pdf_path, proposed_config.config_dir, not_compared)
+        if not_compared:
+            self.show_error("Warning", "Could not compare:\n" + "\n".join(
+                f"{row['Modality']} with the {row['DRL set']} DRLs ({row['Error']})" for row in not_compared))
+        return pdf_path
+
+    def generate_what_if_pdf(self, rows, save_path, proposed_name, not_compared=()):
+        """Generate PDF with the current and proposed DRL comparison side by side"""
+        from xhtml2pdf import pisa
+        status_classes = {"Optimals": "optimals", "Pienemams": "pienemams", "Parsniegts": "parsniegts"}
+        html = f"""
+        <html>
+        <head>
+            <meta charset="UTF-8">
+            <title>DRL What-if</title>
+            <style>
+                body {{ font-family: Arial, sans-serif; }}
+                h1 {{ text-align: center; }}
+                table {{ width: 100%; border-collapse: collapse; margin: 10px 0; }}
+                th, td {{ border: 1px solid #000; padding: 4px; text-align: left; }}
+                th {{ background-color: #f2f2f2; }}
+                .optimals {{ background-color: #90EE90; }}
+                .pienemams {{ background-color: #FFD700; }}
+                .parsniegts {{ background-color: #FFB6C6; }}
+            </style>
+        </head>
+        <body>
+            <h1>DRL Salidzinajums: pasreizejie un piedavatie</h1>
+            <p><strong>Modalitate:</strong> {self.get_modality_name()}</p>
+            <p><strong>Piedavatie DRL:</strong> {escape(str(proposed_name))}</p>
+            <p><strong>Datums:</strong> {datetime.now().strftime("%d.%m.%Y %H:%M")}</p>
+            <table>
+                <tr>
+                    <th>Modalitate</th>
+                    <th>Protokols</th>
+                    <th>Videja vertiba</th>
+                    <th>DRL</th>
+                    <th>Novirze %</th>
+                    <th>Piedavatais DRL</th>
+                    <th>Novirze %</th>
+                </tr>
+        """
+        for row in rows:
+            cells = ""
+            for prefix in ('Current', 'Proposed'):
+                css = status_classes.get(row[f'{prefix} status'], "")
+                if row[f'{prefix} DRL'] is None:
+                    cells += "<td></td><td></td>"
+                else:
+                    cells += (f'<td>{row[f"{prefix} DRL"]:.2f}</td>'
+                              f'<td class="{css}">{row[f"{prefix} %"]:+.1f}%</td>')
+            html += (f"<tr><td>{row['Modality']}</td><td>{escape(str(row['Protocol']))}</td>"
+                     f"<td>{row['Average']:.2f}</td>{cells}</tr>")
+        html += "</table>"
+        if not_compared:
+            html += "<h3>Nav salidzinats</h3><ul>"
+            for row in not_compared:
+                html += (f"<li>{row['Modality']} ({escape(row['DRL set'])} DRL): "
+                         f"{escape(row['Error'])}</li>")
+            html += "</ul>"
+        html += "</body></html>"
+        with open(save_path, "wb") as output_file:
+            pisa.CreatePDF(src=html, dest=output_file, encoding='utf-8')
+
+    def split_by_modality(self, df):
+        """Split combined "All" mode results into per-modality/source tables"""
+        groups = []
+        for (modality, source), group in df.groupby(['Modality', 'DataSource'], sort=True):
+            if self.debug_mode.get():
+                print(f"DEBUG: {modality} {source}: {len(group)} records")
+            groups.append(((modality, source), group.dropna(axis=1, how='all')))
+        return groups
+
+    def build_comparison_rows(self, df, modality=None):
+        """Build HTML table rows of the DRL comparison"""
+        rows = ""
+        with self.profiler.stage('drl_comparison'):
+            drl_comparison = self.calculate_drl_comparison(df, modality)
+        if self.debug_mode.get():
+            print(f"DEBUG: DRL comparison for PDF: {drl_comparison}")
+        
+        for row in drl_comparison:
+            status_class = "optimals" if row['status'] == "Optimals" else "pienemams" if row['status'] == "Pienemams" else "parsniegts"
+            rows += f"""
+                    <tr class="{status_class}">
+                        <td>{row['protocol']}</td>
+                        <td>{row['avg_value']:.2f}</td>
+                        <td>{row['drl_level']:.2f}</td>
+                        <td>{"+" if row['percentage'] >= 0 else ""}{row['percentage']:.1f}%</td>
+                        <td>{row['status']}</td>
+                    </tr>
+                """
+        return rows
+
+    def get_unmapped_protocols(self, df, modality=None):
+        """Protocol strings without a matching DRL protocol, ranked by exam count"""
+        if modality is None:
+            modality = self.modality.get()
+        column = PROTOCOL_COLUMNS.get(modality)
+        if column not in df.columns:
+            return []
+        counts = df[column].dropna().astype(str).value_counts()
+        return [(protocol, int(count)) for protocol, count in counts.items()
+                if self.drl_config.get_matching_protocol(modality, protocol)[0] is None]
+
+    def build_unmapped_section(self, df, modality=None):
+        """Build HTML table of protocols missing from the DRL configuration"""
+        unmapped = self.get_unmapped_protocols(df, modality)
+        if not unmapped:
+            return ""
+        html = """
+                <h3>Protokoli bez DRL</h3>
+                <table>
+                    <tr>
+                        <th>Protokols</th>
+                        <th>Izmeklejumi</th>
+                    </tr>
+        """
+        for protocol, count in unmapped:
+            html += f"<tr><td>{escape(protocol)}</td><td>{count}</td></tr>"
+        return html + "</table>"
+
+    def build_exposure_section(self, df):
+        """Build HTML table of DX exams flagged by the exposure index monitoring"""
+        if 'EIFlag' not in df.columns:
+            return ""
+        flagged = df[df['EIFlag'].fillna('') != '']
+        if flagged.empty:
+            return ""
+        html = """
+                <h3>Ekspozicijas indeksa novirzes</h3>
+                <table>
+                    <tr>
+                        <th>Datums</th>
+                        <th>Protokols</th>
+                        <th>Detektors</th>
+                        <th>EI</th>
+                        <th>TEI</th>
+                        <th>DI</th>
+                        <th>Piezime</th>
+                    </tr>
+        """
+        for _, row in flagged.iterrows():
+            detector = row.get('DetectorID') or row.get('StationName', '')
+            html += (f"<tr><td>{escape(str(row.get('StudyDate', '')))}</td>"
+                     f"<td>{escape(str(row.get('ProtocolName', '')))}</td>"
+                     f"<td>{escape(str(detector))}</td>"
+                     f"<td>{escape(str(row.get('ExposureIndex', '')))}</td>"
+                     f"<td>{escape(str(row.get('TargetExposureIndex', '')))}</td>"
+                     f"<td>{row['DeviationIndex']:+.2f}</td>"
+                     f'<td class="parsniegts">{escape(row["EIFlag"])}</td></tr>')
+        return html + "</table>"
+
+    def build_skin_dose_section(self, df):
+        """Build HTML table of the studies with the highest peak skin dose"""
+        if 'PeakSkinDose' not in df.columns:
+            return ""
+        studies = df.dropna(subset=['PeakSkinDose']).nlargest(SKIN_DOSE_ROWS, 'PeakSkinDose')
+        if studies.empty:
+            return ""
+        html = f"""
+                <h3>Maksimala adas deva (PSD)</h3>
+                <p>Izmeklejumi ar PSD virs {SKIN_DOSE_ALERT_GY:g} Gy ir iezimeti.</p>
+                <table>
+                    <tr>
+                        <th>Datums</th>
+                        <th>Protokols</th>
+                        <th>PSD (Gy)</th>
+                        <th>Notikumi</th>
+                    </tr>
+        """
+        for _, row in studies.iterrows():
+            css = ' class="parsniegts"' if row['PeakSkinDose'] >= SKIN_DOSE_ALERT_GY else ""
+            html += (f"<tr><td>{escape(str(row.get('StudyDate', '')))}</td>"
+                     f"<td>{escape(str(row.get('AcquisitionProtocol', '')))}</td>"
+                     f"<td{css}>{row['PeakSkinDose']:.2f}</td><td>{row.get('SkinDoseEvents', '')}</td></tr>")
+        return html + "</table>"
+
+    def generate_pdf_report(self, df, save_path):
+        """Generate PDF report for dose data"""
+        from xhtml2pdf import pisa
+        if self.debug_mode.get():
+            print("\nDEBUG: Starting PDF report generation")
+        try:
+            table_header = """
+                <table>
+                    <tr>
+                        <th>Protokols</th>
+                        <th>Videja vertiba</th>
+                        <th>DRL Limits</th>
+                        <th>Novirze %</th>
+                        <th>Statuss</th>
+                    </tr>
+            """
+            # Basic HTML content
+            html = f"""
+            <html>
+            <head>
+                <meta charset="UTF-8">
+                <title>DICOM Dose Report</title>
+                <style>
+                    body {{ font-family: Arial, sans-serif; }}
+                    h1 {{ text-align: center; }}
+                    table {{ width: 100%; border-collapse: collapse; margin: 10px 0; }}
+                    th, td {{ border: 1px solid #000; padding: 5px; text-align: left; }}
+                    th {{ background-color: #f2f2f2; }}
+                    .optimals {{ background-color: #90EE90; }}
+                    .pienemams {{ background-color: #FFD700; }}
+                    .parsniegts {{ background-color: #FFB6C6; }}
+                </style>
+            </head>
+            <body>
+                <h1>DICOM Dozu Datu Parskats</h1>
+                <p><strong>Modalitate:</strong> {self.get_modality_name()}</p>
+                <p><strong>Datums:</strong> {datetime.now().strftime("%d.%m.%Y %H:%M")}</p>
+                <hr>
+            """
+
+            # Add data rows, one DRL table per modality and data source in "All" mode
+            if self.modality.get() == "ALL":
+                for (modality, source), group in self.split_by_modality(df):
+                    html += f"<h2>DRL Salidzinajums: {self.get_modality_name(modality)} ({source})</h2>"
+                    html += table_header + self.build_comparison_rows(group, modality) + "</table>"
+                    html += self.build_unmapped_section(group, modality)
+                    html += self.build_skin_dose_section(group)
+                    html += self.build_exposure_section(group)
+            else:
+                html += "<h2>DRL Salidzinajums</h2>"
+                html += table_header + self.build_comparison_rows(df) + "</table>"
+                html += self.build_unmapped_section(df)
+                html += self.build_skin_dose_section(df)
+                html += self.build_exposure_section(df)
+
+            # Close HTML
+            html += """
+                <div>
+                    <p><strong>Statuss:</strong></p>
+                    <p><span style="color: green;">■</span> Optimals: vertiba ≤ 85% no DRL</p>
+                    <p><span style="color: gold;">■</span> Pienemams: vertiba 86-100% no DRL</p>
+                    <p><span style="color: red;">■</span> Parsniegts: vertiba > 100% no DRL</p>
+                </div>
+            </body>
+            </html>
+            """
+
+            # Save HTML for debugging
+            if self.debug_mode.get():
+                debug_html_path = save_path.replace('.pdf', '_debug.html')
+                print(f"DEBUG: Saving debug HTML to: {debug_html_path}")
+                with open(debug_html_path, 'w', encoding='utf-8') as f:
+                    f.write(html)
+
+            # Convert to PDF
+            if self.debug_mode.get():
+                print("DEBUG: Converting HTML to PDF")
+            with self.profiler.stage('pdf'), open(save_path, "wb") as output_file:
+                pisa.CreatePDF(
+                    src=html,
+                    dest=output_file,
+                    encoding='utf-8'
+                )
+            if self.debug_mode.get():
+                print("DEBUG: PDF generation complete")
+            return True
+        except Exception as e:
+            if self.debug_mode.get():
+                print(f"DEBUG: Error generating PDF: {str(e)}")
+                print(f"DEBUG: Full error: {traceback.format_exc()}")
+            return False
+
+    def get_modality_name(self, modality=None):
+        """Get modality name without special characters"""
+        modality_names = {
+            "CT": "Datortomografija",
+            "XA": "Angiografija",
+            "MG": "Mamografija",
+            "DX": "Rentgenografija",
+            "ALL": "Visas modalitates"
+        }
+        if modality is None:
+            modality = self.modality.get()
+        if self.debug_mode.get():
+            print(f"DEBUG: Getting modality name for: {modality}")
+        return modality_names.get(modality, modality)
+
+    def get_date_range(self):
+        """Get formatted date range string"""
+        date_range = ""
+        if self.date_from.get():
+            date_range = f"No: {self.date_from.get()}"
+        if self.date_to.get():
+            date_range += f" Lidz: {self.date_to.get()}"
+        if self.debug_mode.get():
+            print(f"DEBUG: Date range: {date_range}")
+        return date_range
@@ -0,0 +1,452 @@
+# dose_scanner.py
+import os
+from datetime import datetime
+from drl_config import get_drl_config
+from dose_extractor import DoseExtractor, PlainVar
+from field_spec import get_field_spec
+from dose_report import DoseReport
+from dicom_sources import iter_dicom_sources, source_name, is_file_index, read_file_index
+from scan_checkpoint import ScanCheckpoint, Quarantine, ReadAborted, SCAN_STATE_DIR, checkpoint_key, save_results_cache
+from scan_profile import ScanProfiler
+from ssde import series_images, compute_series_dw, apply_ssde
+from mg_agd import apply_dance_agd
+from exposure_monitor import ExposureMonitor
+from patient_index import PatientDoseIndex, DEFAULT_INDEX_DIR
+from pseudonymize import pseudonymize_rows
+from prefetch import Prefetcher, DEFAULT_DEPTH, parse_header
+
+# Extracted files passed through the streaming stages (patient index, pseudonymization) at a time
+STAGE_BATCH_SIZE = 256
+
+
+class DoseScanner(DoseReport, DoseExtractor):
+    """Scan pipeline: file discovery, extraction, checkpointing and reports"""
+    # DX exposure index statistics, kept across the scans of a session
+    exposure_monitor = None
+    # Directory of the patient dose index updated by every scan, None to disable
+    patient_index_dir = DEFAULT_INDEX_DIR
+    # Read-ahead queue depth per mount point, paths under none of them use the default
+    prefetch_depths = {}
+    prefetch_default_depth = DEFAULT_DEPTH
+    # Directory of checkpoints and the quarantine list
+    state_dir = SCAN_STATE_DIR
+
+    def __init__(self, modality="ALL", data_source="RDSR", recursive=True,
+                 date_from='', date_to='', debug=False, profile=None, ssde=True, pseudonymize=False):
+        self.debug_mode = PlainVar(debug)
+        self.modality = PlainVar(modality)
+        self.data_source = PlainVar(data_source)
+        self.scan_subdirs = PlainVar(recursive)
+        # Dates as dd.mm.yyyy strings, like DateEntry.get()
+        self.date_from = PlainVar(date_from)
+        self.date_to = PlainVar(date_to)
+        self.compute_ssde = PlainVar(ssde)
+        self.pseudonymize = PlainVar(pseudonymize)
+        self.drl_config = get_drl_config()
+        self.checkpoint = None
+        self.quarantine = None
+        self.frame_cache = None
+        # None, "cprofile" or "pyinstrument"
+        self.profile_capture = profile
+
+    def show_error(self, title, message):
+        """Report an error to the user"""
+        print(f"{title}: {message}")
+
+    def parse_date_range(self):
+        """Get (date_from, date_to) of the selected date range, None if not set"""
+        if self.date_from.get():
+            date_from = datetime.strptime(self.date_from.get(), '%d.%m.%Y').date()
+            if self.debug_mode.get():
+                print(f"DEBUG: Start date: {date_from}")
+        else:
+            date_from = None
+            if self.debug_mode.get():
+                print("DEBUG: No start date specified")
+            
+        if self.date_to.get():
+            date_to = datetime.strptime(self.date_to.get(), '%d.%m.%Y').date()
+            if self.debug_mode.get():
+                print(f"DEBUG: End date: {date_to}")
+        else:
+            date_to = None
+            if self.debug_mode.get():
+                print("DEBUG: No end date specified")
+        return date_from, date_to
+
+    def find_dicom_files(self, directory, sources=None):
+        """Find DICOM files in directory or file index, or among already listed sources
+
+        Returns paths, archive members as their header-only Datasets. Scans
+        stream the files to extraction with scan_files instead of listing them.
+        """
+        date_range = self.scan_date_range()
+        if date_range is None:
+            return []
+        if sources is None and is_file_index(directory):
+            return self.find_indexed_files(directory, *date_range)
+        return [source for source, _ in self.iter_dicom_files(directory, sources, *date_range)]
+
+    def scan_files(self, directory, sources=None):
+        """Find and extract the DICOM files of directory or file index in one pass, returns results
+
+        Matching files go to extraction with the header read to select them,
+        so the read-ahead depth per mount bounds the headers held at a time.
+        """
+        date_range = self.scan_date_range()
+        if date_range is None:
+            return []
+        if sources is None and is_file_index(directory):
+            return self.extract_files(self.find_indexed_files(directory, *date_range))
+        return self.extract_stream(self.iter_dicom_files(directory, sources, *date_range))
+
+    def scan_date_range(self):
+        """(date_from, date_to) of the scan, None after reporting an invalid date"""
+        try:
+            return self.parse_date_range()
+        except (ValueError, TypeError) as e:
+            if self.debug_mode.get():
+                print(f"DEBUG: Date parsing error - {str(e)}")
+            self.show_error("Error", "Invalid date format")
+            return None
+
+    def iter_dicom_files(self, directory, sources, date_from, date_to):
+        """Yield (source, header-only Dataset) of the DICOM files matching modality and dates"""
+        import pydicom
+        if self.debug_mode.get():
+            print("\nDEBUG: Starting DICOM file search")
+        # Search files, archives are read as virtual directories
+        if self.debug_mode.get():
+            print("DEBUG: Scanning subdirectories" if self.scan_subdirs.get()
+                  else "DEBUG: Scanning only root directory")
+        broken = None
+        if sources is None:
+            broken = []
+            sources = iter_dicom_sources(directory, self.scan_subdirs.get(), self.debug_mode.get(), broken)
+        found = 0
+        try:
+            for source, buffer in self.read_ahead(self.unprocessed_sources(sources)):
+                file_path = source_name(source)
+                self.begin_source(source)
+                try:
+                    dcm = self.prefetched_source(source, buffer)
+                    if isinstance(dcm, str):
+                        try:
+                            with self.profiler.stage('dcmread_header'):
+                                dcm = pydicom.dcmread(source, stop_before_pixels=True)
+                        except Exception as e:
+                            self.profiler.count('parse_errors')
+                            if self.quarantine:
+                                self.quarantine.add(source, e)
+                            raise
+                    if not self.check_dicom_type(dcm):
+                        continue
+                    study_date = dcm.get('StudyDate', '')
+                    if not study_date:
+                        continue
+                    file_date = datetime.strptime(study_date, '%Y%m%d').date()
+                    if (date_from and file_date < date_from) or (date_to and file_date > date_to):
+                        continue
+                except Exception as e:
+                    if self.debug_mode.get():
+                        print(f"DEBUG: Error reading file {file_path}: {str(e)}")
+                    continue
+                found += 1
+                self.profiler.count('files_matched')
+                if self.debug_mode.get():
+                    print(f"DEBUG: Found matching file: {file_path}")
+                yield source, dcm
+        finally:
+            if self.quarantine:
+                self.quarantine.save()
+            if broken:
+                self.report_broken_archives(broken)
+        if self.debug_mode.get():
+            print(f"DEBUG: Found {found} matching DICOM files")
+
+    def report_broken_archives(self, broken):
+        """Count archives that could not be read for the scan status and list them"""
+        self.profiler.count('broken_archives', len(broken))
+        for path, error in broken:
+            print(f"Warning: Could not read archive {path}: {error}")
+
+    def unprocessed_sources(self, sources):
+        """Sources not completed by the resumed scan or quarantined"""
+        for source in self.profiler.timed_iter('walk', sources):
+            file_path = source_name(source)
+            self.profiler.count('files_seen')
+            if self.checkpoint and file_path in self.checkpoint.completed:
+                self.profiler.count('checkpoint_skipped')
+                continue
+            if isinstance(source, str) and self.quarantine and self.quarantine.should_skip(source):
+                if self.debug_mode.get():
+                    print(f"DEBUG: Skipping quarantined file: {file_path}")
+                self.profiler.count('quarantine_skipped')
+                continue
+            yield source
+
+    def read_ahead(self, sources):
+        """(source, header bytes or None) of sources, files are read ahead per mount"""
+        return Prefetcher(self.prefetch_depths, self.prefetch_default_depth, self.profiler).iter(sources)
+
+    def prefetched_source(self, source, buffer):
+        """Header-only Dataset of prefetched bytes, the source itself if there are none or they don't parse"""
+        if buffer is None:
+            return source
+        with self.profiler.stage('dcmread'):
+            dcm = parse_header(source, buffer)
+        return source if dcm is None else dcm
+
+    def find_indexed_files(self, index_path, date_from, date_to):
+        """Select files of a DICOM file index by modality and date without reading them"""
+        if self.debug_mode.get():
+            print(f"DEBUG: Reading file index {index_path}")
+        dicom_files = []
+        try:
+            for row in self.profiler.timed_iter('read_index', read_file_index(index_path)):
+                self.profiler.count('files_seen')
+                file_path = row['Path']
+                if self.checkpoint and file_path in self.checkpoint.completed:
+                    self.profiler.count('checkpoint_skipped')
+                    continue
+                if self.quarantine and self.quarantine.should_skip(file_path):
+                    self.profiler.count('quarantine_skipped')
+                    continue
+                # Index rows have the Modality and StudyDate of the header
+                if not self.check_dicom_type(row) or not row['StudyDate']:
+                    continue
+                try:
+                    file_date = datetime.strptime(row['StudyDate'], '%Y%m%d').date()
+                except ValueError:
+                    continue
+                if (not date_from or file_date >= date_from) and (not date_to or file_date <= date_to):
+                    self.profiler.count('files_matched')
+                    dicom_files.append(file_path)
+        except (OSError, ValueError) as e:
+            self.show_error("Error", f"Cannot read file index: {str(e)}")
+            return []
+        if self.debug_mode.get():
+            print(f"DEBUG: Selected {len(dicom_files)} files from the index")
+        return dicom_files
+
+    def check_dicom_type(self, dcm):
+        """Check if DICOM file matches selected modality and source type"""
+        modality = self.modality.get()
+        data_source = self.data_source.get()
+        
+        dcm_modality = dcm.get('Modality', '')
+        if self.debug_mode.get():
+            print(f"DEBUG: Checking DICOM type - File modality: {dcm_modality}, Required: {modality}")
+        
+        if modality == "ALL":
+            if self.debug_mode.get():
+                print("DEBUG: Checking for any supported RDSR or Image")
+            return dcm_modality == "SR" or dcm_modality in get_field_spec().modalities
+        elif data_source == "RDSR":
+            if self.debug_mode.get():
+                print("DEBUG: Checking for RDSR")
+            return dcm_modality == "SR"
+        else:  # IMAGE
+            if self.debug_mode.get():
+                print("DEBUG: Checking for Image")
+            return dcm_modality == modality
+
+    def start_checkpoint(self, directory, resume=False):
+        """Open scan checkpoint and quarantine list, returns results of the resumed scan"""
+        key = checkpoint_key(os.path.abspath(directory), self.modality.get(), self.data_source.get(),
+                             self.scan_subdirs.get(), self.date_from.get(), self.date_to.get(),
+                             self.pseudonymize.get())
+        self.quarantine = Quarantine(self.state_dir, debug=self.debug_mode.get())
+        self.checkpoint = ScanCheckpoint(key, self.state_dir, debug=self.debug_mode.get())
+        aborted = self.checkpoint.aborted_source()
+        if aborted:
+            print(f"Warning: Previous scan stopped while reading {aborted}, the file is quarantined")
+            self.quarantine.add(aborted, ReadAborted("scan process crashed or hung while reading the file"))
+            self.quarantine.save()
+        results = self.checkpoint.load() if resume else []
+        self.checkpoint.open(resume)
+        return results
+
+    def finish_checkpoint(self):
+        """Remove checkpoint once results are saved"""
+        if self.checkpoint:
+            self.checkpoint.remove()
+            self.checkpoint = None
+
+    def extract_files(self, dicom_files):
+        """Extract dose data of found files, recording progress in the checkpoint"""
+        def sources():
+            for source, buffer in self.read_ahead(dicom_files):
+                self.begin_source(source)
+                yield source, self.prefetched_source(source, buffer)
+        return self.extract_stream(sources())
+
+    def begin_source(self, source):
+        """Mark a file as being read, a crash or hang reading it quarantines it at the next scan"""
+        if self.checkpoint and isinstance(source, str):
+            self.checkpoint.begin(source)
+
+    def extract_stream(self, sources):
+        """Extract (source, path or Dataset to read) pairs as they arrive, recording progress in the checkpoint"""
+        modality = self.modality.get()
+        data_source = self.data_source.get()
+        results = []
+        ssde_candidates = []
+        patient_index = PatientDoseIndex(self.patient_index_dir, self.debug_mode.get()) if self.patient_index_dir else None
+        batch = []
+        if self.exposure_monitor is None:
+            self.exposure_monitor = ExposureMonitor()
+        try:
+            for file_path, source in sources:
+                if self.debug_mode.get():
+                    print(f"\nDEBUG: Processing file: {source_name(file_path)}")
+                self.extract_error = None
+                if modality == "ALL":
+                    data = self.extract_routed_data(source)
+                else:
+                    data = self.extract_data(source, modality, data_source)
+                
+                if not data and self.extract_error is not None and isinstance(file_path, str) and self.quarantine:
+                    # Poison files failing extraction are skipped like those failing the header read
+                    self.profiler.count('extract_errors')
+                    self.quarantine.add(file_path, self.extract_error)
+                if data:
+                    if self.debug_mode.get():
+                        print("DEBUG: Successfully extracted data")
+                    self.profiler.count('extracted')
+                    if data.get('Modality') == 'DX' and self.exposure_monitor.add(data):
+                        self.profiler.count('ei_flagged')
+                        if self.debug_mode.get():
+                            print(f"DEBUG: Exposure flagged: {data['EIFlag']}")
+                else:
+                    if self.debug_mode.get():
+                        print("DEBUG: Failed to extract data")
+                    self.profiler.count('not_extracted')
+                batch.append((file_path, data))
+                if len(batch) >= STAGE_BATCH_SIZE:
+                    self.finish_batch(batch, results, ssde_candidates, patient_index)
+                    batch = []
+        finally:
+            # Completed files of an interrupted scan still reach the checkpoint
+            self.finish_batch(batch, results, ssde_candidates, patient_index)
+            if self.checkpoint:
+                self.checkpoint.flush()
+            if self.quarantine:
+                self.quarantine.save()
+        if self.compute_ssde.get():
+            # Rows restored from the checkpoint are the caller's rows too, their Dw is computed with this run's
+            restored = self.checkpoint.restored if self.checkpoint else []
+            for source, data in restored:
+                self.add_ssde_candidate(ssde_candidates, source, data)
+            if ssde_candidates:
+                self.add_ssde([data for _, data in restored] + results, ssde_candidates)
+        return results
+
+    def finish_batch(self, batch, results, ssde_candidates, patient_index):
+        """Pass a batch of extracted files through the streaming stages into results and checkpoint
+
+        The patient index is updated from the clear rows, so it keeps real study
+        dates, and before the checkpoint marks the files done so a resumed scan
+        doesn't miss them; rows are pseudonymized before anything else is written.
+        """
+        rows = [data for _, data in batch if data]
+        # Computed per batch so the checkpoint and index keep the AGD of a resumed scan's rows
+        self.add_agd(rows)
+        if patient_index and rows:
+            with self.profiler.stage('patient_index'):
+                patient_index.add_records(patient_index.records(rows))
+        if self.pseudonymize.get() and rows:
+            with self.profiler.stage('pseudonymize'):
+                pseudonymize_rows(rows)
+        for file_path, data in batch:
+            if data:
+                results.append(data)
+                self.add_ssde_candidate(ssde_candidates, source_name(file_path), data)
+            if self.checkpoint:
+                self.checkpoint.add(source_name(file_path), data)
+
+    def add_ssde_candidate(self, candidates, path, data):
+        """Add a CT image row as (series UID, slice location, path) for the SSDE stage"""
+        if data.get('SeriesInstanceUID') and 'SliceLocation' in data:
+            # Pixel data is read from the file, archive members fail to read and get no Dw
+            candidates.append((data['SeriesInstanceUID'], data['SliceLocation'], path))
+
+    def add_agd(self, rows):
+        """AGD stage: Dance model OrganDose of MG image rows without one"""
+        if not rows:
+            return
+        with self.profiler.stage('agd'):
+            computed = apply_dance_agd(rows)
+        if computed:
+            self.profiler.count('agd_computed', computed)
+            if self.debug_mode.get():
+                print(f"DEBUG: Computed AGD of {computed} MG images with the Dance model")
+
+    def add_ssde(self, results, candidates):
+        """SSDE stage: Dw of one image per CT series, Dw and SSDE columns of its rows"""
+        with self.profiler.stage('ssde'):
+            images = series_images(candidates)
+            series_dw = compute_series_dw(images)
+            apply_ssde(results, series_dw)
+        self.profiler.count('ssde_series', len(series_dw))
+        if self.debug_mode.get():
+            print(f"DEBUG: Water-equivalent diameter of {len(series_dw)} of {len(images)} CT series")
+
+    def start_profile(self):
+        """Start timing a scan run"""
+        self.profiler = ScanProfiler(self.profile_capture)
+        self.mapping_lookups = self.drl_config.mapping_cache.lookups()
+        self.profiler.start()
+
+    def finish_profile(self, excel_path=None):
+        """Stop timing, print the summary table and save it as JSON next to the report"""
+        self.profiler.stop()
+        hits, misses = self.drl_config.mapping_cache.lookups()
+        self.profiler.count('mapping_cache_hits', hits - self.mapping_lookups[0])
+        self.profiler.count('mapping_cache_misses', misses - self.mapping_lookups[1])
+        print(self.profiler.format_table())
+        if excel_path:
+            timing_path = os.path.splitext(excel_path)[0] + "_timing.json"
+            self.profiler.save(timing_path)
+            if self.debug_mode.get():
+                print(f"DEBUG: Saved timing summary to {timing_path}")
+
+    def scan_params(self):
+        """Scan parameters needed to report cached results again"""
+        return {'modality': self.modality.get(), 'data_source': self.data_source.get(),
+                'date_from': self.date_from.get(), 'date_to': self.date_to.get()}
+
+    def run_scan(self, directory, excel_path, resume=False, results_cache=None):
+        """Scan directory and save Excel and PDF reports without the GUI"""
+        self.start_profile()
+        results = self.start_checkpoint(directory, resume)
+        try:
+            results += self.scan_files(directory)
+        finally:
+            self.checkpoint.close()
+        if not results:
+            self.finish_profile()
+            self.show_error("Error", "No valid data found")
+            return False
+        if results_cache:
+            save_results_cache(results_cache, results, self.scan_params())
+            if self.debug_mode.get():
+                print(f"DEBUG: Saved extraction results to {results_cache}")
+        pdf_path = self.write_results(results, excel_path)
+        self.finish_checkpoint()
+        self.finish_profile(excel_path)
+        print(f"Processed {len(results)} files\nSaved to:\n{excel_path}\n{pdf_path}")
+        return True
+
+    def run_recompare(self, results, excel_path, proposed_config=None):
+        """Report cached results with the current DRLs, or next to proposed DRLs, without rescanning"""
+        self.start_profile()
+        # Caches of earlier versions have no AGD in their rows
+        self.add_agd(results)
+        if proposed_config is None:
+            pdf_path = self.write_results(results, excel_path)
+        else:
+            pdf_path = self.write_what_if(results, proposed_config, excel_path)
+        self.finish_profile()
+        print(f"Compared {len(results)} cached results\nSaved to:\n{excel_path}\n{pdf_path}")
+        return True
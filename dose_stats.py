@@ -0,0 +1,203 @@
+# dose_stats.py
+import math
+
+# Dose value used for DRL comparison per modality, in order of preference
+DOSE_METRICS = {
+    "CT": ("TotalDLP", "DLP"),
+    "DX": ("ImageAndFluoroscopyAreaDoseProduct", "TotalDoseAreaProduct"),
+    "XA": ("TotalDoseAreaProduct", "ImageAndFluoroscopyAreaDoseProduct", "DoseAreaProduct"),
+    "MG": ("OrganDose", "AverageGlandularDose")
+}
+
+# Adult DRL value the dose metric is compared to
+DRL_KEYS = {
+    "CT": "DLP",
+    "DX": "DAP",
+    "XA": "DAP",
+    "MG": "AGD"
+}
+
+# Fields that may hold the protocol name, in order of preference
+PROTOCOL_FIELDS = ("AcquisitionProtocol", "ProtocolName", "SeriesDescription")
+
+
+def to_float(value):
+    """Convert a DICOM value to float, None if not numeric"""
+    if value is None or value == '':
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+def get_protocol(row):
+    """Get protocol name of a result row"""
+    for field in PROTOCOL_FIELDS:
+        value = row.get(field)
+        if value:
+            return str(value)
+    return ''
+
+
+def get_month(study_date):
+    """Get YYYY-MM month of a DICOM YYYYMMDD study date, None if not a date"""
+    study_date = str(study_date or '')
+    if len(study_date) < 6 or not study_date[:6].isdigit():
+        return None
+    return f"{study_date[:4]}-{study_date[4:6]}"
+
+
+def get_dose_value(row, modality):
+    """Get the DRL comparison dose value of a result row"""
+    for field in DOSE_METRICS.get(modality, ()):
+        value = to_float(row.get(field))
+        if value is not None:
+            return value
+    return None
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with relative accuracy (log-spaced buckets)"""
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value, count=1):
+        """Add value to the sketch"""
+        if value <= 0:
+            self.zero_count += count
+        else:
+            index = math.ceil(math.log(value) / self.log_gamma)
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += count
+
+    def merge(self, other):
+        """Merge another sketch with the same accuracy into this one"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def quantile(self, q):
+        """Get approximate value of quantile q (0..1)"""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def to_dict(self):
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'zero_count': self.zero_count,
+            'buckets': {str(k): v for k, v in self.buckets.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['relative_accuracy'])
+        sketch.zero_count = data['zero_count']
+        sketch.buckets = {int(k): v for k, v in data['buckets'].items()}
+        sketch.count = sketch.zero_count + sum(sketch.buckets.values())
+        return sketch
+
+
+class RunningStats:
+    """Incrementally updated count, sum, min/max and quantiles of a dose value"""
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.sketch = QuantileSketch()
+
+    def add(self, value):
+        """Add value to the statistics"""
+        self.count += 1
+        self.total += value
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+        self.sketch.add(value)
+
+    def merge(self, other):
+        """Merge statistics collected elsewhere into this one"""
+        if not other.count:
+            return
+        self.count += other.count
+        self.total += other.total
+        self.minimum = other.minimum if self.minimum is None else min(self.minimum, other.minimum)
+        self.maximum = other.maximum if self.maximum is None else max(self.maximum, other.maximum)
+        self.sketch.merge(other.sketch)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def quantile(self, q):
+        return self.sketch.quantile(q)
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total': self.total,
+            'minimum': self.minimum,
+            'maximum': self.maximum,
+            'sketch': self.sketch.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.count = data['count']
+        stats.total = data['total']
+        stats.minimum = data['minimum']
+        stats.maximum = data['maximum']
+        stats.sketch = QuantileSketch.from_dict(data['sketch'])
+        return stats
+
+
+def print_comparison(modality, comparison):
+    """Print DRL comparison of aggregates as a text table"""
+    print(f"\n{modality}")
+    print(f"{'Protocol':<30} {'N':>6} {'Mean':>10} {'Median':>10} {'DRL':>10} {'Dev %':>8}")
+    for row in comparison:
+        print(f"{row['protocol'][:30]:<30} {row['count']:>6} {row['avg_value']:>10.2f} "
+              f"{row['median']:>10.2f} {row['drl_level']:>10.2f} {row['percentage']:>+8.1f}")
+
+
+def compare_aggregates(drl_config, modality, aggregates):
+    """Compare per-protocol running statistics with the adult DRL values"""
+    comparison = []
+    drl_key = DRL_KEYS.get(modality)
+    for protocol, stats in sorted(aggregates.items()):
+        drl_protocol, drl_data = drl_config.get_matching_protocol(modality, protocol)
+        if not drl_data or not stats.count:
+            continue
+        drl_level = drl_data.get('adult', drl_data).get(drl_key)
+        if not drl_level:
+            continue
+        comparison.append({
+            'protocol': protocol,
+            'drl_protocol': drl_protocol,
+            'count': stats.count,
+            'avg_value': stats.mean,
+            'median': stats.quantile(0.5),
+            'p75': stats.quantile(0.75),
+            'drl_level': drl_level,
+            'percentage': stats.mean / drl_level * 100 - 100
+        })
+    return comparison
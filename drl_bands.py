@@ -0,0 +1,92 @@
+# drl_bands.py
+# Interval tables of child age groups (CT) and compressed thickness ranges (MG)
+
+# Bounds are whole years or millimetres, "0-1" and "2-5" leave no gap
+BAND_STEP = 1
+
+
+def parse_range(range_str):
+    """Parse "min-max" range key into (min, max) floats"""
+    low, high = map(float, range_str.split('-'))
+    return low, high
+
+
+def protocol_ranges(modality, protocol_data):
+    """Range keys and DRL values of a protocol, {} if the modality has none"""
+    if modality == "CT":
+        return dict(protocol_data.get('child', {}))
+    if modality == "MG":
+        return dict(protocol_data.get('thickness_ranges', {}))
+    return {}
+
+
+class BandTable:
+    """Sorted inclusive ranges of one protocol, assigns values to bands in one NumPy call
+
+    Bands sharing a bound ("0-1" and "1-5") assign it to the lower band, like
+    the configured order did. order holds the configured position of each band.
+    """
+    def __init__(self, ranges):
+        import numpy as np
+        bands = sorted((parse_range(key), position, key, value)
+                       for position, (key, value) in enumerate(ranges.items()))
+        self.labels = [key for _, _, key, _ in bands]
+        self.values = [value for _, _, _, value in bands]
+        self.order = np.array([position for _, position, _, _ in bands], dtype=int)
+        self.lows = np.array([low for (low, _), _, _, _ in bands], dtype=float)
+        self.highs = np.array([high for (_, high), _, _, _ in bands], dtype=float)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def assign(self, values):
+        """Band index of each value, -1 outside all bands (and for NaN)"""
+        import numpy as np
+        values = np.asarray(values, dtype=float)
+        if not len(self):
+            return np.full(values.shape, -1, dtype=int)
+        # Last band starting below the value, or the band starting at it
+        below = np.searchsorted(self.lows, values, side='left') - 1
+        at = below + 1
+        last = len(self) - 1
+        in_below = (below >= 0) & (values <= self.highs[np.clip(below, 0, last)])
+        in_at = (at <= last) & (values == self.lows[np.clip(at, 0, last)])
+        return np.where(in_below, below, np.where(in_at, at, -1))
+
+
+def build_band_tables(modality):
+    """Builder of {protocol: BandTable} for DRLConfiguration.derived"""
+    def build(protocols):
+        tables = {}
+        for name, data in protocols.items():
+            try:
+                tables[name] = BandTable(protocol_ranges(modality, data))
+            except ValueError as e:
+                print(f"DEBUG: Invalid range of {modality} protocol {name}: {str(e)}")
+                tables[name] = BandTable({})
+        return tables
+    return build
+
+
+def range_problems(modality, protocols):
+    """Messages about invalid, overlapping and non-contiguous ranges of the protocols"""
+    problems = []
+    for name, data in protocols.items():
+        bands = []
+        for key in protocol_ranges(modality, data):
+            try:
+                low, high = parse_range(key)
+            except ValueError:
+                problems.append(f"{modality} {name}: invalid range '{key}'")
+                continue
+            if low > high:
+                problems.append(f"{modality} {name}: range '{key}' is reversed")
+                continue
+            bands.append((low, high, key))
+        bands.sort()
+        for (_, high, key), (low, _, next_key) in zip(bands, bands[1:]):
+            if low < high:
+                problems.append(f"{modality} {name}: ranges '{key}' and '{next_key}' overlap")
+            elif low - high > BAND_STEP:
+                problems.append(f"{modality} {name}: gap between ranges '{key}' and '{next_key}'")
+    return problems
@@ -1,197 +1,440 @@
 # drl_config.py
 import json
-import pandas as pd
 import os
+import re
+import copy
+import atexit
+import threading
 import traceback
+from collections import namedtuple
+from types import MappingProxyType
+from protocol_cache import ProtocolMappingCache, NOT_CACHED, normalize_protocol, protocol_fingerprint
+from protocol_matcher import FuzzyProtocolIndex
+from drl_bands import build_band_tables, range_problems
+from scan_checkpoint import SCAN_STATE_DIR, checkpoint_key
+
+# Numeric columns of the protocol import tables per modality
+IMPORT_COLUMNS = {
+    "CT": {'required': ['Adult DLP', 'Adult CTDIvol'], 'optional': []},
+    "XA": {'required': ['Adult DAP'],
+           'optional': ['Adult AirKerma', 'Adult FluoroTime', 'Child DAP', 'Child AirKerma', 'Child FluoroTime']},
+    "DX": {'required': ['Adult DAP'], 'optional': ['Adult ESD', 'Child DAP', 'Child ESD']},
+    "MG": {'required': ['AGD'], 'optional': []}
+}
+
+# Columns of child age groups (CT) and compressed thickness ranges (MG)
+RANGE_COLUMNS = {
+    "CT": re.compile(r'^Child (\d+-\d+) (DLP|CTDIvol)$'),
+    "MG": re.compile(r'^AGD_(\d+-\d+)$')
+}
+
+MAX_REPORTED_ERRORS = 20
+
+DEFAULT_CONFIG_DIR = "drl_configs"
+
+# Immutable view of one modality's protocols, version changes with every edit
+ConfigSnapshot = namedtuple('ConfigSnapshot', ['modality', 'version', 'protocols'])
+
+_shared_config = None
+_shared_lock = threading.Lock()
+
+
+def get_drl_config():
+    """Get the DRL configuration shared by the reader and the config window"""
+    global _shared_config
+    with _shared_lock:
+        if _shared_config is None:
+            _shared_config = DRLConfiguration()
+            atexit.register(_shared_config.flush)
+        return _shared_config
+
+
+def freeze(value):
+    """Recursively convert dicts and lists to read-only mappings and tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def thaw(value):
+    """Convert a frozen value back to plain dicts and lists"""
+    if isinstance(value, (dict, MappingProxyType)):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return copy.deepcopy(value)
+
 
 class DRLConfiguration:
-    def __init__(self):
+    def __init__(self, config_dir=DEFAULT_CONFIG_DIR, save_delay=0.5):
         print("DEBUG: Initializing DRLConfiguration")
-        self.config_dir = "drl_configs"
+        self.config_dir = config_dir
         self.config_files = {
             "CT": "ct_drl_config.json",
             "XA": "xa_drl_config.json",
             "MG": "mg_drl_config.json",
             "DX": "dx_drl_config.json"
         }
-        self.protocols = {
-            "CT": {},
-            "XA": {},
-            "MG": {},
-            "DX": {}
-        }
-        self.ensure_config_directory()
-        self.load_all_configs()
+        # Modalities are loaded on first access, edits replace the snapshot (copy-on-write)
+        self.snapshots = {}
+        self.version = 0
+        self.save_delay = save_delay
+        self.dirty = set()
+        self.save_timer = None
+        self.lock = threading.RLock()
+        self.derived_cache = {}
+        self._mapping_cache = None
+        # Confidence threshold (0-1) of fuzzy protocol matching, None for substring matching only
+        self.fuzzy_threshold = None
         print("DEBUG: DRLConfiguration initialized")
     
     def ensure_config_directory(self):
         """Ensure configuration directory exists"""
-        print(f"DEBUG: Ensuring config directory exists: {self.config_dir}")
         if not os.path.exists(self.config_dir):
             os.makedirs(self.config_dir)
             print(f"DEBUG: Created directory: {self.config_dir}")
-        
-        # Create empty config files if they don't exist
-        for modality, filename in self.config_files.items():
-            filepath = os.path.join(self.config_dir, filename)
-            if not os.path.exists(filepath):
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    json.dump({}, f)
-                print(f"DEBUG: Created empty config file: {filepath}")
+    
+    def load_config(self, modality):
+        """Load configuration for specific modality"""
+        filepath = os.path.join(self.config_dir, self.config_files[modality])
+        print(f"DEBUG: Loading config for {modality} from {filepath}")
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                protocols = json.load(f)
+            print(f"DEBUG: Loaded {len(protocols)} protocols for {modality}")
+            for problem in range_problems(modality, protocols):
+                print(f"Warning: {problem}")
+        except FileNotFoundError:
+            print(f"DEBUG: Config file not found for {modality}")
+            protocols = {}
+        return protocols
     
     def load_all_configs(self):
-        """Load configuration for all modalities"""
+        """Reload configuration for all modalities from disk"""
         print("DEBUG: Loading all configurations")
-        for modality, filename in self.config_files.items():
-            try:
-                filepath = os.path.join(self.config_dir, filename)
-                print(f"DEBUG: Loading config for {modality} from {filepath}")
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    self.protocols[modality] = json.load(f)
-                print(f"DEBUG: Loaded {len(self.protocols[modality])} protocols for {modality}")
-            except FileNotFoundError:
-                print(f"DEBUG: Config file not found for {modality}")
-                self.protocols[modality] = {}
+        for modality in self.config_files:
+            self.publish(modality, self.load_config(modality), save=False)
+    
+    def snapshot(self, modality):
+        """Get immutable snapshot of a modality's protocols"""
+        snapshot = self.snapshots.get(modality)
+        if snapshot is None:
+            with self.lock:
+                snapshot = self.snapshots.get(modality)
+                if snapshot is None:
+                    protocols = self.load_config(modality) if modality in self.config_files else {}
+                    snapshot = self.publish(modality, protocols, save=False)
+        return snapshot
+    
+    def publish(self, modality, protocols, save=True):
+        """Replace a modality's protocols with a new snapshot and schedule saving"""
+        with self.lock:
+            self.version += 1
+            snapshot = ConfigSnapshot(modality, self.version, freeze(protocols))
+            self.snapshots[modality] = snapshot
+            if save:
+                self.save_config(modality)
+        return snapshot
+    
+    def derived(self, modality, name, builder):
+        """Get a value derived from a modality's protocols, cached per snapshot version"""
+        snapshot = self.snapshot(modality)
+        key = (modality, name)
+        cached = self.derived_cache.get(key)
+        if cached is None or cached[0] != snapshot.version:
+            cached = (snapshot.version, builder(snapshot.protocols))
+            self.derived_cache[key] = cached
+        return cached[1]
     
     def save_config(self, modality):
-        """Save configuration for specific modality"""
+        """Schedule saving configuration for specific modality, edits are batched"""
+        with self.lock:
+            self.dirty.add(modality)
+            if self.save_delay <= 0:
+                self.flush()
+                return
+            if self.save_timer:
+                self.save_timer.cancel()
+            self.save_timer = threading.Timer(self.save_delay, self.flush)
+            self.save_timer.daemon = True
+            self.save_timer.start()
+    
+    def flush(self):
+        """Write pending configuration changes to disk"""
+        with self.lock:
+            if self.save_timer:
+                self.save_timer.cancel()
+                self.save_timer = None
+            dirty, self.dirty = self.dirty, set()
+            for modality in dirty:
+                self.write_config(modality)
+            if self._mapping_cache is not None:
+                self._mapping_cache.save()
+    
+    def write_config(self, modality):
+        """Atomically write configuration of a modality (temporary file + rename)"""
         print(f"DEBUG: Saving configuration for {modality}")
+        self.ensure_config_directory()
         filepath = os.path.join(self.config_dir, self.config_files[modality])
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(self.protocols[modality], f, indent=4, ensure_ascii=False)
+        tmp_path = filepath + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(thaw(self.snapshot(modality).protocols), f, indent=4, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
         print(f"DEBUG: Configuration saved to {filepath}")
     
     def add_protocol(self, modality, name, data):
         """Add protocol for specific modality"""
         print(f"DEBUG: Adding protocol {name} for {modality}")
-        if modality not in self.protocols:
-            self.protocols[modality] = {}
-        self.protocols[modality][name] = data
-        self.save_config(modality)
+        with self.lock:
+            protocols = dict(self.snapshot(modality).protocols)
+            protocols[name] = data
+            self.publish(modality, protocols)
     
     def delete_protocol(self, modality, name):
         """Delete protocol for specific modality"""
         print(f"DEBUG: Deleting protocol {name} for {modality}")
-        if name in self.protocols.get(modality, {}):
-            del self.protocols[modality][name]
-            self.save_config(modality)
+        with self.lock:
+            protocols = dict(self.snapshot(modality).protocols)
+            if name in protocols:
+                del protocols[name]
+                self.publish(modality, protocols)
     
     def get_protocol(self, modality, name):
-        """Get protocol for specific modality"""
+        """Get editable copy of a protocol for specific modality"""
         print(f"DEBUG: Getting protocol {name} for {modality}")
-        return self.protocols.get(modality, {}).get(name, None)
+        data = self.snapshot(modality).protocols.get(name, None)
+        return thaw(data) if data is not None else None
     
     def get_all_protocols(self, modality):
-        """Get all protocols for specific modality"""
+        """Get all protocols for specific modality (read-only)"""
         print(f"DEBUG: Getting all protocols for {modality}")
-        return self.protocols.get(modality, {})
+        return self.snapshot(modality).protocols
+
+    def get_matcher(self, modality):
+        """Get normalized match patterns of a modality in protocol order"""
+        def build(protocols):
+            return [(protocol, [normalize_protocol(pattern) for pattern in data['protocol_match']])
+                    for protocol, data in protocols.items()]
+        return self.derived(modality, 'matcher', build)
+
+    def match_protocol(self, modality, key):
+        """Find first protocol with a match pattern contained in a normalized protocol string"""
+        for protocol, patterns in self.get_matcher(modality):
+            if any(pattern in key for pattern in patterns):
+                return protocol
+        return None
+
+    def get_fuzzy_index(self, modality):
+        """Get trigram index of a modality's match patterns"""
+        return self.derived(modality, 'fuzzy_index',
+                            lambda protocols: FuzzyProtocolIndex(self.get_matcher(modality)))
+
+    def get_band_table(self, modality, protocol_name):
+        """Get interval table of a protocol's child age groups (CT) or thickness ranges (MG)"""
+        return self.derived(modality, 'band_tables', build_band_tables(modality))[protocol_name]
+
+    def score_protocol(self, modality, key):
+        """Get (protocol, score) of a normalized protocol string, substring matches score 1.0"""
+        protocol = self.match_protocol(modality, key)
+        if protocol is not None:
+            return protocol, 1.0
+        if self.fuzzy_threshold is None:
+            return None, None
+        return self.get_fuzzy_index(modality).match(key, self.fuzzy_threshold)
+
+    def get_protocol_match(self, modality, protocol_name):
+        """Get matching protocol name and match score, memoized per distinct protocol string"""
+        fingerprint = self.derived(modality, 'fingerprint', protocol_fingerprint)
+        # Fuzzy results are cached apart from substring results, per threshold
+        cache_modality = modality
+        if self.fuzzy_threshold is not None:
+            cache_modality = f"{modality}~{self.fuzzy_threshold}"
+        key = normalize_protocol(protocol_name)
+        with self.lock:
+            match = self.mapping_cache.get(cache_modality, fingerprint, key)
+            if match is NOT_CACHED:
+                print(f"\nDEBUG: Looking for matching protocol for {modality}: {protocol_name}")
+                match = self.score_protocol(modality, key)
+                self.mapping_cache.put(cache_modality, fingerprint, key, match)
+                print(f"DEBUG: Found matching protocol: {match[0]} (score {match[1]})" if match[0]
+                      else "DEBUG: No matching protocol found")
+        return tuple(match)
 
     def get_matching_protocol(self, modality, protocol_name):
-        """Get matching protocol for specific modality"""
-        print(f"\nDEBUG: Looking for matching protocol for {modality}: {protocol_name}")
-        for protocol, data in self.protocols.get(modality, {}).items():
-            print(f"DEBUG: Checking match patterns for {protocol}: {data['protocol_match']}")
-            if any(pattern.lower() in protocol_name.lower() 
-                  for pattern in data['protocol_match']):
-                print(f"DEBUG: Found matching protocol: {protocol}")
-                return protocol, data
-        print("DEBUG: No matching protocol found")
-        return None, None
+        """Get matching protocol name and data for specific modality"""
+        protocol, _ = self.get_protocol_match(modality, protocol_name)
+        if protocol is None:
+            return None, None
+        return protocol, self.snapshot(modality).protocols[protocol]
 
-    def import_from_excel(self, modality, file_path):
-        """Import protocols from Excel for specific modality"""
-        print(f"DEBUG: Importing {modality} protocols from Excel")
-        try:
-            df = pd.read_excel(file_path)
-            new_protocols = {}
+    @property
+    def mapping_cache(self):
+        """Persisted protocol string -> DRL protocol cache, loaded on first use"""
+        if self._mapping_cache is None:
+            path = None
+            if os.path.abspath(self.config_dir) != os.path.abspath(DEFAULT_CONFIG_DIR):
+                # Other DRL sets (e.g. proposed values) keep their own mappings
+                key = checkpoint_key(os.path.abspath(self.config_dir))
+                path = os.path.join(SCAN_STATE_DIR, f"protocol_mapping_{key}.json")
+            self._mapping_cache = ProtocolMappingCache(path)
+        return self._mapping_cache
+
+    def read_import_sheets(self, modality, file_path):
+        """Read import tables: {modality: DataFrame} from CSV or Excel workbook"""
+        import pandas as pd
+        if file_path.lower().endswith('.csv'):
+            if modality == "ALL":
+                raise ValueError("CSV file holds a single modality, select the modality first")
+            return {modality: pd.read_csv(file_path, dtype=object)}
+        
+        sheets = pd.read_excel(file_path, sheet_name=None, dtype=object)
+        by_name = {name.strip().upper(): df for name, df in sheets.items()}
+        if modality == "ALL":
+            # One sheet per modality, named after it
+            tables = {name: df for name, df in by_name.items() if name in self.config_files}
+            if not tables:
+                raise ValueError(f"No sheets named {', '.join(self.config_files)} found")
+            return tables
+        # Sheet named after the modality, otherwise the first sheet
+        return {modality: by_name.get(modality, next(iter(sheets.values())))}
+    
+    def coerce_columns(self, df, columns, sheet, errors, required=False):
+        """Convert columns to float at once, recording invalid and missing cells"""
+        import pandas as pd
+        values = {}
+        for column in columns:
+            if column not in df.columns:
+                if required:
+                    errors.append(f"{sheet}: missing column '{column}'")
+                continue
+            raw = df[column]
+            numeric = pd.to_numeric(raw, errors='coerce')
+            blank = raw.isna() | (raw.astype(str).str.strip() == '')
+            for row in df.index[numeric.isna() & ~blank]:
+                # Excel/CSV line numbers: header is line 1
+                errors.append(f"{sheet} row {row + 2}, '{column}': invalid number '{raw[row]}'")
+            if required:
+                for row in df.index[blank]:
+                    errors.append(f"{sheet} row {row + 2}, '{column}': value missing")
+            values[column] = [None if pd.isna(v) else float(v) for v in numeric.tolist()]
+        return values
+    
+    def build_protocols(self, modality, df, errors):
+        """Build protocol configuration of one modality from an import table"""
+        import pandas as pd
+        # Blank rows are dropped but keep their index, so messages point at spreadsheet lines
+        df = df.dropna(how='all')
+        lines = [label + 2 for label in df.index]
+        df.columns = [str(column).strip() for column in df.columns]
+        for column in ('Protocol', 'Match Patterns'):
+            if column not in df.columns:
+                errors.append(f"{modality}: missing column '{column}'")
+        if errors:
+            return {}
+        
+        names = df['Protocol'].fillna('').astype(str).str.strip().tolist()
+        patterns = [[x.strip() for x in str(value).split(',') if x.strip()]
+                    if not pd.isna(value) else [] for value in df['Match Patterns'].tolist()]
+        seen = set()
+        for row, (name, match) in enumerate(zip(names, patterns)):
+            if not name:
+                errors.append(f"{modality} row {lines[row]}, 'Protocol': value missing")
+            elif name in seen:
+                errors.append(f"{modality} row {lines[row]}, 'Protocol': duplicate protocol '{name}'")
+            seen.add(name)
+            if not match:
+                errors.append(f"{modality} row {lines[row]}, 'Match Patterns': value missing")
+        
+        required = IMPORT_COLUMNS[modality]['required']
+        optional = [c for c in IMPORT_COLUMNS[modality]['optional'] if c in df.columns]
+        values = self.coerce_columns(df, required, modality, errors, required=True)
+        values.update(self.coerce_columns(df, optional, modality, errors))
+        
+        # Range columns: 'Child 1-5 DLP' for CT, 'AGD_41-50' for MG
+        ranges = {}
+        range_pattern = RANGE_COLUMNS.get(modality)
+        for column in df.columns:
+            match = range_pattern.match(column) if range_pattern else None
+            if match:
+                ranges.setdefault(match.group(1), {})[match.group(2) if modality == "CT" else 'AGD'] = column
+        range_columns = [column for columns in ranges.values() for column in columns.values()]
+        values.update(self.coerce_columns(df, range_columns, modality, errors))
+        if errors:
+            return {}
+        
+        protocols = {}
+        for row, name in enumerate(names):
+            def value(column):
+                return values[column][row] if column in values else None
             
             if modality == "CT":
-                # CT specific import logic
-                for _, row in df.iterrows():
-                    protocol_data = {
-                        'protocol_match': [x.strip() for x in row['Match Patterns'].split(',')],
-                        'adult': {
-                            'DLP': float(row['Adult DLP']),
-                            'CTDIvol': float(row['Adult CTDIvol'])
-                        },
-                        'child': {}
-                    }
-                    
-                    # Process children data
-                    age_ranges = ['0-1', '1-5', '5-10', '10-15']
-                    for age_range in age_ranges:
-                        if f'Child {age_range} DLP' in row and f'Child {age_range} CTDIvol' in row:
-                            protocol_data['child'][age_range] = {
-                                'DLP': float(row[f'Child {age_range} DLP']),
-                                'CTDIvol': float(row[f'Child {age_range} CTDIvol'])
-                            }
-                    
-                    new_protocols[row['Protocol']] = protocol_data
-            
+                data = {
+                    'protocol_match': patterns[row],
+                    'adult': {'DLP': value('Adult DLP'), 'CTDIvol': value('Adult CTDIvol')},
+                    'child': {}
+                }
+                for age_range, columns in ranges.items():
+                    dlp, ctdi = value(columns.get('DLP')), value(columns.get('CTDIvol'))
+                    if dlp is not None and ctdi is not None:
+                        data['child'][age_range] = {'DLP': dlp, 'CTDIvol': ctdi}
+                    elif dlp is not None or ctdi is not None:
+                        errors.append(f"{modality} row {lines[row]}: child age group {age_range} needs both DLP and CTDIvol")
             elif modality == "XA":
-                # X-Ray Angiography specific import logic
-                for _, row in df.iterrows():
-                    protocol_data = {
-                        'protocol_match': [x.strip() for x in row['Match Patterns'].split(',')],
-                        'adult': {
-                            'DAP': float(row['Adult DAP']),
-                            'AirKerma': float(row['Adult AirKerma']) if 'Adult AirKerma' in row else None,
-                            'FluoroTime': float(row['Adult FluoroTime']) if 'Adult FluoroTime' in row else None
-                        },
-                        'child': {}
-                    }
-                    
-                    # Process children data if available
-                    if 'Child DAP' in row:
-                        protocol_data['child']['DAP'] = float(row['Child DAP'])
-                    if 'Child AirKerma' in row:
-                        protocol_data['child']['AirKerma'] = float(row['Child AirKerma'])
-                    if 'Child FluoroTime' in row:
-                        protocol_data['child']['FluoroTime'] = float(row['Child FluoroTime'])
-                    
-                    new_protocols[row['Protocol']] = protocol_data
-                    
+                data = {
+                    'protocol_match': patterns[row],
+                    'adult': {'DAP': value('Adult DAP'),
+                              'AirKerma': value('Adult AirKerma'),
+                              'FluoroTime': value('Adult FluoroTime')},
+                    'child': {key: value(f'Child {key}') for key in ('DAP', 'AirKerma', 'FluoroTime')
+                              if value(f'Child {key}') is not None}
+                }
             elif modality == "DX":
-                # Digital X-Ray specific import logic
-                for _, row in df.iterrows():
-                    protocol_data = {
-                        'protocol_match': [x.strip() for x in row['Match Patterns'].split(',')],
-                        'adult': {
-                            'DAP': float(row['Adult DAP']),
-                            'ESD': float(row['Adult ESD']) if 'Adult ESD' in row else None
-                        },
-                        'child': {}
-                    }
-                    
-                    # Process children data if available
-                    if 'Child DAP' in row:
-                        protocol_data['child']['DAP'] = float(row['Child DAP'])
-                    if 'Child ESD' in row:
-                        protocol_data['child']['ESD'] = float(row['Child ESD'])
-                    
-                    new_protocols[row['Protocol']] = protocol_data
-            
+                data = {
+                    'protocol_match': patterns[row],
+                    'adult': {'DAP': value('Adult DAP'), 'ESD': value('Adult ESD')},
+                    'child': {key: value(f'Child {key}') for key in ('DAP', 'ESD')
+                              if value(f'Child {key}') is not None}
+                }
             elif modality == "MG":
-                # Mammography specific import logic
-                for _, row in df.iterrows():
-                    protocol_data = {
-                        'protocol_match': [x.strip() for x in row['Match Patterns'].split(',')],
-                        'AGD': float(row['AGD']),
-                        'thickness_ranges': {}
-                    }
-                    
-                    # Process thickness ranges if available
-                    thickness_ranges = ['20-30', '31-40', '41-50', '51-60', '61-70', '71-80', '81-90']
-                    for range_ in thickness_ranges:
-                        if f'AGD_{range_}' in row:
-                            protocol_data['thickness_ranges'][range_] = float(row[f'AGD_{range_}'])
-                    
-                    new_protocols[row['Protocol']] = protocol_data
+                data = {
+                    'protocol_match': patterns[row],
+                    'AGD': value('AGD'),
+                    'thickness_ranges': {range_: value(columns['AGD']) for range_, columns in ranges.items()
+                                         if value(columns['AGD']) is not None}
+                }
+            protocols[name] = data
+        return protocols
+    
+    def import_from_excel(self, modality, file_path):
+        """Import protocols from Excel or CSV for specific modality ("ALL": one sheet per modality)"""
+        print(f"DEBUG: Importing {modality} protocols from {file_path}")
+        try:
+            tables = self.read_import_sheets(modality, file_path)
+            errors = []
+            imported = {}
+            for sheet_modality, df in tables.items():
+                # Each sheet is validated on its own, errors of an earlier sheet don't stop later ones
+                sheet_errors = []
+                imported[sheet_modality] = self.build_protocols(sheet_modality, df, sheet_errors)
+                errors.extend(sheet_errors)
+            
+            if errors:
+                print(f"DEBUG: Import failed with {len(errors)} errors")
+                shown = errors[:MAX_REPORTED_ERRORS]
+                if len(errors) > len(shown):
+                    shown.append(f"... and {len(errors) - len(shown)} more")
+                return False, f"Import failed, {len(errors)} invalid cells:\n" + "\n".join(shown)
             
-            self.protocols[modality] = new_protocols
-            self.save_config(modality)
-            print(f"DEBUG: Import successful for {modality}")
-            return True, "Import successful"
+            # Publish only after every sheet is valid
+            for sheet_modality, protocols in imported.items():
+                self.publish(sheet_modality, protocols)
+            summary = ", ".join(f"{m}: {len(p)}" for m, p in imported.items())
+            print(f"DEBUG: Import successful - {summary}")
+            return True, f"Import successful ({summary} protocols)"
         except Exception as e:
             print(f"DEBUG: Import error - {str(e)}")
             print(f"DEBUG: Full error: {traceback.format_exc()}")
@@ -201,11 +444,12 @@ class DRLConfiguration:
         """Export protocols to Excel for specific modality"""
         print(f"DEBUG: Exporting {modality} protocols to Excel")
         try:
+            import pandas as pd
             data = []
             
             if modality == "CT":
                 # CT specific export logic
-                for protocol_name, protocol_data in self.protocols[modality].items():
+                for protocol_name, protocol_data in self.get_all_protocols(modality).items():
                     row = {
                         'Protocol': protocol_name,
                         'Match Patterns': ','.join(protocol_data['protocol_match']),
@@ -221,7 +465,7 @@ class DRLConfiguration:
             
             elif modality == "XA":
                 # X-Ray Angiography specific export logic
-                for protocol_name, protocol_data in self.protocols[modality].items():
+                for protocol_name, protocol_data in self.get_all_protocols(modality).items():
                     row = {
                         'Protocol': protocol_name,
                         'Match Patterns': ','.join(protocol_data['protocol_match']),
@@ -239,7 +483,7 @@ class DRLConfiguration:
             
             elif modality == "DX":
                 # Digital X-Ray specific export logic
-                for protocol_name, protocol_data in self.protocols[modality].items():
+                for protocol_name, protocol_data in self.get_all_protocols(modality).items():
                     row = {
                         'Protocol': protocol_name,
                         'Match Patterns': ','.join(protocol_data['protocol_match']),
@@ -255,7 +499,7 @@ class DRLConfiguration:
             
             elif modality == "MG":
                 # Mammography specific export logic
-                for protocol_name, protocol_data in self.protocols[modality].items():
+                for protocol_name, protocol_data in self.get_all_protocols(modality).items():
                     row = {
                         'Protocol': protocol_name,
                         'Match Patterns': ','.join(protocol_data['protocol_match']),
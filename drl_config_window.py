@@ -1,13 +1,13 @@
 # drl_config_window.py
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from drl_config import DRLConfiguration
+from drl_config import get_drl_config
 import traceback
 
 class DRLConfigWindow:
     def __init__(self, parent):
         print("DEBUG: Initializing DRL Config Window")
-        self.drl_config = DRLConfiguration()
+        self.drl_config = get_drl_config()
         self.window = tk.Toplevel(parent)
         self.window.title("DRL Configuration")
         self.window.geometry("900x700")
@@ -89,6 +89,8 @@ class DRLConfigWindow:
                   command=self.save_changes).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="Import from Excel", 
                   command=self.import_excel).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Import Workbook (all)", 
+                  command=lambda: self.import_excel(all_modalities=True)).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="Export to Excel", 
                   command=self.export_excel).pack(side=tk.LEFT, padx=5)
         
@@ -407,14 +409,17 @@ class DRLConfigWindow:
         
         return data
     
-    def import_excel(self):
-        """Import protocols from Excel"""
-        file_path = filedialog.askopenfilename(
-            filetypes=[("Excel files", "*.xlsx")]
-        )
+    def import_excel(self, all_modalities=False):
+        """Import protocols from Excel or CSV"""
+        if all_modalities:
+            filetypes = [("Excel files", "*.xlsx")]
+        else:
+            filetypes = [("Excel files", "*.xlsx"), ("CSV files", "*.csv")]
+        file_path = filedialog.askopenfilename(filetypes=filetypes)
         if file_path:
             try:
-                success, message = self.drl_config.import_from_excel(self.modality.get(), file_path)
+                modality = "ALL" if all_modalities else self.modality.get()
+                success, message = self.drl_config.import_from_excel(modality, file_path)
                 if success:
                     self.load_protocols()
                     messagebox.showinfo("Info", message)
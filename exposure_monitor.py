@@ -0,0 +1,85 @@
+# exposure_monitor.py
+# Streaming monitoring of DX exposure index (IEC 62494-1) per protocol and detector
+import math
+from collections import deque
+
+# Deviation index needing review (AAPM TG-116)
+DI_LIMIT = 3.0
+# Robust z-score of DI against the recent exams of the same protocol and detector
+ROBUST_Z_LIMIT = 3.5
+# Exponentially weighted mean DI, flagged when the protocol drifts away from its target
+EWMA_WEIGHT = 0.2
+EWMA_LIMIT = 1.0
+# Exams before the statistical checks start, and exams kept for median/MAD
+MIN_HISTORY = 10
+HISTORY_SIZE = 200
+
+
+def deviation_index(row):
+    """DI of a result row, from DeviationIndex or 10 * log10(EI / TEI)"""
+    try:
+        return float(row['DeviationIndex'])
+    except (KeyError, TypeError, ValueError):
+        pass
+    try:
+        ei = float(row['ExposureIndex'])
+        tei = float(row['TargetExposureIndex'])
+        return 10 * math.log10(ei / tei) if ei > 0 and tei > 0 else None
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def median(values):
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+
+
+class ExposureStats:
+    """EWMA and recent DI values of one protocol and detector"""
+    def __init__(self):
+        self.count = 0
+        self.ewma = None
+        self.history = deque(maxlen=HISTORY_SIZE)
+
+    def check(self, di):
+        """Flags of a new DI against the exams seen so far, then add it"""
+        flags = []
+        if di > DI_LIMIT:
+            flags.append(f"DI > +{DI_LIMIT:g}")
+        elif di < -DI_LIMIT:
+            flags.append(f"DI < -{DI_LIMIT:g}")
+        if self.count >= MIN_HISTORY:
+            center = median(self.history)
+            mad = median([abs(value - center) for value in self.history])
+            if mad > 0 and abs(di - center) / (1.4826 * mad) > ROBUST_Z_LIMIT:
+                flags.append("Outlier")
+        self.ewma = di if self.ewma is None else EWMA_WEIGHT * di + (1 - EWMA_WEIGHT) * self.ewma
+        self.count += 1
+        self.history.append(di)
+        if self.count >= MIN_HISTORY and abs(self.ewma) > EWMA_LIMIT:
+            flags.append("Drift")
+        return flags
+
+
+class ExposureMonitor:
+    """Flags DX exams as they are extracted, statistics are kept per protocol and detector"""
+    def __init__(self):
+        self.stats = {}
+        self.flagged = 0
+
+    def add(self, row):
+        """Add DI and EIFlag columns to a DX image row, returns its flags"""
+        di = deviation_index(row)
+        if di is None:
+            return []
+        key = (row.get('ProtocolName', ''), row.get('DetectorID') or row.get('StationName', ''))
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = ExposureStats()
+        flags = stats.check(di)
+        row['DeviationIndex'] = round(di, 2)
+        row['EIFlag'] = ", ".join(flags)
+        if flags:
+            self.flagged += 1
+        return flags
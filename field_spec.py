@@ -0,0 +1,148 @@
+# field_spec.py
+# Image dose fields per modality, declared in dose_fields.json and compiled to tag number accessors
+import os
+import json
+from functools import lru_cache
+
+# Next to this module, processes may run from any working directory
+FIELD_SPEC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dose_fields.json")
+
+# Read even when no field names them, for the modality check and 'File' of datasets without a file name
+EXTRA_TAGS = ("Modality", "SOPInstanceUID")
+
+# Marks a path that is not present, None and '' are valid element values
+MISSING = object()
+
+
+def entrance_dose(exposure, distance_source_to_patient):
+    """Entrance dose (mGy) from exposure (mAs) and source to patient distance"""
+    return float(exposure) * (100 / float(distance_source_to_patient)) ** 2 * 0.01
+
+
+# Functions of derived fields, called with the values of their args (None if missing)
+DERIVED = {
+    'entrance_dose': entrance_dose
+}
+
+CONVERTERS = {
+    'raw': None,
+    'str': str,
+    'float': float,
+    'int': int
+}
+
+
+def parse_tag(name):
+    """Tag number of a keyword or a "gggg,eeee" tag, None if the keyword is not in the dictionary"""
+    from pydicom.datadict import tag_for_keyword
+    text = name.strip().strip('()')
+    if ',' in text:
+        group, element = text.split(',')
+        return int(group, 16) << 16 | int(element, 16)
+    return tag_for_keyword(text)
+
+
+def compile_path(path):
+    """Accessor of a tag path: "Keyword" or "SequenceKeyword/Keyword" (first item having it)
+
+    Returns (top level tag, accessor), the tag is None for keywords not in the
+    DICOM dictionary, their accessor always misses like Dataset.get does.
+    """
+    tags = [parse_tag(part) for part in path.split('/')]
+    if None in tags:
+        return None, lambda dcm: MISSING
+    if len(tags) == 1:
+        tag = tags[0]
+
+        def get(dcm):
+            element = dcm.get(tag)
+            return MISSING if element is None else element.value
+    elif len(tags) == 2:
+        sequence_tag, tag = tags
+
+        def get(dcm):
+            element = dcm.get(sequence_tag)
+            if element is None:
+                return MISSING
+            for item in element.value or ():
+                inner = item.get(tag)
+                if inner is not None:
+                    return inner.value
+            return MISSING
+    else:
+        raise ValueError(f"Field path {path} is nested deeper than one sequence")
+    return tags[0], get
+
+
+def compile_field(field):
+    """(name, accessor, top level tags) of a field: its paths in order, then derived, then default"""
+    name = field['name']
+    convert = CONVERTERS.get(field.get('type', 'raw'), MISSING)
+    if convert is MISSING:
+        raise ValueError(f"Field {name}: unknown type {field['type']}")
+    default = field.get('default', '')
+    compiled = [compile_path(path) for path in field.get('tags', [])]
+    getters = [get for _, get in compiled]
+    tags = [tag for tag, _ in compiled if tag is not None]
+
+    derived = field.get('derived')
+    if derived:
+        function = DERIVED.get(derived['function'])
+        if function is None:
+            raise ValueError(f"Field {name}: unknown derived function {derived['function']}")
+        compiled_args = [compile_path(path) for path in derived['args']]
+        arg_getters = [get for _, get in compiled_args]
+        tags += [tag for tag, _ in compiled_args if tag is not None]
+
+    def value(dcm):
+        for get in getters:
+            found = get(dcm)
+            if found is MISSING:
+                continue
+            if convert is None:
+                return found
+            try:
+                return convert(found)
+            except (TypeError, ValueError):
+                continue
+        if derived:
+            args = [get(dcm) for get in arg_getters]
+            try:
+                return function(*[None if arg is MISSING else arg for arg in args])
+            except (TypeError, ValueError, ZeroDivisionError):
+                pass
+        return default
+    return name, value, tags
+
+
+class FieldSpec:
+    """Compiled field spec: accessors and specific_tags (partial reads) per modality"""
+    def __init__(self, spec):
+        self.version = spec.get('version')
+        self.common = [compile_field(field) for field in spec.get('common', [])]
+        self.fields = {modality: [compile_field(field) for field in fields]
+                       for modality, fields in spec.get('modalities', {}).items()}
+        self.modalities = tuple(self.fields)
+        common_tags = {tag for _, _, tags in self.common for tag in tags}
+        common_tags.update(parse_tag(name) for name in EXTRA_TAGS)
+        self.specific_tags = {
+            modality: sorted(common_tags.union(tag for _, _, tags in fields for tag in tags))
+            for modality, fields in self.fields.items()
+        }
+
+    def extract_common(self, dcm):
+        return {name: value(dcm) for name, value, _ in self.common}
+
+    def extract(self, dcm, modality):
+        return {name: value(dcm) for name, value, _ in self.fields[modality]}
+
+
+@lru_cache(maxsize=None)
+def get_field_spec(path=FIELD_SPEC_PATH):
+    """Load and compile the field spec once per process
+
+    Errors are raised to the caller, extractors load the spec outside their
+    per file error handling so a missing spec stops the scan.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return FieldSpec(json.load(f))
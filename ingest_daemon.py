@@ -0,0 +1,280 @@
+# ingest_daemon.py
+import os
+import sys
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+import traceback
+from dose_extractor import DoseExtractor, SUPPORTED_MODALITIES
+from dose_stats import compare_aggregates, print_comparison
+from result_store import ResultStore
+from store_pipeline import StorePipeline
+from patient_index import PatientDoseIndex, DEFAULT_INDEX_DIR
+from dicom_sources import is_archive, iter_archive, source_name
+
+# inotify event masks (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_ISDIR = 0x40000000
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+class InotifyWatcher:
+    """Reports completely written files in watched directories using Linux inotify"""
+    def __init__(self, directories, recursive=True):
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.recursive = recursive
+        self.watches = {}
+        for directory in directories:
+            self.add_watch(directory)
+
+    def add_watch(self, directory):
+        """Watch directory (and its subdirectories if recursive)"""
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+        self.watches[wd] = directory
+        if self.recursive:
+            for entry in os.scandir(directory):
+                if entry.is_dir(follow_symlinks=False):
+                    self.add_watch(entry.path)
+
+    def poll(self, timeout):
+        """Wait up to timeout seconds and return list of new file paths"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        paths = []
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(buffer, offset)
+            offset += INOTIFY_EVENT.size
+            name = buffer[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                print("DEBUG: inotify queue overflow, rescan needed")
+                continue
+            path = os.path.join(self.watches.get(wd, ''), os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if self.recursive and mask & (IN_CREATE | IN_MOVED_TO):
+                    self.add_watch(path)
+                    # Files may have landed before the watch was added
+                    paths.extend(entry.path for entry in os.scandir(path) if entry.is_file())
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                paths.append(path)
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Reports new files by periodically comparing directory listings"""
+    def __init__(self, directories, recursive=True, known_paths=None):
+        self.directories = directories
+        self.recursive = recursive
+        self.seen = known_paths if known_paths is not None else set()
+        # Files are reported once their size and mtime are stable across two polls
+        self.pending = {}
+
+    def list_files(self):
+        for directory in self.directories:
+            if self.recursive:
+                for root, _, files in os.walk(directory):
+                    for file in files:
+                        yield os.path.join(root, file)
+            else:
+                for entry in os.scandir(directory):
+                    if entry.is_file():
+                        yield entry.path
+
+    def poll(self, timeout):
+        """Wait timeout seconds and return list of new, completely written files"""
+        time.sleep(timeout)
+        paths = []
+        for path in self.list_files():
+            if path in self.seen:
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signature = (stat.st_size, stat.st_mtime)
+            if self.pending.get(path) == signature:
+                del self.pending[path]
+                self.seen.add(path)
+                paths.append(path)
+            else:
+                self.pending[path] = signature
+        return paths
+
+    def close(self):
+        pass
+
+
+def create_watcher(directories, recursive=True, known_paths=None, polling=False):
+    """Create inotify watcher where available, polling watcher otherwise"""
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(directories, recursive)
+        except (OSError, AttributeError) as e:
+            print(f"DEBUG: inotify not available ({e}), falling back to polling")
+    return PollingWatcher(directories, recursive, known_paths)
+
+
+def file_signature(path):
+    """(mtime, size) of a file, a changed signature means the file is read again"""
+    stat = os.stat(path)
+    return stat.st_mtime, stat.st_size
+
+
+class IngestDaemon:
+    """Watches drop folders and appends dose data of new files to the result store"""
+    def __init__(self, directories, store_path, recursive=True, polling=False,
+                 batch_size=50, flush_interval=5.0, poll_interval=2.0, debug=False,
+                 patient_index_dir=DEFAULT_INDEX_DIR, pseudonymize=False):
+        self.directories = [os.path.abspath(d) for d in directories]
+        self.recursive = recursive
+        self.polling = polling
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.poll_interval = poll_interval
+        self.debug = debug
+        self.extractor = DoseExtractor(debug)
+        self.patient_index = PatientDoseIndex(patient_index_dir, debug)
+        self.store = ResultStore(store_path, debug, pseudonymize)
+        self.pipeline = StorePipeline(self.store, self.patient_index, debug=debug)
+        self.batch = []
+        # (path, mtime, size) of files whose rows are queued, recorded in the store with them
+        self.handled = []
+        self.last_flush = time.time()
+        self.running = False
+
+    def ingest_file(self, path):
+        """Extract one file and queue its data for the store"""
+        if self.debug:
+            print(f"DEBUG: Ingesting {path}")
+        try:
+            signature = file_signature(path)
+        except OSError as e:
+            print(f"DEBUG: Error reading {path}: {str(e)}")
+            return
+        # Archives dropped into the folder are read member by member without extracting
+        broken = []
+        sources = iter_archive(path, self.debug, broken) if is_archive(path) else [path]
+        try:
+            for source in sources:
+                data = self.extractor.extract_routed_data(source)
+                if data:
+                    data['Path'] = source_name(source)
+                    self.batch.append(data)
+                if len(self.batch) >= self.batch_size:
+                    self.flush()
+        finally:
+            # Files without dose data or failing are recorded too, a restart doesn't read them again
+            self.handled.append((path, *signature))
+        for archive, error in broken:
+            print(f"Warning: Could not read archive {archive}: {error}")
+
+    def flush(self):
+        """Write queued results to the store, then record the files they came from"""
+        if self.batch:
+            self.pipeline.finish_batch(self.batch)
+            self.batch = []
+        if self.handled:
+            self.store.add_ingested_files(self.handled)
+            self.handled = []
+        self.last_flush = time.time()
+
+    def initial_sweep(self, known_paths, ingested):
+        """Ingest files that arrived or changed while the daemon was not running
+
+        ingested is {path: (mtime, size)} of the handled files, other
+        known_paths are stored result paths of stores written before files
+        were recorded.
+        """
+        watcher = PollingWatcher(self.directories, self.recursive)
+        for path in watcher.list_files():
+            if path in ingested:
+                try:
+                    if file_signature(path) == ingested[path]:
+                        continue
+                except OSError:
+                    continue
+            elif path in known_paths:
+                continue
+            known_paths.add(path)
+            self.ingest_file(path)
+        self.flush()
+
+    def run(self):
+        """Run until interrupted"""
+        print(f"DEBUG: Watching {', '.join(self.directories)}")
+        ingested = self.store.ingested_files()
+        known_paths = self.store.known_paths()
+        known_paths.update(ingested)
+        watcher = create_watcher(self.directories, self.recursive, known_paths, self.polling)
+        # Sweep after the watch is set up so no file falls between the two
+        self.initial_sweep(known_paths, ingested)
+        self.running = True
+        try:
+            while self.running:
+                for path in watcher.poll(self.poll_interval):
+                    try:
+                        self.ingest_file(path)
+                    except Exception as e:
+                        print(f"DEBUG: Error ingesting {path}: {str(e)}")
+                        if self.debug:
+                            print(f"DEBUG: Full error: {traceback.format_exc()}")
+                if self.batch and time.time() - self.last_flush >= self.flush_interval:
+                    self.flush()
+        except KeyboardInterrupt:
+            print("DEBUG: Ingest interrupted")
+        finally:
+            self.flush()
+            watcher.close()
+            self.store.close()
+
+    def get_comparison(self, drl_config, modality):
+        """Get DRL comparison from the running per-protocol statistics"""
+        return compare_aggregates(drl_config, modality, self.store.get_aggregates(modality))
+
+
+def print_drl_summary(store_path, drl_config):
+    """Print DRL comparison of all modalities from the stored aggregates"""
+    store = ResultStore(store_path)
+    try:
+        for modality in SUPPORTED_MODALITIES:
+            comparison = compare_aggregates(drl_config, modality, store.get_aggregates(modality))
+            if comparison:
+                print_comparison(modality, comparison)
+    finally:
+        store.close()
+
+
+def print_unmapped_protocols(store_path, drl_config):
+    """Print stored protocol strings without a DRL protocol, ranked by exam count"""
+    store = ResultStore(store_path)
+    try:
+        print(f"{'Modality':<9} {'Exams':>7}  Protocol")
+        for modality, protocol, count in store.protocol_counts():
+            if modality in SUPPORTED_MODALITIES and \
+                    drl_config.get_matching_protocol(modality, protocol)[0] is None:
+                print(f"{modality:<9} {count:>7}  {protocol!r}")
+    finally:
+        store.close()
@@ -0,0 +1,201 @@
+# patient_index.py
+import os
+import json
+import time
+from datetime import date
+from contextlib import contextmanager
+from scan_checkpoint import atomic_write_json
+from pseudonymize import pseudonym
+
+DEFAULT_INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "patient_index")
+# Patients are spread over partition files by their pseudonym
+PARTITIONS = 256
+LOCK_TIMEOUT = 10.0
+
+# Effective dose per DLP (mSv / mGy cm) of adult CT examinations by body region
+K_FACTORS = {
+    "HEAD": 0.0021,
+    "NECK": 0.0059,
+    "CHEST": 0.014,
+    "ABDOMEN": 0.015,
+    "PELVIS": 0.015
+}
+# Body region of BodyPartExamined or protocol text, English and Latvian
+REGION_KEYWORDS = (
+    ("HEAD", ("head", "brain", "skull", "galva", "smadz")),
+    ("NECK", ("neck", "kakl")),
+    ("CHEST", ("chest", "thorax", "lung", "krusk", "plaus")),
+    ("ABDOMEN", ("abdomen", "liver", "veder", "aakn")),
+    ("PELVIS", ("pelvis", "iegurn"))
+)
+# Dose indicators of a study, the largest value of its rows: image rows repeat
+# study level values and RDSR rows carry the totals
+INDICATORS = {
+    'DLP': ('TotalDLP', 'DLP'),
+    'CTDIvol': ('CTDIvol',),
+    'SSDE': ('SSDE',),
+    'DAP': ('TotalDoseAreaProduct', 'ImageAndFluoroscopyAreaDoseProduct', 'DoseAreaProduct'),
+    'AGD': ('AverageGlandularDose', 'OrganDose'),
+    'PSD': ('PeakSkinDose',)
+}
+
+
+def body_region(row):
+    """Body region of a result row, None if not recognized"""
+    text = " ".join(str(row.get(key, '')) for key in
+                    ('BodyPartExamined', 'AcquisitionProtocol', 'ProtocolName', 'StudyDescription')).lower()
+    for region, keywords in REGION_KEYWORDS:
+        if any(keyword in text for keyword in keywords):
+            return region
+    return None
+
+
+def number(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value == value else None
+
+
+def window_start(months, today=None):
+    """First StudyDate (YYYYMMDD) of a window of months ending today"""
+    today = today or date.today()
+    month_index = today.year * 12 + today.month - 1 - months
+    year, month = divmod(month_index, 12)
+    return f"{year:04d}{month + 1:02d}{min(today.day, 28):02d}"
+
+
+@contextmanager
+def partition_lock(path):
+    """Exclusive lock file of a partition, shard workers may update the index at once"""
+    lock_path = path + ".lock"
+    deadline = time.time() + LOCK_TIMEOUT
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+            break
+        except FileExistsError:
+            if time.time() > deadline:
+                # Left behind by a crashed process, another waiting worker may remove it first
+                try:
+                    os.remove(lock_path)
+                except FileNotFoundError:
+                    pass
+                deadline = time.time() + LOCK_TIMEOUT
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        try:
+            os.remove(lock_path)
+        except FileNotFoundError:
+            # Taken as stale by a worker that waited longer than LOCK_TIMEOUT
+            pass
+
+
+class PatientDoseIndex:
+    """Per patient study dose indicators and CT effective dose, in hash-partitioned JSON files"""
+    def __init__(self, directory=DEFAULT_INDEX_DIR, debug=False):
+        self.directory = directory
+        self.debug = debug
+        os.makedirs(directory, exist_ok=True)
+
+    def partition_path(self, key):
+        return os.path.join(self.directory, f"part_{int(key[:8], 16) % PARTITIONS:03d}.json")
+
+    def load_partition(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def study_record(self, row):
+        """Dose indicators and effective dose of a result row"""
+        record = {'date': str(row.get('StudyDate', '')), 'modality': str(row.get('Modality', ''))}
+        for name, columns in INDICATORS.items():
+            values = [number(row.get(column)) for column in columns]
+            values = [value for value in values if value is not None]
+            if values:
+                record[name] = values[0]
+        region = body_region(row)
+        if region:
+            record['region'] = region
+            if 'DLP' in record:
+                record['E'] = round(record['DLP'] * K_FACTORS[region], 3)
+        return record
+
+    def merge_study(self, studies, study_key, record):
+        """Merge a row's record into the study, keeping the largest indicator values"""
+        study = studies.setdefault(study_key, {})
+        for name, value in record.items():
+            if isinstance(value, float) and isinstance(study.get(name), float):
+                study[name] = max(study[name], value)
+            elif value or name not in study:
+                study[name] = value
+        # Effective dose follows the merged DLP
+        if 'DLP' in study and 'region' in study:
+            study['E'] = round(study['DLP'] * K_FACTORS[study['region']], 3)
+
+    def records(self, results):
+        """(patient key, study key, record) of result rows, taken before rows are pseudonymized"""
+        records = []
+        for row in results:
+            key = pseudonym(row.get('PatientID', ''))
+            if not key or not row.get('StudyDate'):
+                continue
+            study_key = str(row.get('StudyInstanceUID') or f"{row['StudyDate']}{row.get('StudyTime', '')}")
+            records.append((key, study_key, self.study_record(row)))
+        return records
+
+    def add_results(self, results):
+        """Update the index with result rows"""
+        return self.add_records(self.records(results))
+
+    def add_records(self, records):
+        """Update the index with study records, only the partitions of their patients are rewritten"""
+        partitions = {}
+        for record in records:
+            partitions.setdefault(self.partition_path(record[0]), []).append(record)
+        for path, records in partitions.items():
+            with partition_lock(path):
+                patients = self.load_partition(path)
+                for key, study_key, record in records:
+                    self.merge_study(patients.setdefault(key, {}), study_key, record)
+                atomic_write_json(path, patients)
+        if self.debug:
+            print(f"DEBUG: Updated {len(partitions)} patient index partitions")
+        return len(partitions)
+
+    def patient_studies(self, patient_id):
+        """Studies of a patient, {study key: record}"""
+        key = pseudonym(patient_id)
+        return self.load_partition(self.partition_path(key)).get(key, {}) if key else {}
+
+    def summarize(self, studies, since):
+        """Study count and summed effective dose and DLP of the studies since a StudyDate"""
+        selected = [study for study in studies.values() if study.get('date', '') >= since]
+        return {
+            'studies': len(selected),
+            'E': round(sum(study.get('E', 0.0) for study in selected), 3),
+            'DLP': round(sum(study.get('DLP', 0.0) for study in selected), 1)
+        }
+
+    def cumulative_dose(self, patient_id, months=12, today=None):
+        """Cumulative dose of a patient over the last months"""
+        return self.summarize(self.patient_studies(patient_id), window_start(months, today))
+
+    def patients_above(self, threshold, months=12, today=None):
+        """Pseudonyms and summaries of patients whose cumulative effective dose (mSv) reaches threshold"""
+        since = window_start(months, today)
+        patients = []
+        for name in sorted(os.listdir(self.directory)):
+            if not (name.startswith("part_") and name.endswith(".json")):
+                continue
+            for key, studies in self.load_partition(os.path.join(self.directory, name)).items():
+                summary = self.summarize(studies, since)
+                if summary['E'] >= threshold:
+                    patients.append((key, summary))
+        return sorted(patients, key=lambda item: -item[1]['E'])
@@ -0,0 +1,141 @@
+# prefetch.py
+# Read-ahead of DICOM file headers, opens and reads of high latency mounts (SMB/NFS)
+# run concurrently in a bounded thread pool per mount ahead of the parsing thread
+import io
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from scan_profile import NULL_PROFILER
+
+# Files read ahead on paths without a configured mount, 0 disables read-ahead
+DEFAULT_DEPTH = 4
+HEADER_CHUNK = 64 * 1024
+
+# Pixel Data (7FE0,0010) tag in little and big endian transfer syntaxes
+PIXEL_DATA_TAGS = (b'\xe0\x7f\x10\x00', b'\x7f\xe0\x00\x10')
+# Explicit VR element header: tag, VR, reserved and 32 bit length
+ELEMENT_HEADER_SIZE = 12
+
+
+def pixel_data_offset(data, start, file_size):
+    """Offset of a plausible Pixel Data element header in data from start, None if not found"""
+    for tag in PIXEL_DATA_TAGS:
+        offset = data.find(tag, start)
+        while offset >= 0:
+            header = data[offset + 4:offset + ELEMENT_HEADER_SIZE]
+            if len(header) < 8:
+                # Tag at the end of the chunk, decided once more is read
+                return None
+            # Explicit VR OB/OW, or an implicit VR length that fits the file or is undefined
+            length = int.from_bytes(header[:4], 'little' if tag == PIXEL_DATA_TAGS[0] else 'big')
+            if header[:2] in (b'OB', b'OW') or length == 0xFFFFFFFF or offset + 8 + length <= file_size:
+                return offset
+            offset = data.find(tag, offset + 1)
+    return None
+
+
+def read_header(path):
+    """Bytes of a DICOM file up to its Pixel Data element header, the whole file if it has none"""
+    with open(path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        data = f.read(HEADER_CHUNK)
+        searched = 0
+        while len(data) < file_size:
+            offset = pixel_data_offset(data, searched, file_size)
+            if offset is not None:
+                break
+            # Tags may span the chunk boundary
+            searched = max(0, len(data) - ELEMENT_HEADER_SIZE)
+            chunk = f.read(HEADER_CHUNK)
+            if not chunk:
+                break
+            data += chunk
+    return data
+
+
+def parse_header(path, buffer):
+    """Header-only Dataset of prefetched bytes, None if they can't be parsed and the file must be read"""
+    import pydicom
+    try:
+        dcm = pydicom.dcmread(io.BytesIO(buffer), stop_before_pixels=True)
+    except Exception:
+        return None
+    dcm.filename = path
+    return dcm
+
+
+def normalize_mount(path):
+    return os.path.normcase(os.path.abspath(path)).rstrip(os.sep) + os.sep
+
+
+class Prefetcher:
+    """Reads file headers ahead of the parser, up to the queue depth of each mount
+
+    depths maps mount points (path prefixes) to their depth, paths under none
+    of them share default_depth.
+    """
+    def __init__(self, depths=None, default_depth=DEFAULT_DEPTH, profiler=NULL_PROFILER):
+        self.depths = {normalize_mount(mount): depth for mount, depth in (depths or {}).items()}
+        self.default_depth = default_depth
+        self.profiler = profiler
+        self.mounts = {}
+        self.pools = {}
+
+    def mount_of(self, path):
+        """Configured mount point of a path, '' for the default"""
+        directory = os.path.dirname(path)
+        mount = self.mounts.get(directory)
+        if mount is None:
+            directory_key = normalize_mount(directory)
+            matches = [prefix for prefix in self.depths if directory_key.startswith(prefix)]
+            mount = self.mounts[directory] = max(matches, key=len) if matches else ''
+        return mount
+
+    def depth(self, mount):
+        return self.depths.get(mount, self.default_depth)
+
+    def pool(self, mount):
+        pool = self.pools.get(mount)
+        if pool is None:
+            pool = self.pools[mount] = ThreadPoolExecutor(max_workers=self.depth(mount),
+                                                          thread_name_prefix="prefetch")
+        return pool
+
+    def take(self, pending, outstanding):
+        """Oldest item as (source, header bytes or None), waiting for its read"""
+        source, mount, future = pending.popleft()
+        if future is None:
+            return source, None
+        outstanding[mount] -= 1
+        with self.profiler.stage('prefetch_wait'):
+            try:
+                buffer = future.result()
+            except OSError:
+                # Opened again by the parser, which reports the error
+                return source, None
+        self.profiler.count('bytes_prefetched', len(buffer))
+        return source, buffer
+
+    def iter(self, sources):
+        """Yield (source, header bytes or None) of file paths and Datasets in their order"""
+        pending = deque()
+        outstanding = {}
+        try:
+            for source in sources:
+                if not isinstance(source, str) or self.depth(self.mount_of(source)) <= 0:
+                    pending.append((source, None, None))
+                else:
+                    mount = self.mount_of(source)
+                    while outstanding.get(mount, 0) >= self.depth(mount):
+                        yield self.take(pending, outstanding)
+                    pending.append((source, mount, self.pool(mount).submit(read_header, source)))
+                    outstanding[mount] = outstanding.get(mount, 0) + 1
+                # Sources without a read don't wait for the next one
+                while pending and pending[0][2] is None:
+                    yield self.take(pending, outstanding)
+            while pending:
+                yield self.take(pending, outstanding)
+        finally:
+            for pool in self.pools.values():
+                pool.shutdown(wait=False, cancel_futures=True)
+            self.pools = {}
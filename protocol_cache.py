@@ -0,0 +1,76 @@
+# protocol_cache.py
+import os
+import re
+import json
+import hashlib
+from scan_checkpoint import SCAN_STATE_DIR, atomic_write_json
+
+# Marks a protocol string that has not been looked up yet
+NOT_CACHED = object()
+
+WHITESPACE = re.compile(r'\s+')
+
+# Bumped when the layout of cached entries changes
+CACHE_FORMAT = 2
+
+
+def normalize_protocol(name):
+    """Normalize protocol string for matching: lowercase, single spaces"""
+    return WHITESPACE.sub(' ', str(name)).strip().lower()
+
+
+def protocol_fingerprint(protocols):
+    """Hash of protocol names and match patterns in matching order"""
+    patterns = [(name, list(data['protocol_match'])) for name, data in protocols.items()]
+    return hashlib.sha1(json.dumps(patterns, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class ProtocolMappingCache:
+    """Persisted mapping of normalized protocol strings to matched DRL protocols and scores
+
+    Mappings of a modality are dropped when its protocol names or match
+    patterns change (fingerprint mismatch).
+    """
+    def __init__(self, path=None):
+        self.path = path or os.path.join(SCAN_STATE_DIR, "protocol_mapping.json")
+        self.changed = False
+        self.hits = 0
+        self.misses = 0
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.modalities = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.modalities = {}
+
+    def mappings(self, modality, fingerprint):
+        """Get mappings of a modality, reset if the configuration changed"""
+        entry = self.modalities.get(modality)
+        if (entry is None or entry['fingerprint'] != fingerprint
+                or entry.get('format') != CACHE_FORMAT):
+            entry = {'fingerprint': fingerprint, 'format': CACHE_FORMAT, 'mappings': {}}
+            self.modalities[modality] = entry
+            self.changed = True
+        return entry['mappings']
+
+    def get(self, modality, fingerprint, key):
+        """Get cached [DRL protocol name or None, match score] or NOT_CACHED"""
+        match = self.mappings(modality, fingerprint).get(key, NOT_CACHED)
+        if match is NOT_CACHED:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return match
+
+    def lookups(self):
+        """Get (hits, misses) counts of cache lookups so far"""
+        return self.hits, self.misses
+
+    def put(self, modality, fingerprint, key, match):
+        self.mappings(modality, fingerprint)[key] = list(match)
+        self.changed = True
+
+    def save(self):
+        if self.changed:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            atomic_write_json(self.path, self.modalities)
+            self.changed = False
@@ -0,0 +1,94 @@
+# protocol_matcher.py
+import re
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+TOKEN = re.compile(r'\w+')
+DEFAULT_FUZZY_THRESHOLD = 0.75
+
+
+def tokenize(text):
+    """Split normalized protocol string into word tokens"""
+    return TOKEN.findall(text)
+
+
+def trigrams(token):
+    """Character trigrams of a token padded with spaces, so short tokens still get some"""
+    padded = f" {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FuzzyProtocolIndex:
+    """Inverted trigram index over the tokens of the protocol match patterns
+
+    A pattern scores by how well each of its tokens is found among the tokens
+    of the looked up string (similarity ratio of the best matching token,
+    averaged over the pattern tokens). Only vocabulary tokens sharing a
+    trigram with a looked up token are compared, and only patterns containing
+    such tokens are scored. Tokens with digits (age bands, sizes) only match
+    exactly, so 'head 1-5y' never scores against '10-15y'.
+    """
+    def __init__(self, matcher):
+        # matcher: [(protocol, [normalized pattern, ...]), ...] in protocol order
+        self.vocabulary = []
+        self.token_ids = {}
+        self.index = defaultdict(list)
+        self.patterns = []
+        self.postings = defaultdict(list)
+        for order, (protocol, patterns) in enumerate(matcher):
+            for pattern in patterns:
+                tokens = [self.add_token(token) for token in tokenize(pattern)]
+                if tokens:
+                    for token_id in set(tokens):
+                        self.postings[token_id].append(len(self.patterns))
+                    self.patterns.append((order, protocol, tokens))
+        self.similarity_cache = {}
+
+    def add_token(self, token):
+        token_id = self.token_ids.get(token)
+        if token_id is None:
+            token_id = len(self.vocabulary)
+            self.token_ids[token] = token_id
+            self.vocabulary.append(token)
+            if not any(c.isdigit() for c in token):
+                for gram in trigrams(token):
+                    self.index[gram].append(token_id)
+        return token_id
+
+    def similar_tokens(self, token):
+        """Get {vocabulary token id: similarity} for a looked up token"""
+        similar = self.similarity_cache.get(token)
+        if similar is not None:
+            return similar
+        similar = {}
+        exact = self.token_ids.get(token)
+        if exact is not None:
+            similar[exact] = 1.0
+        if not any(c.isdigit() for c in token):
+            candidates = {token_id for gram in trigrams(token) for token_id in self.index.get(gram, ())}
+            for token_id in candidates:
+                if token_id != exact:
+                    similar[token_id] = SequenceMatcher(None, token, self.vocabulary[token_id]).ratio()
+        self.similarity_cache[token] = similar
+        return similar
+
+    def match(self, key, threshold=DEFAULT_FUZZY_THRESHOLD):
+        """Get best (protocol, score) for a normalized protocol string, (None, score) below threshold"""
+        best = {}
+        for token in set(tokenize(key)):
+            for token_id, score in self.similar_tokens(token).items():
+                if score > best.get(token_id, 0.0):
+                    best[token_id] = score
+
+        # Only patterns sharing a similar token are scored
+        candidates = {pattern for token_id in best for pattern in self.postings[token_id]}
+        best_protocol, best_score, best_order = None, 0.0, None
+        for pattern in candidates:
+            order, protocol, tokens = self.patterns[pattern]
+            score = sum(best.get(token_id, 0.0) for token_id in tokens) / len(tokens)
+            # Ties go to the protocol listed first, like substring matching
+            if score > best_score or (score == best_score and order < best_order):
+                best_protocol, best_score, best_order = protocol, score, order
+        if best_score < threshold:
+            return None, round(best_score, 3)
+        return best_protocol, round(best_score, 3)
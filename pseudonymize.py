@@ -0,0 +1,109 @@
+# pseudonymize.py
+import os
+import hmac
+import hashlib
+import secrets
+from functools import lru_cache
+from scan_checkpoint import SCAN_STATE_DIR
+
+# Per-deployment secret, the environment variable wins over the key file. Patient index keys
+# are pseudonyms too, so every entry point shares the key file of the state directory
+SECRET_ENV = "DOSE_PSEUDONYM_KEY"
+SECRET_PATH = os.path.join(SCAN_STATE_DIR, "pseudonym.key")
+PSEUDONYM_LENGTH = 20
+# Dates of a patient move by the same number of days, at most this many
+MAX_DATE_SHIFT_DAYS = 30
+
+# Columns of exported rows replaced by keyed hashes, dates shifted and cleared for age-only output.
+# File and Path hold original file names or the SOP Instance UID of received objects
+ID_COLUMNS = ('PatientID', 'StudyInstanceUID', 'SeriesInstanceUID', 'File', 'Path')
+DATE_COLUMNS = ('StudyDate',)
+REMOVED_COLUMNS = ('PatientName', 'PatientBirthDate', 'StudyTime')
+
+
+@lru_cache(maxsize=1)
+def load_secret():
+    """Load the pseudonymization secret, a random one is created on first use"""
+    secret = os.environ.get(SECRET_ENV)
+    if secret:
+        return secret.encode('utf-8')
+    try:
+        with open(SECRET_PATH, 'r', encoding='utf-8') as f:
+            return f.read().strip().encode('utf-8')
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(SECRET_PATH), exist_ok=True)
+    secret = secrets.token_hex(32)
+    # Exclusive create, a concurrent process may have written its key first
+    try:
+        fd = os.open(SECRET_PATH, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(SECRET_PATH, 'r', encoding='utf-8') as f:
+            return f.read().strip().encode('utf-8')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(secret)
+    return secret.encode('utf-8')
+
+
+@lru_cache(maxsize=65536)
+def pseudonym(patient_id):
+    """Deterministic keyed hash (HMAC-SHA256) of a patient ID, '' for an empty ID"""
+    patient_id = str(patient_id).strip()
+    if not patient_id:
+        return ''
+    return hmac.new(load_secret(), patient_id.encode('utf-8'), hashlib.sha256).hexdigest()[:PSEUDONYM_LENGTH]
+
+
+@lru_cache(maxsize=65536)
+def date_shift(patient_id):
+    """Deterministic date shift in days of a patient, intervals between their studies are kept"""
+    digest = hmac.new(load_secret(), b"date:" + str(patient_id).strip().encode('utf-8'), hashlib.sha256).digest()
+    return int.from_bytes(digest[:4], 'big') % (2 * MAX_DATE_SHIFT_DAYS + 1) - MAX_DATE_SHIFT_DAYS
+
+
+def iso_date(value):
+    """YYYY-MM-DD of a DICOM date, 'NaT' if it isn't one"""
+    value = str(value)
+    if len(value) == 8 and value.isdigit() and "01" <= value[4:6] <= "12" and "01" <= value[6:8] <= "31":
+        return f"{value[:4]}-{value[4:6]}-{value[6:8]}"
+    return 'NaT'
+
+
+def shift_dates(dates, shifts):
+    """Shift DICOM dates (YYYYMMDD) by days in one NumPy operation, invalid dates become ''"""
+    import numpy as np
+    try:
+        values = np.array([iso_date(value) for value in dates], dtype='datetime64[D]')
+    except ValueError:
+        # Day past the end of its month, e.g. 20240230
+        values = np.array([np.datetime64('NaT') if iso_date(value) == 'NaT' else _checked_date(value)
+                           for value in dates], dtype='datetime64[D]')
+    shifted = np.datetime_as_string(values + np.array(shifts, dtype='timedelta64[D]'))
+    return ['' if value == 'NaT' else value.replace('-', '') for value in shifted]
+
+
+def _checked_date(value):
+    import numpy as np
+    try:
+        return np.datetime64(iso_date(value), 'D')
+    except ValueError:
+        return np.datetime64('NaT')
+
+
+def pseudonymize_rows(rows):
+    """Pseudonymize a batch of result rows in place: keyed hashes of IDs, shifted dates, age only"""
+    if not rows:
+        return
+    shifts = [date_shift(row.get('PatientID', '')) for row in rows]
+    for column in DATE_COLUMNS:
+        shifted = shift_dates([row.get(column, '') for row in rows], shifts)
+        for row, value in zip(rows, shifted):
+            if column in row:
+                row[column] = value
+    for row in rows:
+        for column in ID_COLUMNS:
+            if row.get(column):
+                row[column] = pseudonym(row[column])
+        for column in REMOVED_COLUMNS:
+            if column in row:
+                row[column] = ''
@@ -0,0 +1,215 @@
+# result_store.py
+import json
+import sqlite3
+import time
+from dose_stats import RunningStats, get_protocol, get_dose_value, get_month
+from pseudonymize import pseudonymize_rows
+
+DEFAULT_STORE_PATH = "dose_results.db"
+
+
+class ResultStore:
+    """Persistent SQLite store of extracted dose results and per-protocol aggregates
+
+    With pseudonymize, the stored row data (returned by get_results) is
+    pseudonymized, while path, study date and rollups keep the real values.
+    """
+    def __init__(self, path=DEFAULT_STORE_PATH, debug=False, pseudonymize=False):
+        self.path = path
+        self.debug = debug
+        self.pseudonymize = pseudonymize
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.create_tables()
+        self.aggregates = self.load_aggregates()
+        if self.needs_rollup_rebuild():
+            self.rebuild_rollups()
+        if self.debug:
+            print(f"DEBUG: Opened result store {path} with {len(self.aggregates)} aggregates")
+
+    def create_tables(self):
+        """Create store tables if they don't exist"""
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS results (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE,
+                modality TEXT,
+                data_source TEXT,
+                protocol TEXT,
+                device TEXT,
+                study_date TEXT,
+                indexed_at REAL,
+                data TEXT
+            );
+            CREATE INDEX IF NOT EXISTS results_modality ON results (modality, protocol);
+            CREATE TABLE IF NOT EXISTS aggregates (
+                modality TEXT,
+                protocol TEXT,
+                state TEXT,
+                PRIMARY KEY (modality, protocol)
+            );
+            CREATE TABLE IF NOT EXISTS ingested_files (
+                path TEXT PRIMARY KEY,
+                mtime REAL,
+                size INTEGER,
+                ingested_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS rollups (
+                modality TEXT,
+                protocol TEXT,
+                device TEXT,
+                month TEXT,
+                state TEXT,
+                PRIMARY KEY (modality, protocol, device, month)
+            );
+        """)
+        self.conn.commit()
+
+    def load_aggregates(self):
+        """Load per-protocol running statistics"""
+        aggregates = {}
+        for modality, protocol, state in self.conn.execute(
+                "SELECT modality, protocol, state FROM aggregates"):
+            aggregates[(modality, protocol)] = RunningStats.from_dict(json.loads(state))
+        return aggregates
+
+    def has_path(self, path):
+        """Check if a file has already been stored"""
+        return self.conn.execute(
+            "SELECT 1 FROM results WHERE path = ?", (path,)).fetchone() is not None
+
+    def known_paths(self):
+        """Get set of all stored file paths"""
+        return {row[0] for row in self.conn.execute("SELECT path FROM results")}
+
+    def ingested_files(self):
+        """{path: (mtime, size)} of the files and archives the ingest daemon has handled"""
+        return {path: (mtime, size) for path, mtime, size in
+                self.conn.execute("SELECT path, mtime, size FROM ingested_files")}
+
+    def add_ingested_files(self, files):
+        """Record handled files as (path, mtime, size), with or without dose data"""
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO ingested_files (path, mtime, size, ingested_at) VALUES (?, ?, ?, ?)",
+                [(path, mtime, size, now) for path, mtime, size in files])
+
+    def add_results(self, results):
+        """Insert a batch of result rows and update the aggregates in one transaction"""
+        changed = set()
+        rollups = {}
+        inserted = 0
+        exported = [dict(row) for row in results] if self.pseudonymize else results
+        if self.pseudonymize:
+            pseudonymize_rows(exported)
+        with self.conn:
+            for row, data in zip(results, exported):
+                modality = row.get('Modality', '')
+                protocol = get_protocol(row)
+                device = str(row.get('DeviceObserverModelName', ''))
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO results (path, modality, data_source, protocol, device, "
+                    "study_date, indexed_at, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (row.get('Path', row.get('File', '')), modality, row.get('DataSource', ''),
+                     protocol, device, str(row.get('StudyDate', '')), time.time(),
+                     json.dumps(data, default=str)))
+                if not cursor.rowcount:
+                    continue
+                inserted += 1
+                value = get_dose_value(row, modality)
+                if value is None:
+                    continue
+                key = (modality, protocol)
+                self.aggregates.setdefault(key, RunningStats()).add(value)
+                changed.add(key)
+                month = get_month(row.get('StudyDate'))
+                if month:
+                    rollups.setdefault((modality, protocol, device, month), RunningStats()).add(value)
+
+            for key in changed:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO aggregates (modality, protocol, state) VALUES (?, ?, ?)",
+                    (key[0], key[1], json.dumps(self.aggregates[key].to_dict())))
+            self.merge_rollups(rollups)
+        if self.debug:
+            print(f"DEBUG: Stored {inserted}/{len(results)} results, updated {len(changed)} aggregates "
+                  f"and {len(rollups)} monthly rollups")
+        return inserted
+
+    def merge_rollups(self, rollups):
+        """Merge batch statistics into the stored monthly rollups"""
+        for key, stats in rollups.items():
+            row = self.conn.execute(
+                "SELECT state FROM rollups WHERE modality = ? AND protocol = ? AND device = ? AND month = ?",
+                key).fetchone()
+            if row:
+                stored = RunningStats.from_dict(json.loads(row[0]))
+                stored.merge(stats)
+                stats = stored
+            self.conn.execute(
+                "INSERT OR REPLACE INTO rollups (modality, protocol, device, month, state) "
+                "VALUES (?, ?, ?, ?, ?)", key + (json.dumps(stats.to_dict()),))
+
+    def needs_rollup_rebuild(self):
+        """Check for results stored before monthly rollups existed"""
+        if self.conn.execute("SELECT 1 FROM rollups LIMIT 1").fetchone():
+            return False
+        return self.conn.execute("SELECT 1 FROM results LIMIT 1").fetchone() is not None
+
+    def rebuild_rollups(self):
+        """Recompute all monthly rollups from the stored results"""
+        rollups = {}
+        for modality, protocol, device, study_date, data in self.conn.execute(
+                "SELECT modality, protocol, device, study_date, data FROM results"):
+            row = json.loads(data)
+            value = get_dose_value(row, modality)
+            # The row data may be pseudonymized with shifted dates
+            month = get_month(study_date)
+            if value is not None and month:
+                rollups.setdefault((modality, protocol, device, month), RunningStats()).add(value)
+        with self.conn:
+            self.conn.execute("DELETE FROM rollups")
+            self.merge_rollups(rollups)
+        if self.debug:
+            print(f"DEBUG: Rebuilt {len(rollups)} monthly rollups")
+
+    def get_rollups(self, modality, month_from=None, month_to=None):
+        """Get (protocol, device, month, RunningStats) rollups of a modality ordered by month"""
+        query = "SELECT protocol, device, month, state FROM rollups WHERE modality = ?"
+        params = [modality]
+        if month_from:
+            query += " AND month >= ?"
+            params.append(month_from)
+        if month_to:
+            query += " AND month <= ?"
+            params.append(month_to)
+        query += " ORDER BY protocol, device, month"
+        return [(protocol, device, month, RunningStats.from_dict(json.loads(state)))
+                for protocol, device, month, state in self.conn.execute(query, params)]
+
+    def get_aggregates(self, modality):
+        """Get running statistics per protocol for a modality"""
+        return {protocol: stats for (mod, protocol), stats in self.aggregates.items()
+                if mod == modality}
+
+    def get_results(self, modality=None):
+        """Get stored result rows, optionally for one modality"""
+        if modality:
+            cursor = self.conn.execute("SELECT data FROM results WHERE modality = ?", (modality,))
+        else:
+            cursor = self.conn.execute("SELECT data FROM results")
+        return [json.loads(row[0]) for row in cursor]
+
+    def protocol_counts(self, modality=None):
+        """Get (modality, protocol, exam count) of stored results, most frequent first"""
+        query = "SELECT modality, protocol, COUNT(*) AS n FROM results"
+        params = ()
+        if modality:
+            query += " WHERE modality = ?"
+            params = (modality,)
+        query += " GROUP BY modality, protocol ORDER BY n DESC"
+        return self.conn.execute(query, params).fetchall()
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,193 @@
+# scan_checkpoint.py
+import os
+import json
+import time
+import hashlib
+
+# State shared by the GUI, CLI, ingest daemon and SCP (checkpoints, quarantine, pseudonym key),
+# next to the application whatever the working directory, DOSE_STATE_DIR moves it
+STATE_DIR_ENV = "DOSE_STATE_DIR"
+SCAN_STATE_DIR = os.environ.get(STATE_DIR_ENV) or os.path.join(os.path.dirname(os.path.abspath(__file__)), "scan_state")
+
+
+def checkpoint_key(*params):
+    """Build checkpoint file key from the scan parameters"""
+    return hashlib.sha1(json.dumps(params, default=str).encode('utf-8')).hexdigest()[:16]
+
+
+def atomic_write_json(path, data):
+    """Write JSON to a temporary file and rename it over the target"""
+    # Per process temporary file, shard workers may share the state directory
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def save_results_cache(path, results, params):
+    """Save extracted results with the scan parameters for re-evaluation without rescanning"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    atomic_write_json(path, {'params': params, 'saved': time.strftime('%Y-%m-%d %H:%M:%S'),
+                             'results': json.loads(json.dumps(results, default=str))})
+
+
+def load_results_cache(path):
+    """Load (results, scan parameters) saved by save_results_cache"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return data['results'], data['params']
+
+
+class ReadAborted(Exception):
+    """A scan process died or hung while reading a file"""
+
+
+class ScanCheckpoint:
+    """Append-only log of completed scan sources and their results, flushed periodically"""
+    def __init__(self, key, state_dir=SCAN_STATE_DIR, flush_every=100, flush_interval=5.0, debug=False):
+        os.makedirs(state_dir, exist_ok=True)
+        self.path = os.path.join(state_dir, f"checkpoint_{key}.jsonl")
+        # Source being read, left behind when the process crashes or is killed in a hang
+        self.marker_path = os.path.join(state_dir, f"checkpoint_{key}.reading")
+        self.marker = None
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.debug = debug
+        self.completed = set()
+        # (source, result) of the loaded results, for stages run over the whole scan
+        self.restored = []
+        self.pending = []
+        self.last_flush = time.time()
+        self.file = None
+
+    def load(self):
+        """Load completed sources and their results, returns list of results"""
+        results = []
+        if not os.path.exists(self.path):
+            return results
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Last line may be cut short by a crash
+                    continue
+                self.completed.add(entry['source'])
+                if entry['data']:
+                    results.append(entry['data'])
+                    self.restored.append((entry['source'], entry['data']))
+        if self.debug:
+            print(f"DEBUG: Resuming from {self.path}: {len(self.completed)} sources, {len(results)} results")
+        return results
+
+    def aborted_source(self):
+        """Source the last scan was reading when it stopped without closing, None if it closed"""
+        try:
+            with open(self.marker_path, 'r', encoding='utf-8') as f:
+                return f.read() or None
+        except FileNotFoundError:
+            return None
+
+    def begin(self, source):
+        """Mark a source as being read, until the next one or close"""
+        if self.marker is None:
+            self.marker = open(self.marker_path, 'w', encoding='utf-8')
+        self.marker.seek(0)
+        self.marker.write(source)
+        self.marker.truncate()
+        # Flushed to the OS, which keeps it when the process dies
+        self.marker.flush()
+
+    def open(self, resume):
+        """Open checkpoint for appending, a fresh scan starts an empty one"""
+        self.file = open(self.path, 'a' if resume else 'w', encoding='utf-8')
+
+    def add(self, source, data):
+        """Record a processed source and its result (None if nothing was extracted)"""
+        self.completed.add(source)
+        self.pending.append(json.dumps({'source': source, 'data': data}, default=str))
+        if (len(self.pending) >= self.flush_every
+                or time.time() - self.last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Write pending entries to disk"""
+        if self.pending and self.file:
+            self.file.write('\n'.join(self.pending) + '\n')
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending = []
+        self.last_flush = time.time()
+
+    def close(self):
+        self.flush()
+        if self.file:
+            self.file.close()
+            self.file = None
+        if self.marker:
+            self.marker.close()
+            self.marker = None
+        # Interrupts and errors reach close, only crashes and killed processes leave the mark
+        if os.path.exists(self.marker_path):
+            os.remove(self.marker_path)
+
+    def remove(self):
+        """Delete the checkpoint after the scan results have been saved"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+            if self.debug:
+                print(f"DEBUG: Removed checkpoint {self.path}")
+
+
+class Quarantine:
+    """Persistent list of files that failed to parse or extract, skipped until their mtime changes"""
+    def __init__(self, state_dir=SCAN_STATE_DIR, debug=False):
+        os.makedirs(state_dir, exist_ok=True)
+        self.path = os.path.join(state_dir, "quarantine.json")
+        self.debug = debug
+        self.changed = False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.entries = {}
+
+    def should_skip(self, path):
+        """Check if file is quarantined and unchanged since it failed"""
+        entry = self.entries.get(path)
+        if entry is None:
+            return False
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return True
+        if mtime == entry['mtime']:
+            return True
+        # File changed, give it another chance
+        del self.entries[path]
+        self.changed = True
+        return False
+
+    def add(self, path, error):
+        """Quarantine file with the error that made it fail"""
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = None
+        self.entries[path] = {
+            'mtime': mtime,
+            'error': type(error).__name__,
+            'message': str(error)[:500],
+            'time': time.strftime('%Y-%m-%d %H:%M:%S')
+        }
+        self.changed = True
+        if self.debug:
+            print(f"DEBUG: Quarantined {path}: {type(error).__name__}")
+
+    def save(self):
+        if self.changed:
+            atomic_write_json(self.path, self.entries)
+            self.changed = False
@@ -0,0 +1,126 @@
+# scan_profile.py
+import io
+import os
+import json
+import time
+from contextlib import contextmanager
+
+
+class ScanProfiler:
+    """Per-stage wall clock timers and counters of a scan run
+
+    Stages may be entered many times (once per file), their time and number of
+    calls add up. An optional cProfile or pyinstrument capture covers the whole
+    run between start() and stop().
+    """
+    def __init__(self, capture=None, enabled=True):
+        self.enabled = enabled
+        self.capture = capture
+        self.stages = {}
+        self.counters = {}
+        self.profiler = None
+        self.profile_output = None
+        self.started = None
+        self.total = 0.0
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block of code as a scan stage"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry = self.stages.setdefault(name, [0.0, 0])
+            entry[0] += time.perf_counter() - start
+            entry[1] += 1
+
+    def timed_iter(self, name, iterable):
+        """Yield from iterable, timing the time spent producing items as a stage"""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def count(self, name, amount=1):
+        """Increase a counter"""
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def start(self):
+        """Start the run timer and the optional profiler capture"""
+        self.started = time.perf_counter()
+        if self.capture == "cprofile":
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif self.capture == "pyinstrument":
+            from pyinstrument import Profiler
+            self.profiler = Profiler()
+            self.profiler.start()
+
+    def stop(self):
+        """Stop the run timer and the profiler capture"""
+        if self.started is not None:
+            self.total += time.perf_counter() - self.started
+            self.started = None
+        if self.profiler is None:
+            return
+        if self.capture == "cprofile":
+            import pstats
+            self.profiler.disable()
+            output = io.StringIO()
+            pstats.Stats(self.profiler, stream=output).sort_stats('cumulative').print_stats(30)
+            self.profile_output = output.getvalue()
+        else:
+            self.profiler.stop()
+            self.profile_output = self.profiler.output_text(unicode=True)
+        self.profiler = None
+
+    def summary(self):
+        """Get timers and counters as a JSON serializable dict"""
+        return {
+            'total_seconds': round(self.total, 3),
+            'stages': {name: {'seconds': round(seconds, 3), 'calls': calls}
+                       for name, (seconds, calls) in self.stages.items()},
+            'counters': dict(self.counters)
+        }
+
+    def format_table(self):
+        """Format the summary as a text table"""
+        lines = [f"{'Stage':<20} {'Seconds':>9} {'Calls':>8} {'Share':>7}"]
+        for name, (seconds, calls) in sorted(self.stages.items(), key=lambda item: -item[1][0]):
+            share = seconds / self.total * 100 if self.total else 0.0
+            lines.append(f"{name:<20} {seconds:>9.3f} {calls:>8} {share:>6.1f}%")
+        lines.append(f"{'total':<20} {self.total:>9.3f}")
+        for name, value in self.counters.items():
+            lines.append(f"{name:<20} {value:>9}")
+        return "\n".join(lines)
+
+    def status_text(self):
+        """One line summary for the GUI status bar: slowest stages and counters"""
+        slowest = sorted(self.stages.items(), key=lambda item: -item[1][0])[:3]
+        stages = ", ".join(f"{name} {seconds:.1f}s" for name, (seconds, _) in slowest)
+        text = f"{self.total:.1f}s total ({stages}); {self.counters.get('files_seen', 0)} files, " \
+               f"{self.counters.get('parse_errors', 0) + self.counters.get('extract_errors', 0)} errors"
+        if self.counters.get('broken_archives'):
+            text += f", {self.counters['broken_archives']} broken archives"
+        return text
+
+    def save(self, path):
+        """Save the summary as JSON, and the profiler capture as text next to it"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=1)
+        if self.profile_output:
+            with open(os.path.splitext(path)[0] + "_profile.txt", 'w', encoding='utf-8') as f:
+                f.write(self.profile_output)
+
+
+# Shared disabled profiler for extractors used outside of a scan run
+NULL_PROFILER = ScanProfiler(enabled=False)
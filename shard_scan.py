@@ -0,0 +1,158 @@
+# shard_scan.py
+import os
+import glob
+import json
+import time
+import platform
+from itertools import chain
+from dose_scanner import DoseScanner
+from dose_stats import RunningStats, get_protocol, get_dose_value, compare_aggregates, print_comparison
+from dicom_sources import iter_source_files, iter_dicom_sources
+from scan_checkpoint import atomic_write_json
+
+MANIFEST_VERSION = 1
+
+
+def partials_directory(manifest_path):
+    """Default directory of the partial results of a manifest"""
+    return os.path.join(os.path.dirname(os.path.abspath(manifest_path)), "partials")
+
+
+def partial_path(partials_dir, index):
+    return os.path.join(partials_dir, f"partial_{index:03d}.json")
+
+
+def split_shards(paths, shard_count):
+    """Split paths into shards of about equal size, largest files first to the lightest shard"""
+    sized = []
+    for path in paths:
+        try:
+            sized.append((os.path.getsize(path), path))
+        except OSError:
+            sized.append((0, path))
+    shards = [[] for _ in range(shard_count)]
+    loads = [0] * shard_count
+    for size, path in sorted(sized, reverse=True):
+        lightest = loads.index(min(loads))
+        shards[lightest].append(path)
+        loads[lightest] += size
+    return [sorted(shard) for shard in shards], loads
+
+
+def write_manifest(directories, shard_count, manifest_path, modality="ALL", data_source="RDSR",
+                   recursive=True, date_from='', date_to='', pseudonymize=False):
+    """Coordinator step: list DICOM files and archives of the directories and split them into shards"""
+    paths = [os.path.abspath(path) for directory in directories
+             for path in iter_source_files(directory, recursive)]
+    shards, loads = split_shards(paths, shard_count)
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'directories': [os.path.abspath(directory) for directory in directories],
+        'modality': modality,
+        'data_source': data_source,
+        'date_from': date_from,
+        'date_to': date_to,
+        'pseudonymize': pseudonymize,
+        'shards': [{'index': index, 'bytes': load, 'paths': shard}
+                   for index, (shard, load) in enumerate(zip(shards, loads))]
+    }
+    atomic_write_json(manifest_path, manifest)
+    print(f"Wrote manifest {manifest_path}: {len(paths)} files in {shard_count} shards")
+    return manifest
+
+
+def load_manifest(manifest_path):
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported manifest version in {manifest_path}")
+    return manifest
+
+
+def manifest_scanner(manifest, debug=False):
+    """Create scanner with the scan parameters of a manifest"""
+    return DoseScanner(manifest['modality'], manifest['data_source'], False,
+                       manifest['date_from'], manifest['date_to'], debug,
+                       pseudonymize=manifest.get('pseudonymize', False))
+
+
+def build_aggregates(results, modality):
+    """Per modality and protocol running statistics of result rows"""
+    aggregates = {}
+    for row in results:
+        row_modality = row.get('Modality', '') if modality == "ALL" else modality
+        value = get_dose_value(row, row_modality)
+        if value is None:
+            continue
+        protocol = get_protocol(row)
+        aggregates.setdefault(row_modality, {}).setdefault(protocol, RunningStats()).add(value)
+    return aggregates
+
+
+def run_shard(manifest_path, index, partials_dir=None, resume=False, debug=False):
+    """Node step: extract the files of one shard and write its partial result file"""
+    manifest = load_manifest(manifest_path)
+    shard = manifest['shards'][index]
+    partials_dir = partials_dir or partials_directory(manifest_path)
+    os.makedirs(partials_dir, exist_ok=True)
+
+    scanner = manifest_scanner(manifest, debug)
+    scanner.start_profile()
+    results = scanner.start_checkpoint(f"{os.path.abspath(manifest_path)}#{index}", resume)
+    try:
+        broken = []
+        sources = chain.from_iterable(iter_dicom_sources(path, False, debug, broken) for path in shard['paths'])
+        results += scanner.scan_files(None, sources)
+        if broken:
+            scanner.report_broken_archives(broken)
+    finally:
+        scanner.checkpoint.close()
+    scanner.profiler.stop()
+
+    aggregates = build_aggregates(results, manifest['modality'])
+    atomic_write_json(partial_path(partials_dir, index), {
+        'shard': index,
+        'host': platform.node(),
+        'files': len(shard['paths']),
+        'rows': json.loads(json.dumps(results, default=str)),
+        'aggregates': {modality: {protocol: stats.to_dict() for protocol, stats in protocols.items()}
+                       for modality, protocols in aggregates.items()},
+        'timing': scanner.profiler.summary()
+    })
+    scanner.finish_checkpoint()
+    print(f"Shard {index}: {len(results)} results from {len(shard['paths'])} files")
+    return len(results)
+
+
+def merge_partials(manifest_path, excel_path, partials_dir=None, debug=False):
+    """Merge step: combine partial results into the final reports and DRL comparison"""
+    manifest = load_manifest(manifest_path)
+    partials_dir = partials_dir or partials_directory(manifest_path)
+    results = []
+    aggregates = {}
+    found = set()
+    for path in sorted(glob.glob(os.path.join(partials_dir, "partial_*.json"))):
+        with open(path, 'r', encoding='utf-8') as f:
+            partial = json.load(f)
+        found.add(partial['shard'])
+        results += partial['rows']
+        for modality, protocols in partial['aggregates'].items():
+            for protocol, state in protocols.items():
+                aggregates.setdefault(modality, {}).setdefault(protocol, RunningStats()).merge(
+                    RunningStats.from_dict(state))
+
+    missing = sorted(set(range(len(manifest['shards']))) - found)
+    if missing:
+        print(f"Warning: no partial results of shards {missing}")
+    scanner = manifest_scanner(manifest, debug)
+    for modality in sorted(aggregates):
+        comparison = compare_aggregates(scanner.drl_config, modality, aggregates[modality])
+        if comparison:
+            print_comparison(modality, comparison)
+    if not results:
+        scanner.show_error("Error", "No valid data found")
+        return False
+    pdf_path = scanner.write_results(results, excel_path)
+    print(f"Merged {len(results)} results of {len(found)} shards\nSaved to:\n{excel_path}\n{pdf_path}")
+    return True
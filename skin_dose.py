@@ -0,0 +1,185 @@
+# skin_dose.py
+# Skin dose map and peak skin dose of fluoroscopy procedures from RDSR irradiation events
+import math
+
+EVENT_CONTAINER = 'Irradiation Event X-Ray Data'
+
+# Numeric concepts of an irradiation event, stored in mm, degrees, m2 and Gy
+EVENT_CONCEPTS = {
+    'Positioner Primary Angle': 'primary_angle',
+    'Positioner Secondary Angle': 'secondary_angle',
+    'Distance Source to Isocenter': 'source_isocenter',
+    'Distance Source to Detector': 'source_detector',
+    'Distance Source to Reference Point': 'source_reference',
+    'Collimated Field Height': 'field_height',
+    'Collimated Field Width': 'field_width',
+    'Collimated Field Area': 'field_area',
+    'Table Longitudinal Position': 'table_longitudinal',
+    'Table Lateral Position': 'table_lateral',
+    'Table Height Position': 'table_height',
+    'Dose (RP)': 'reference_dose'
+}
+UNIT_SCALE = {'mGy': 1e-3, 'uGy': 1e-6, 'cm': 10.0, 'm': 1000.0, 'cm2': 1e-4, 'mm2': 1e-6}
+
+# Geometry used when an event doesn't report it (mm)
+DEFAULT_SOURCE_TO_ISOCENTER = 750.0
+DEFAULT_SOURCE_TO_DETECTOR = 1100.0
+# Interventional reference point lies 15 cm from the isocenter towards the source
+REFERENCE_POINT_OFFSET = 150.0
+
+# Elliptical cylinder phantom (cm), its center is at the isocenter for the first event
+PHANTOM_HALF_WIDTH = 17.0
+PHANTOM_HALF_THICKNESS = 10.0
+PHANTOM_LENGTH = 180.0
+GRID_STEP = 1.0
+# Reference air kerma to skin dose: backscatter and tissue to air absorption ratio
+BACKSCATTER_FACTOR = 1.3
+TISSUE_AIR_RATIO = 1.06
+# Table and mattress transmission of beams entering from below
+TABLE_TRANSMISSION = 0.8
+# Events projected at once, bounds the (grid points x events) arrays
+EVENT_CHUNK = 64
+# Rounding of angles (degrees), distances and table positions (mm) merging repeated geometries
+GEOMETRY_DECIMALS = 1
+
+
+def concept_meaning(item):
+    codes = item.get('ConceptNameCodeSequence', [])
+    return str(codes[0].get('CodeMeaning', '')) if codes else ''
+
+
+def collect_event_values(sequence, event):
+    """Collect numeric event concepts of nested content items, first value wins"""
+    for item in sequence:
+        key = EVENT_CONCEPTS.get(concept_meaning(item))
+        if key and key not in event and item.get('MeasuredValueSequence'):
+            measured = item.MeasuredValueSequence[0]
+            try:
+                value = float(measured.NumericValue)
+            except (AttributeError, TypeError, ValueError):
+                continue
+            units = measured.get('MeasurementUnitsCodeSequence', [])
+            unit = str(units[0].get('CodeValue', '')) if units else ''
+            event[key] = value * UNIT_SCALE.get(unit, 1.0)
+        if 'ContentSequence' in item:
+            collect_event_values(item.ContentSequence, event)
+
+
+def irradiation_events(sequence):
+    """Numeric values of each irradiation event in an RDSR content sequence"""
+    events = []
+    for item in sequence:
+        if concept_meaning(item) == EVENT_CONTAINER:
+            event = {}
+            collect_event_values(item.get('ContentSequence', []), event)
+            events.append(event)
+        elif 'ContentSequence' in item:
+            events += irradiation_events(item.ContentSequence)
+    return events
+
+
+def phantom_grid():
+    """Surface points and outward normals of the phantom, with the (length, around) grid shape"""
+    import numpy as np
+    a, b = PHANTOM_HALF_WIDTH, PHANTOM_HALF_THICKNESS
+    # Ramanujan's approximation of the ellipse perimeter
+    perimeter = math.pi * (3 * (a + b) - math.sqrt((3 * a + b) * (a + 3 * b)))
+    theta = np.linspace(0, 2 * math.pi, int(perimeter / GRID_STEP), endpoint=False)
+    z = np.arange(-PHANTOM_LENGTH / 2, PHANTOM_LENGTH / 2, GRID_STEP) + GRID_STEP / 2
+    theta, z = np.meshgrid(theta, z)
+    points = np.stack([a * np.cos(theta), b * np.sin(theta), z], axis=-1).reshape(-1, 3)
+    normals = np.stack([np.cos(theta) / a, np.sin(theta) / b, np.zeros_like(z)], axis=-1).reshape(-1, 3)
+    normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+    return points, normals, theta.shape
+
+
+def event_arrays(events):
+    """Geometry arrays (cm) of the events that can be mapped, skipped are those without dose or field size"""
+    import numpy as np
+    mapped = [event for event in events if event.get('reference_dose')
+              and ('field_area' in event or ('field_height' in event and 'field_width' in event))]
+    if not mapped:
+        return None
+
+    def column(key, default=0.0):
+        return np.array([event.get(key, default) for event in mapped], dtype=float)
+
+    source_isocenter = column('source_isocenter', DEFAULT_SOURCE_TO_ISOCENTER)
+    source_detector = column('source_detector', DEFAULT_SOURCE_TO_DETECTOR)
+    source_reference = np.array([event.get('source_reference', iso - REFERENCE_POINT_OFFSET)
+                                 for event, iso in zip(mapped, source_isocenter)])
+    side = np.sqrt(column('field_area')) * 1000
+    field_width = np.where([('field_width' in event) for event in mapped], column('field_width'), side)
+    field_height = np.where([('field_height' in event) for event in mapped], column('field_height'), side)
+    # Table movement since the first event moves the patient relative to the isocenter
+    table = np.stack([column('table_lateral'), column('table_height'), column('table_longitudinal')], axis=1)
+    geometry = np.stack([column('primary_angle'), column('secondary_angle'), source_isocenter,
+                         source_reference, source_detector, field_width, field_height,
+                         *(table - table[0]).T], axis=1)
+    # Pulses of a fluoroscopy run repeat the same geometry, project each geometry once
+    geometry, index = np.unique(np.round(geometry, GEOMETRY_DECIMALS), axis=0, return_inverse=True)
+    dose = np.bincount(index.ravel(), weights=column('reference_dose'), minlength=len(geometry))
+    primary, secondary, source_isocenter, source_reference, source_detector, width, height = geometry[:, :7].T
+    return {
+        'primary': np.radians(primary),
+        'secondary': np.radians(secondary),
+        'source_isocenter': source_isocenter / 10,
+        'source_reference': source_reference / 10,
+        'half_width': width / 2 / source_detector,
+        'half_height': height / 2 / source_detector,
+        'table': geometry[:, 7:] / 10,
+        'dose': dose,
+        'events': len(mapped)
+    }
+
+
+def skin_dose_map(events):
+    """Accumulate the skin dose (Gy) of all events on the phantom surface grid
+
+    Returns (dose map of shape (length, around), number of mapped events).
+    """
+    import numpy as np
+    points, normals, shape = phantom_grid()
+    dose_map = np.zeros(len(points))
+    arrays = event_arrays(events)
+    if arrays is None:
+        return dose_map.reshape(shape), 0
+
+    # Source direction from the isocenter: LAO/RAO turns about the long axis, cranial/caudal tilts it
+    primary, secondary = arrays['primary'], arrays['secondary']
+    direction = np.stack([-np.sin(primary) * np.cos(secondary),
+                          -np.cos(primary) * np.cos(secondary),
+                          -np.sin(secondary)], axis=1)
+    isocenter = -arrays['table']
+    sources = isocenter + direction * arrays['source_isocenter'][:, None]
+    axis = -direction
+    width_axis = np.cross(axis, [0.0, 0.0, 1.0])
+    width_axis /= np.linalg.norm(width_axis, axis=1, keepdims=True)
+    height_axis = np.cross(width_axis, axis)
+    factor = BACKSCATTER_FACTOR * TISSUE_AIR_RATIO * np.where(
+        sources[:, 1] < -PHANTOM_HALF_THICKNESS, TABLE_TRANSMISSION, 1.0)
+    dose = arrays['dose'] * arrays['source_reference'] ** 2 * factor
+
+    point_norms = (points ** 2).sum(axis=1)[:, None]
+    point_normals = (points * normals).sum(axis=1)[:, None]
+    for start in range(0, len(sources), EVENT_CHUNK):
+        chunk = slice(start, start + EVENT_CHUNK)
+        source = sources[chunk]
+        # Distances along the central axis and across the field, (points x events)
+        depth = points @ axis[chunk].T - (source * axis[chunk]).sum(axis=1)
+        across = points @ width_axis[chunk].T - (source * width_axis[chunk]).sum(axis=1)
+        along = points @ height_axis[chunk].T - (source * height_axis[chunk]).sum(axis=1)
+        # The phantom is convex, surface facing the source is where the beam enters
+        inside = normals @ source.T > point_normals
+        inside &= depth > 0
+        inside &= np.abs(across) <= arrays['half_width'][chunk] * depth
+        inside &= np.abs(along) <= arrays['half_height'][chunk] * depth
+        distance2 = point_norms - 2 * points @ source.T + (source ** 2).sum(axis=1)
+        dose_map += (inside * (dose[chunk] / distance2)).sum(axis=1)
+    return dose_map.reshape(shape), arrays['events']
+
+
+def peak_skin_dose(events):
+    """(peak skin dose in Gy, number of mapped events) of a procedure's irradiation events"""
+    dose_map, mapped = skin_dose_map(events)
+    return (float(dose_map.max()) if mapped else None), mapped
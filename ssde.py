@@ -0,0 +1,158 @@
+# ssde.py
+# Size-specific dose estimate (AAPM Reports 204 and 220) of CT image series
+import os
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+# f = a * exp(-b * Dw) with Dw in cm, per CTDI phantom diameter (AAPM Report 204)
+CONVERSION_COEFFICIENTS = {
+    32: (3.704369, 0.03671937),
+    16: (1.874799, 0.03871313)
+}
+HEAD_PHANTOM_CODE = "113690"  # IEC Head Dosimetry Phantom
+BODY_THRESHOLD_HU = -500
+# Images per pool task, and fewer images than this are read in-process
+SSDE_BATCH_SIZE = 8
+
+
+def conversion_factor(dw, phantom=32):
+    """AAPM conversion factor of CTDIvol to SSDE for a water-equivalent diameter in cm"""
+    a, b = CONVERSION_COEFFICIENTS[phantom]
+    return a * math.exp(-b * dw)
+
+
+def largest_region(mask):
+    """Largest 4-connected region of a 2D boolean mask
+
+    Labels the runs of each row and joins runs overlapping a run of the row
+    above, so the cost follows the number of runs rather than of pixels.
+    """
+    import numpy as np
+    padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    ends = np.nonzero(edges == -1)[1]
+    if len(rows) == 0:
+        return mask.copy()
+
+    parent = list(range(len(rows)))
+
+    def find(run):
+        while parent[run] != run:
+            parent[run] = parent[parent[run]]
+            run = parent[run]
+        return run
+
+    row_first = np.searchsorted(rows, np.arange(mask.shape[0] + 1))
+    for row in range(1, mask.shape[0]):
+        above, above_end = row_first[row - 1], row_first[row]
+        current, current_end = row_first[row], row_first[row + 1]
+        while above < above_end and current < current_end:
+            if starts[above] < ends[current] and starts[current] < ends[above]:
+                parent[find(current)] = find(above)
+            # Advance the run that ends first, it can't overlap later runs of the other row
+            if ends[above] < ends[current]:
+                above += 1
+            else:
+                current += 1
+
+    roots = np.array([find(run) for run in range(len(rows))])
+    areas = np.bincount(roots, weights=ends - starts)
+    largest = np.nonzero(roots == np.argmax(areas))[0]
+    region = np.zeros_like(mask, dtype=bool)
+    for run in largest:
+        region[rows[run], starts[run]:ends[run]] = True
+    return region
+
+
+def water_equivalent_diameter(hu, pixel_spacing):
+    """Water-equivalent diameter in cm of an axial image in HU (AAPM Report 220)
+
+    The patient is the largest connected region above BODY_THRESHOLD_HU, so
+    the table and other objects apart from the body are left out, filled
+    between its first and last pixel of each row so lungs and bowel gas are
+    included.
+    """
+    import numpy as np
+    body = largest_region(hu > BODY_THRESHOLD_HU)
+    filled = np.maximum.accumulate(body, axis=1) & np.maximum.accumulate(body[:, ::-1], axis=1)[:, ::-1]
+    pixel_area = float(pixel_spacing[0]) * float(pixel_spacing[1]) / 100  # mm2 to cm2
+    water_area = np.clip(hu[filled] / 1000 + 1, 0, None).sum() * pixel_area
+    return 2 * math.sqrt(water_area / math.pi)
+
+
+def phantom_diameter(dcm):
+    """CTDI phantom diameter in cm the image's CTDIvol refers to"""
+    for code in dcm.get('CTDIPhantomTypeCodeSequence', []):
+        return 16 if str(code.get('CodeValue', '')) == HEAD_PHANTOM_CODE else 32
+    return 16 if 'HEAD' in str(dcm.get('BodyPartExamined', '')).upper() else 32
+
+
+def read_image_dw(path):
+    """(Dw, phantom diameter) of an axial CT image file, None for localizers and unreadable files"""
+    import numpy as np
+    import pydicom
+    try:
+        dcm = pydicom.dcmread(path)
+        if 'LOCALIZER' in [str(value).upper() for value in dcm.get('ImageType', [])]:
+            return None
+        hu = dcm.pixel_array.astype(np.float32) * float(dcm.get('RescaleSlope', 1)) \
+            + float(dcm.get('RescaleIntercept', 0))
+        if hu.ndim != 2:
+            return None
+        return water_equivalent_diameter(hu, dcm.PixelSpacing), phantom_diameter(dcm)
+    except Exception:
+        return None
+
+
+def read_dw_batch(paths):
+    """Pool task: Dw results of a batch of image files"""
+    return [read_image_dw(path) for path in paths]
+
+
+def series_images(candidates):
+    """Pick the image in the middle of each series' table positions
+
+    candidates are (series UID, slice location, path) tuples, returns {series UID: path}.
+    """
+    series = {}
+    for uid, location, path in candidates:
+        try:
+            location = float(location)
+        except (TypeError, ValueError):
+            location = 0.0
+        series.setdefault(uid, []).append((location, path))
+    return {uid: sorted(images)[len(images) // 2][1] for uid, images in series.items()}
+
+
+def compute_series_dw(images, workers=None):
+    """Read the images of {series UID: path} in batches, in a process pool for larger sets
+
+    Returns {series UID: (Dw, phantom diameter)} of the series with a usable image.
+    """
+    uids = list(images)
+    paths = [images[uid] for uid in uids]
+    batches = [paths[i:i + SSDE_BATCH_SIZE] for i in range(0, len(paths), SSDE_BATCH_SIZE)]
+    if len(batches) > 1:
+        workers = workers or min(len(batches), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            batch_results = list(pool.map(read_dw_batch, batches))
+    else:
+        batch_results = [read_dw_batch(batch) for batch in batches]
+    results = [result for batch in batch_results for result in batch]
+    return {uid: result for uid, result in zip(uids, results) if result is not None}
+
+
+def apply_ssde(rows, series_dw):
+    """Add Dw and SSDE columns to CT image rows of series with a known Dw"""
+    for row in rows:
+        result = series_dw.get(row.get('SeriesInstanceUID'))
+        if result is None:
+            continue
+        dw, phantom = result
+        row['Dw'] = round(dw, 1)
+        try:
+            row['SSDE'] = round(float(row['CTDIvol']) * conversion_factor(dw, phantom), 2)
+        except (KeyError, TypeError, ValueError):
+            row['SSDE'] = None
@@ -0,0 +1,136 @@
+# storage_scp.py
+import time
+import queue
+import threading
+import traceback
+from dose_extractor import DoseExtractor, RDSR_SOP_CLASS_UIDS
+from result_store import ResultStore
+from patient_index import PatientDoseIndex, DEFAULT_INDEX_DIR
+from store_pipeline import StorePipeline
+
+# Image storage SOP classes handled by the image extractors
+IMAGE_SOP_CLASS_UIDS = (
+    "1.2.840.10008.5.1.4.1.1.2",      # CT Image
+    "1.2.840.10008.5.1.4.1.1.2.1",    # Enhanced CT Image
+    "1.2.840.10008.5.1.4.1.1.1.1",    # Digital X-Ray Image - For Presentation
+    "1.2.840.10008.5.1.4.1.1.1.1.1",  # Digital X-Ray Image - For Processing
+    "1.2.840.10008.5.1.4.1.1.12.1",   # X-Ray Angiographic Image
+    "1.2.840.10008.5.1.4.1.1.1.2",    # Digital Mammography X-Ray Image - For Presentation
+    "1.2.840.10008.5.1.4.1.1.1.2.1",  # Digital Mammography X-Ray Image - For Processing
+)
+
+# C-STORE status codes
+STATUS_SUCCESS = 0x0000
+STATUS_CANNOT_UNDERSTAND = 0xC000
+
+# Queued to tell the writer thread to flush and exit
+STOP_WRITER = object()
+
+
+class DoseStorageSCP:
+    """DICOM Storage SCP that extracts dose data from received objects in memory"""
+    def __init__(self, store_path, port=11112, ae_title="DOSEREADER", address="0.0.0.0",
+                 batch_size=100, flush_interval=2.0, debug=False,
+                 patient_index_dir=DEFAULT_INDEX_DIR, pseudonymize=False):
+        self.store_path = store_path
+        self.port = port
+        self.ae_title = ae_title
+        self.address = address
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.debug = debug
+        self.patient_index_dir = patient_index_dir
+        self.pseudonymize = pseudonymize
+        self.extractor = DoseExtractor(debug)
+        self.queue = queue.Queue()
+        self.received = 0
+        self.stored = 0
+        self.writer = None
+        self.server = None
+
+        # pynetdicom is only needed to run the SCP
+        from pynetdicom import AE, ALL_TRANSFER_SYNTAXES
+        self.ae = AE(ae_title=ae_title)
+        for uid in RDSR_SOP_CLASS_UIDS + IMAGE_SOP_CLASS_UIDS:
+            self.ae.add_supported_context(uid, ALL_TRANSFER_SYNTAXES)
+
+    def handle_store(self, event):
+        """Handle C-STORE request: extract dose data without writing the object to disk"""
+        try:
+            dcm = event.dataset
+            dcm.file_meta = event.file_meta
+            data = self.extractor.extract_routed_data(dcm)
+        except Exception as e:
+            print(f"DEBUG: Error decoding received dataset: {str(e)}")
+            if self.debug:
+                print(f"DEBUG: Full error: {traceback.format_exc()}")
+            return STATUS_CANNOT_UNDERSTAND
+
+        self.received += 1
+        if data:
+            calling_ae = event.assoc.requestor.ae_title
+            if isinstance(calling_ae, bytes):
+                calling_ae = calling_ae.decode(errors='replace')
+            data['Path'] = f"dicom://{calling_ae.strip()}/{dcm.get('SOPInstanceUID', '')}"
+            data['SourceAE'] = calling_ae.strip()
+            self.queue.put(data)
+        elif self.debug:
+            print("DEBUG: Received object has no extractable dose data")
+        # Objects without dose data are still accepted so the sender does not retry
+        return STATUS_SUCCESS
+
+    def write_results(self):
+        """Writer thread: pass batches of queued results through the store pipeline"""
+        # SQLite connections can't be shared between threads, the writer owns the store
+        store = ResultStore(self.store_path, self.debug, self.pseudonymize)
+        patient_index = PatientDoseIndex(self.patient_index_dir, self.debug) if self.patient_index_dir else None
+        pipeline = StorePipeline(store, patient_index, debug=self.debug)
+        batch = []
+        last_flush = time.time()
+        try:
+            while True:
+                try:
+                    data = self.queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    data = None
+                stop = data is STOP_WRITER
+                if data is not None and not stop:
+                    batch.append(data)
+                if batch and (stop or len(batch) >= self.batch_size
+                              or time.time() - last_flush >= self.flush_interval):
+                    self.stored += pipeline.finish_batch(batch)
+                    batch = []
+                    last_flush = time.time()
+                if stop:
+                    break
+        finally:
+            store.close()
+
+    def start(self, block=True):
+        """Start the SCP, blocking until interrupted unless block is False"""
+        from pynetdicom import evt
+        self.writer = threading.Thread(target=self.write_results, daemon=True)
+        self.writer.start()
+        handlers = [(evt.EVT_C_STORE, self.handle_store)]
+        print(f"DEBUG: Storage SCP {self.ae_title} listening on {self.address}:{self.port}")
+        if not block:
+            self.server = self.ae.start_server((self.address, self.port), block=False,
+                                               evt_handlers=handlers)
+            return
+        try:
+            self.ae.start_server((self.address, self.port), block=True, evt_handlers=handlers)
+        except KeyboardInterrupt:
+            print("DEBUG: Storage SCP interrupted")
+        finally:
+            self.stop()
+
+    def stop(self):
+        """Stop accepting associations and flush pending results"""
+        if self.server:
+            self.server.shutdown()
+            self.server = None
+        if self.writer:
+            self.queue.put(STOP_WRITER)
+            self.writer.join()
+            self.writer = None
+        print(f"DEBUG: Received {self.received} objects, stored {self.stored} results")
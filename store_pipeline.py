@@ -0,0 +1,29 @@
+# store_pipeline.py
+# Batch stages of the services writing to the result store (ingest daemon, storage SCP)
+from exposure_monitor import ExposureMonitor
+from mg_agd import apply_dance_agd
+
+
+class StorePipeline:
+    """Exposure monitor, AGD, patient index and result store of batches of result rows
+
+    The index gets the rows with their real study dates before the store,
+    which pseudonymizes its row data if configured.
+    """
+    def __init__(self, store, patient_index=None, exposure_monitor=None, debug=False):
+        self.store = store
+        self.patient_index = patient_index
+        self.exposure_monitor = exposure_monitor or ExposureMonitor()
+        self.debug = debug
+
+    def finish_batch(self, rows):
+        """Pass a batch of rows through the stages, returns the number of stored rows"""
+        for row in rows:
+            if row.get('Modality') == 'DX' and self.exposure_monitor.add(row):
+                print(f"Exposure flagged ({row['EIFlag']}): {row.get('Path', '')}")
+        computed = apply_dance_agd(rows)
+        if computed and self.debug:
+            print(f"DEBUG: Computed AGD of {computed} MG images with the Dance model")
+        if self.patient_index:
+            self.patient_index.add_results(rows)
+        return self.store.add_results(rows)
@@ -0,0 +1,24 @@
+# conftest.py
+import os
+import sys
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+# Synthetic dataset helpers of the benchmarks
+sys.path.insert(0, os.path.join(ROOT_DIR, "tools"))
+
+
+@pytest.fixture(autouse=True)
+def state_dir(tmp_path, monkeypatch):
+    """Scan state and pseudonym key of a test in its temporary directory instead of the application's"""
+    import pseudonymize
+    from dose_scanner import DoseScanner
+    directory = str(tmp_path / "scan_state")
+    monkeypatch.setattr(DoseScanner, 'state_dir', directory)
+    monkeypatch.setattr(pseudonymize, 'SECRET_PATH', os.path.join(directory, "pseudonym.key"))
+    for function in (pseudonymize.load_secret, pseudonymize.pseudonym, pseudonymize.date_shift):
+        function.cache_clear()
+    yield directory
+    for function in (pseudonymize.load_secret, pseudonymize.pseudonym, pseudonymize.date_shift):
+        function.cache_clear()
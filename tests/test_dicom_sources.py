@@ -0,0 +1,82 @@
+# test_dicom_sources.py
+import io
+import os
+import tarfile
+import zipfile
+import pytest
+from prefetch_benchmark import make_ct_image
+from dicom_sources import iter_archive, iter_dicom_sources
+from dose_scanner import DoseScanner
+
+
+def ct_bytes(index):
+    buffer = io.BytesIO()
+    make_ct_image(index).save_as(buffer, enforce_file_format=True)
+    return buffer.getvalue()
+
+
+def write_zip(path, members):
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr("series/", b"")
+        for name, data in members.items():
+            archive.writestr(name, data)
+
+
+def write_tar(path, members):
+    with tarfile.open(path, 'w:gz') as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+
+MEMBERS = {"series/ct0.dcm": ct_bytes(0), "series/ct1": ct_bytes(1), "notes.txt": b"not dicom " * 20}
+
+
+@pytest.mark.parametrize("name, write", [("images.zip", write_zip), ("images.tar.gz", write_tar)])
+def test_archive_members_are_read_as_headers(tmp_path, name, write):
+    path = str(tmp_path / name)
+    write(path, MEMBERS)
+    broken = []
+    datasets = list(iter_archive(path, broken=broken))
+    # DICOM members by their preamble, not their extension
+    assert [dcm.filename for dcm in datasets] == [f"{path}/series/ct0.dcm", f"{path}/series/ct1"]
+    assert [dcm.PatientID for dcm in datasets] == ["BENCH000", "BENCH001"]
+    assert all('PixelData' not in dcm for dcm in datasets)
+    assert broken == []
+
+
+@pytest.mark.parametrize("name, write", [("broken.zip", write_zip), ("broken.tar.gz", write_tar)])
+def test_broken_archive_is_reported(tmp_path, name, write):
+    path = str(tmp_path / name)
+    write(path, MEMBERS)
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) // 2)
+    broken = []
+    list(iter_archive(path, broken=broken))
+    assert [archive for archive, _ in broken] == [path]
+
+
+def test_sources_continue_after_a_broken_archive(tmp_path):
+    (tmp_path / "a_broken.zip").write_bytes(b"PK\x03\x04 cut short")
+    write_zip(str(tmp_path / "b_images.zip"), MEMBERS)
+    (tmp_path / "c.dcm").write_bytes(ct_bytes(2))
+    broken = []
+    sources = list(iter_dicom_sources(str(tmp_path), broken=broken))
+    # Directory order is up to the file system
+    assert sorted(source if isinstance(source, str) else source.filename for source in sources) == [
+        str(tmp_path / "b_images.zip/series/ct0.dcm"), str(tmp_path / "b_images.zip/series/ct1"),
+        str(tmp_path / "c.dcm")]
+    assert [archive for archive, _ in broken] == [str(tmp_path / "a_broken.zip")]
+
+
+def test_scan_of_archives(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(DoseScanner, 'patient_index_dir', None)
+    write_tar(str(tmp_path / "images.tar.gz"), MEMBERS)
+    (tmp_path / "broken.zip").write_bytes(b"PK\x03\x04 cut short")
+    scanner = DoseScanner("CT", "IMAGE", ssde=False)
+    scanner.start_profile()
+    results = scanner.scan_files(str(tmp_path))
+    assert sorted(row['PatientID'] for row in results) == ["BENCH000", "BENCH001"]
+    assert scanner.profiler.counters['broken_archives'] == 1
+    assert f"Warning: Could not read archive {tmp_path / 'broken.zip'}" in capsys.readouterr().out
@@ -0,0 +1,69 @@
+# test_drl_bands.py
+import pytest
+from drl_bands import BandTable, range_problems
+
+AGE_BANDS = {"6-10": "c", "0-1": "a", "2-5": "b"}
+
+
+def test_labels_are_sorted_by_bounds():
+    table = BandTable({"10-15": 4, "2-5": 2, "6-9": 3})
+    assert table.labels == ["2-5", "6-9", "10-15"]
+    assert table.values == [2, 3, 4]
+
+
+@pytest.mark.parametrize("value, band", [
+    (0, 0),
+    (1, 0),
+    (2, 1),
+    (5, 1),
+    (6, 2),
+    (10, 2),
+    (1.5, -1),    # between "0-1" and "2-5"
+    (-0.5, -1),   # below the first band
+    (10.5, -1),   # above the last band
+    (float('nan'), -1),
+])
+def test_assign_edges(value, band):
+    assert BandTable(AGE_BANDS).assign([value]).tolist() == [band]
+
+
+def test_shared_bound_goes_to_lower_band():
+    table = BandTable({"0-1": "a", "1-5": "b"})
+    assert table.assign([1, 1.01, 5]).tolist() == [0, 1, 1]
+
+
+def test_fractional_bounds():
+    table = BandTable({"20-44.9": 1, "45-60": 2})
+    assert table.assign([44.9, 44.95, 45]).tolist() == [0, -1, 1]
+
+
+def test_empty_table():
+    table = BandTable({})
+    assert len(table) == 0
+    assert table.assign([0, 5]).tolist() == [-1, -1]
+
+
+def test_assign_keeps_shape():
+    assert BandTable(AGE_BANDS).assign([[0, 3], [7, 11]]).tolist() == [[0, 1], [2, -1]]
+
+
+def test_invalid_range_raises():
+    with pytest.raises(ValueError):
+        BandTable({"0-1-2": 1})
+
+
+def test_range_problems():
+    protocols = {
+        'Head': {'child': {"0-1": 1, "2-5": 2}},
+        'Chest': {'child': {"0-3": 1, "2-5": 2, "8-10": 3, "x": 4, "7-6": 5}},
+    }
+    assert range_problems("CT", protocols) == [
+        "CT Chest: invalid range 'x'",
+        "CT Chest: range '7-6' is reversed",
+        "CT Chest: ranges '0-3' and '2-5' overlap",
+        "CT Chest: gap between ranges '2-5' and '8-10'",
+    ]
+
+
+def test_order_keeps_configured_positions():
+    assert BandTable(AGE_BANDS).order.tolist() == [1, 2, 0]
@@ -0,0 +1,45 @@
+# test_drl_comparison.py
+import pandas as pd
+import pytest
+from drl_config import DRLConfiguration
+from dose_scanner import DoseScanner
+
+# Age groups configured out of bound order, the baseline takes the first configured group with records
+CT_PROTOCOLS = {
+    'Head': {
+        'protocol_match': ['head'],
+        'adult': {'DLP': 1000.0, 'CTDIvol': 60.0},
+        'child': {'6-10': {'DLP': 600.0, 'CTDIvol': 40.0}, '0-5': {'DLP': 300.0, 'CTDIvol': 20.0}}
+    }
+}
+
+
+@pytest.fixture
+def scanner(tmp_path):
+    scanner = DoseScanner("CT", "RDSR")
+    scanner.drl_config = DRLConfiguration(str(tmp_path))
+    scanner.drl_config.publish("CT", CT_PROTOCOLS, save=False)
+    return scanner
+
+
+def ct_rows(ages):
+    return pd.DataFrame({'AcquisitionProtocol': 'Head', 'TotalDLP': 300.0, 'CTDIvol': 20.0,
+                         'DeviceObserverModelName': 'Scanner', 'CalculatedAge': ages})
+
+
+@pytest.mark.parametrize("ages, drl_level", [
+    ([40, 50], 1000.0),
+    ([3, 50], 300.0),
+    ([8, 50], 600.0),
+    # Both groups have records, the first configured one is used
+    ([3, 8], 600.0),
+])
+def test_child_drl_of_first_configured_group(scanner, ages, drl_level):
+    comparison = scanner.calculate_drl_comparison(ct_rows(ages))
+    assert [row['drl_level'] for row in comparison] == [drl_level]
+
+
+def test_missing_age_column_uses_adult_drl(scanner):
+    comparison = scanner.calculate_drl_comparison(ct_rows([3, 8]).drop(columns='CalculatedAge'))
+    assert [row['drl_level'] for row in comparison] == [1000.0]
+    assert comparison[0]['percentage'] == pytest.approx(-70.0)
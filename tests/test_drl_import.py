@@ -0,0 +1,46 @@
+# test_drl_import.py
+import pandas as pd
+import pytest
+from drl_config import DRLConfiguration
+
+
+@pytest.fixture
+def config(tmp_path):
+    return DRLConfiguration(str(tmp_path))
+
+
+def import_tables(config, monkeypatch, tables):
+    monkeypatch.setattr(config, 'read_import_sheets', lambda modality, file_path: tables)
+    return config.import_from_excel("ALL", "protocols.xlsx")
+
+
+def test_errors_of_every_sheet_are_reported(config, monkeypatch):
+    ct = pd.DataFrame({'Protocol': ['Head'], 'Match Patterns': ['head'],
+                       'Adult DLP': ['x'], 'Adult CTDIvol': ['60']}, dtype=object)
+    dx = pd.DataFrame({'Protocol': ['Chest'], 'Match Patterns': ['chest']}, dtype=object)
+    mg = pd.DataFrame({'Protocol': ['CC', 'CC'], 'Match Patterns': ['cc', 'cc'], 'AGD': ['2', '2']}, dtype=object)
+    ok, message = import_tables(config, monkeypatch, {'CT': ct, 'DX': dx, 'MG': mg})
+    assert not ok
+    assert "CT row 2, 'Adult DLP': invalid number 'x'" in message
+    assert "DX: missing column 'Adult DAP'" in message
+    assert "MG row 3, 'Protocol': duplicate protocol 'CC'" in message
+
+
+def test_line_numbers_after_blank_rows(config, monkeypatch):
+    ct = pd.DataFrame({'Protocol': ['Head', None, 'Chest'], 'Match Patterns': ['head', None, 'chest'],
+                       'Adult DLP': ['900', None, 'bad'], 'Adult CTDIvol': ['60', None, '10']}, dtype=object)
+    ok, message = import_tables(config, monkeypatch, {'CT': ct})
+    assert not ok
+    # Header on line 1, the blank row on line 3
+    assert "CT row 4, 'Adult DLP': invalid number 'bad'" in message
+
+
+def test_valid_sheets_are_published(config, monkeypatch):
+    ct = pd.DataFrame({'Protocol': ['Head'], 'Match Patterns': ['head, brain'],
+                       'Adult DLP': ['900'], 'Adult CTDIvol': ['60'],
+                       'Child 1-5 DLP': ['300'], 'Child 1-5 CTDIvol': ['25']}, dtype=object)
+    ok, message = import_tables(config, monkeypatch, {'CT': ct})
+    assert ok, message
+    protocol = config.get_protocol("CT", 'Head')
+    assert protocol['protocol_match'] == ['head', 'brain']
+    assert protocol['child'] == {'1-5': {'DLP': 300.0, 'CTDIvol': 25.0}}
@@ -0,0 +1,107 @@
+# test_exposure_monitor.py
+import math
+import pytest
+from exposure_monitor import (ExposureStats, ExposureMonitor, deviation_index, median,
+                              MIN_HISTORY, EWMA_WEIGHT)
+
+
+def test_deviation_index_from_exposure_index():
+    assert deviation_index({'ExposureIndex': 400, 'TargetExposureIndex': 400}) == 0
+    assert math.isclose(deviation_index({'ExposureIndex': 800, 'TargetExposureIndex': 400}), 3.0103, abs_tol=1e-4)
+    assert math.isclose(deviation_index({'ExposureIndex': '100', 'TargetExposureIndex': '400'}), -6.0206, abs_tol=1e-4)
+
+
+def test_deviation_index_prefers_the_reported_value():
+    row = {'DeviationIndex': '-1.5', 'ExposureIndex': 800, 'TargetExposureIndex': 400}
+    assert deviation_index(row) == -1.5
+
+
+@pytest.mark.parametrize("row", [
+    {},
+    {'ExposureIndex': 0, 'TargetExposureIndex': 400},
+    {'ExposureIndex': 400, 'TargetExposureIndex': ''},
+    {'DeviationIndex': '', 'ExposureIndex': 'n/a', 'TargetExposureIndex': 400},
+])
+def test_deviation_index_missing(row):
+    assert deviation_index(row) is None
+
+
+def test_median():
+    assert median([3, 1, 2]) == 2
+    assert median([4, 1, 3, 2]) == 2.5
+
+
+@pytest.mark.parametrize("di, flags", [
+    (3.0, []),
+    (3.01, ["DI > +3"]),
+    (-3.0, []),
+    (-3.5, ["DI < -3"]),
+])
+def test_di_limits(di, flags):
+    assert ExposureStats().check(di) == flags
+
+
+def test_drift_is_checked_after_min_history():
+    stats = ExposureStats()
+    # EWMA of a constant 1.5 is 1.5 from the first exam, above the limit of 1
+    for _ in range(MIN_HISTORY - 1):
+        assert stats.check(1.5) == []
+    assert stats.check(1.5) == ["Drift"]
+
+
+def test_ewma_follows_weight():
+    stats = ExposureStats()
+    for _ in range(MIN_HISTORY):
+        stats.check(0.0)
+    # EWMA after n exams at 2.0 is 2 * (1 - 0.8 ** n): 0.4, 0.72, 0.976, 1.1808
+    assert stats.check(2.0) == []
+    assert math.isclose(stats.ewma, EWMA_WEIGHT * 2.0)
+    assert stats.check(2.0) == []
+    assert stats.check(2.0) == []
+    assert stats.check(2.0) == ["Drift"]
+    assert math.isclose(stats.ewma, 1.1808)
+
+
+def alternating_history():
+    """Stats after DI -0.5 and 0.5 alternately: median 0, MAD 0.5, EWMA near 0"""
+    stats = ExposureStats()
+    for index in range(MIN_HISTORY):
+        stats.check(0.5 if index % 2 else -0.5)
+    return stats
+
+
+def test_mad_outlier():
+    # Robust z = 2.9 / (1.4826 * 0.5) = 3.91 > 3.5, within the DI limits
+    assert alternating_history().check(2.9) == ["Outlier"]
+
+
+def test_mad_within_limit():
+    # Robust z = 2.5 / (1.4826 * 0.5) = 3.37
+    assert alternating_history().check(2.5) == []
+
+
+def test_no_outlier_without_spread():
+    stats = ExposureStats()
+    for _ in range(MIN_HISTORY):
+        stats.check(0.0)
+    # MAD 0 gives no robust z
+    assert "Outlier" not in stats.check(2.9)
+
+
+def test_monitor_keeps_stats_per_protocol_and_detector():
+    monitor = ExposureMonitor()
+    for _ in range(MIN_HISTORY - 1):
+        monitor.add({'ProtocolName': 'Chest PA', 'DetectorID': 'D1', 'DeviationIndex': 1.5})
+    other = {'ProtocolName': 'Chest PA', 'DetectorID': 'D2', 'DeviationIndex': 1.5}
+    assert monitor.add(other) == []
+    row = {'ProtocolName': 'Chest PA', 'DetectorID': 'D1', 'ExposureIndex': 565, 'TargetExposureIndex': 400}
+    assert monitor.add(row) == ["Drift"]
+    assert row['DeviationIndex'] == 1.5
+    assert row['EIFlag'] == "Drift"
+    assert monitor.flagged == 1
+
+
+def test_monitor_skips_rows_without_di():
+    row = {'ProtocolName': 'Chest PA'}
+    assert ExposureMonitor().add(row) == []
+    assert 'EIFlag' not in row
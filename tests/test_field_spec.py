@@ -0,0 +1,120 @@
+# test_field_spec.py
+import pytest
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+from dose_extractor import DoseExtractor, PlainVar
+
+SOP_CLASSES = {"CT": "1.2.840.10008.5.1.4.1.1.2", "DX": "1.2.840.10008.5.1.4.1.1.1.1",
+               "XA": "1.2.840.10008.5.1.4.1.1.12.1", "MG": "1.2.840.10008.5.1.4.1.1.1.2"}
+COMMON = {'Manufacturer': "Vendor", 'StationName': "ROOM1", 'PatientName': "Test^Patient", 'PatientID': "P001",
+          'PatientSex': "F", 'PatientBirthDate': "20100615", 'PatientAge': "013Y", 'PatientWeight': 45.5,
+          'PatientSize': 1.52, 'StudyDate': "20240110", 'StudyTime': "101500", 'StudyInstanceUID': "1.2.3.4",
+          'StudyDescription': "Study", 'BodyPartExamined': "CHEST"}
+IMAGE_FIELDS = {
+    "CT": {'DataCollectionDiameter': 500, 'ExposureTime': 1000, 'KVP': 120, 'XRayTubeCurrent': 200,
+           'Exposure': 150, 'ExposureInuAs': 150000, 'CTDIvol': 12.5, 'ScanOptions': "HELICAL",
+           'AcquisitionType': "SPIRAL", 'ProtocolName': "Chest", 'SeriesDescription': "Chest 1.0",
+           'SeriesInstanceUID': "1.2.3.4.5", 'SliceLocation': -120.5},
+    "DX": {'KVP': 80, 'ExposureTime': 20, 'XRayTubeCurrent': 250, 'Exposure': 5, 'ExposureInuAs': 5000,
+           'ImageAndFluoroscopyAreaDoseProduct': 0.12, 'DistanceSourceToDetector': 1800,
+           'DistanceSourceToPatient': 1600, 'ImageLaterality': "L", 'ViewPosition': "PA",
+           'ProtocolName': "Chest PA", 'SeriesDescription': "Chest", 'Grid': ["IN", "FOCUSED"],
+           'ExposureControlMode': "AUTOMATIC", 'ExposureIndex': 400, 'TargetExposureIndex': 350,
+           'DeviationIndex': 0.6, 'DetectorID': "DET1"},
+    "XA": {'KVP': 70, 'ExposureTime': 8, 'XRayTubeCurrent': 400, 'Exposure': 3,
+           'ImageAndFluoroscopyAreaDoseProduct': 25.5, 'DistanceSourceToIsocenter': 750, 'TableHeight': 900,
+           'ProtocolName': "Coronary", 'SeriesDescription': "LAO"},
+    "MG": {'KVP': 28, 'ExposureTime': 1200, 'XRayTubeCurrent': 100, 'Exposure': 80, 'EntranceDose': 5,
+           'EntranceDoseInmGy': 5.2, 'OrganDose': 1.35, 'HalfValueLayer': 0.55, 'RelativeXRayExposure': 1200,
+           'CompressionForce': 110, 'CompressionPressure': 9.5, 'BodyPartThickness': 52,
+           'ExposureControlMode': "AUTOMATIC", 'AnodeTargetMaterial': "TUNGSTEN", 'FilterMaterial': "RHODIUM",
+           'GridFocalDistance': 650, 'ImageLaterality': "R", 'ViewPosition': "CC", 'SeriesDescription': "R CC"}
+}
+
+
+def make_image(modality, **fields):
+    """Image with the dose fields of a modality, fields set to None are left out"""
+    ds = Dataset()
+    ds.file_meta = FileMetaDataset()
+    ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds.file_meta.MediaStorageSOPClassUID = SOP_CLASSES[modality]
+    ds.file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    ds.SOPClassUID = SOP_CLASSES[modality]
+    ds.SOPInstanceUID = ds.file_meta.MediaStorageSOPInstanceUID
+    ds.Modality = modality
+    for keyword, value in {**COMMON, **IMAGE_FIELDS[modality], **fields}.items():
+        if value is not None:
+            setattr(ds, keyword, value)
+    return ds
+
+
+def exposure_dose_sequence(**fields):
+    item = Dataset()
+    for keyword, value in fields.items():
+        setattr(item, keyword, value)
+    return [item]
+
+
+PATIENT = {'Manufacturer': 'Vendor', 'DeviceObserverModelName': '', 'StationName': 'ROOM1',
+           'PatientName': 'Test^Patient', 'PatientID': 'P001', 'PatientSex': 'F', 'PatientBirthDate': '20100615',
+           'PatientAge': '013Y', 'PatientWeight': 45.5, 'PatientSize': 1.52, 'StudyDate': '20240110',
+           'StudyTime': '101500', 'StudyInstanceUID': '1.2.3.4', 'StudyDescription': 'Study',
+           'BodyPartExamined': 'CHEST'}
+CT_FIELDS = {'ScanningLength': 500.0, 'ExposureTime': 1000, 'KVP': 120.0, 'TubeCurrent': 200, 'Exposure': 150,
+             'ExposureInuAs': 150000, 'CTDIvol': 12.5, 'DLP': None, 'ScanOptions': 'HELICAL',
+             'AcquisitionType': 'SPIRAL', 'ProtocolName': 'Chest', 'SeriesDescription': 'Chest 1.0',
+             'SeriesInstanceUID': '1.2.3.4.5', 'SliceLocation': -120.5}
+DX_FIELDS = {'KVP': 80.0, 'ExposureTime': 20, 'XRayTubeCurrent': 250, 'Exposure': 5, 'ExposureInuAs': 5000,
+             'ImageAndFluoroscopyAreaDoseProduct': 0.12, 'EntranceDose': 0.0001953125,
+             'DistanceSourceToDetector': 1800.0, 'DistanceSourceToPatient': 1600.0, 'ImageLaterality': 'L',
+             'ViewPosition': 'PA', 'ProtocolName': 'Chest PA', 'SeriesDescription': 'Chest',
+             'Grid': ['IN', 'FOCUSED'], 'ExposureControlMode': 'AUTOMATIC', 'ExposureIndex': 400.0,
+             'TargetExposureIndex': 350.0, 'DeviationIndex': 0.6, 'DetectorID': 'DET1'}
+XA_FIELDS = {'KVP': 70.0, 'ExposureTime': 8, 'XRayTubeCurrent': 400, 'Exposure': 3, 'DoseAreaProduct': '',
+             'TotalFluoroTime': '', 'TotalNumberOfExposures': '', 'TotalDoseAreaProduct': 25.5,
+             'ReferencePointAirKerma': '', 'DistanceSourceToIsocenter': 750.0, 'DistanceSourceToReference': '',
+             'TableHeight': 900.0, 'ProtocolName': 'Coronary', 'SeriesDescription': 'LAO', 'AcquisitionProtocol': ''}
+MG_FIELDS = {'KVP': 28.0, 'ExposureTime': 1200, 'XRayTubeCurrent': 100, 'Exposure': 80, 'EntranceDose': 5,
+             'EntranceDoseInmGy': 5.2, 'OrganDose': 1.35, 'HalfValueLayer': 0.55, 'RelativeXRayExposure': 1200,
+             'CompressionForce': 110.0, 'CompressionPressure': 9.5, 'BodyPartThickness': 52.0,
+             'ExposureControlMode': 'AUTOMATIC', 'AnodeTargetMaterial': 'TUNGSTEN', 'FilterMaterial': 'RHODIUM',
+             'GridFocalDistance': 650.0, 'ImageLaterality': 'R', 'ViewPosition': 'CC', 'SeriesDescription': 'R CC',
+             'AcquisitionProtocol': ''}
+
+# Rows of the hand-written extract_ct/dx/xa/mg_dose_data functions the field spec replaced,
+# as (modality, image fields, patient fields that differ, fields after the patient fields)
+CASES = {
+    'CT': ("CT", {}, {}, {'CalculatedAge': 13, **CT_FIELDS}),
+    'CT exposure dose sequence': ("CT", {'CTDIvol': None, 'ExposureDoseSequence': exposure_dose_sequence(CTDIvol=9.5)},
+                                  {}, {'CalculatedAge': 13, **CT_FIELDS, 'CTDIvol': 9.5}),
+    'CT without birth date': ("CT", {'PatientBirthDate': None, 'PatientWeight': None},
+                              {'PatientBirthDate': '', 'PatientWeight': None}, CT_FIELDS),
+    'DX derived entrance dose': ("DX", {}, {}, {'CalculatedAge': 13, **DX_FIELDS}),
+    'DX entrance dose': ("DX", {'EntranceDose': 3}, {}, {'CalculatedAge': 13, **DX_FIELDS, 'EntranceDose': 3.0}),
+    'DX without exposure': ("DX", {'Exposure': None}, {},
+                            {'CalculatedAge': 13, **DX_FIELDS, 'Exposure': '', 'EntranceDose': None}),
+    'XA': ("XA", {}, {}, {'CalculatedAge': 13, **XA_FIELDS}),
+    'MG': ("MG", {}, {}, {'CalculatedAge': 13, **MG_FIELDS}),
+}
+
+
+class Extractor(DoseExtractor):
+    def __init__(self):
+        self.debug_mode = PlainVar(False)
+
+
+@pytest.mark.parametrize("case", list(CASES))
+def test_rows_match_hand_written_extractors(case, tmp_path):
+    modality, fields, patient, image = CASES[case]
+    path = str(tmp_path / "image.dcm")
+    make_image(modality, **fields).save_as(path, enforce_file_format=True)
+    row = Extractor().extract_image_data(path, modality)
+    expected = {'File': "image.dcm", 'Modality': modality, **PATIENT, **patient, **image}
+    assert row == expected
+    assert list(row) == list(expected)
+
+
+def test_other_modality_is_not_extracted(tmp_path):
+    path = str(tmp_path / "image.dcm")
+    make_image("CT").save_as(path, enforce_file_format=True)
+    assert Extractor().extract_image_data(path, "MG") is None
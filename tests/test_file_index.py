@@ -0,0 +1,64 @@
+# test_file_index.py
+import os
+import pytest
+import prefetch
+from prefetch_benchmark import make_ct_image
+from dicom_sources import write_file_index, read_file_index, is_file_index
+from dose_scanner import DoseScanner
+
+
+@pytest.fixture
+def indexed_files(tmp_path):
+    directory = tmp_path / "archive"
+    directory.mkdir()
+    rows = []
+    for index, study_date in enumerate(["20240101", "20240102", "20240301", ""]):
+        path = str(directory / f"{index:03d}.dcm")
+        make_ct_image(index).save_as(path, enforce_file_format=True)
+        rows.append({'Path': path, 'Size': os.path.getsize(path), 'Modality': 'CT',
+                     'SOPClassUID': '1.2.840.10008.5.1.4.1.1.2', 'StudyDate': study_date})
+    # Indexed modality and date select files, other modalities are not read
+    rows.append({'Path': str(directory / "dx.dcm"), 'Size': 0, 'Modality': 'DX',
+                 'SOPClassUID': '', 'StudyDate': '20240101'})
+    index_path = str(tmp_path / "index.csv")
+    write_file_index(index_path, rows)
+    return index_path, [row['Path'] for row in rows]
+
+
+def test_index_round_trip(indexed_files):
+    index_path, paths = indexed_files
+    assert is_file_index(index_path)
+    assert not is_file_index(os.path.dirname(paths[0]))
+    assert [row['Path'] for row in read_file_index(index_path)] == paths
+
+
+def test_missing_columns_are_rejected(tmp_path):
+    path = tmp_path / "other.csv"
+    path.write_text("Path,Size\na.dcm,1\n", encoding='utf-8')
+    with pytest.raises(ValueError, match="missing columns"):
+        list(read_file_index(str(path)))
+
+
+def test_scan_of_index_skips_discovery(indexed_files, monkeypatch):
+    index_path, paths = indexed_files
+    reads = []
+    real_read = prefetch.read_header
+
+    def counting_read(path):
+        reads.append(path)
+        return real_read(path)
+
+    def no_discovery(*args):
+        raise AssertionError("file index scan walked the directories")
+
+    monkeypatch.setattr(prefetch, 'read_header', counting_read)
+    monkeypatch.setattr(DoseScanner, 'iter_dicom_files', no_discovery)
+    monkeypatch.setattr(DoseScanner, 'patient_index_dir', None)
+    scanner = DoseScanner("CT", "IMAGE", date_from="01.01.2024", date_to="31.01.2024", ssde=False)
+    scanner.start_profile()
+    results = scanner.scan_files(index_path)
+    assert sorted(row['File'] for row in results) == ["000.dcm", "001.dcm"]
+    # Only the selected files are read, once, for extraction
+    assert sorted(reads) == paths[:2]
+    assert scanner.profiler.counters['files_seen'] == 5
+    assert scanner.profiler.counters['files_matched'] == 2
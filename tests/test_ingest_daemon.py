@@ -0,0 +1,90 @@
+# test_ingest_daemon.py
+import io
+import os
+import zipfile
+import pytest
+import pseudonymize
+from synthetic_rdsr import make_rdsr
+from ingest_daemon import IngestDaemon
+from result_store import ResultStore
+from dicom_sources import source_name
+
+
+def rdsr_bytes(index):
+    ds = make_rdsr(index)
+    ds.file_meta.MediaStorageSOPClassUID = ds.SOPClassUID
+    ds.file_meta.MediaStorageSOPInstanceUID = ds.SOPInstanceUID
+    buffer = io.BytesIO()
+    ds.save_as(buffer, enforce_file_format=True)
+    return buffer.getvalue()
+
+
+@pytest.fixture(autouse=True)
+def secret(monkeypatch):
+    monkeypatch.setenv(pseudonymize.SECRET_ENV, "test-secret")
+    pseudonymize.load_secret.cache_clear()
+    yield
+    pseudonymize.load_secret.cache_clear()
+
+
+@pytest.fixture
+def drop_folder(tmp_path):
+    folder = tmp_path / "drop"
+    folder.mkdir()
+    with zipfile.ZipFile(folder / "study.zip", 'w') as archive:
+        for index in range(3):
+            archive.writestr(f"rdsr{index}.dcm", rdsr_bytes(index))
+    (folder / "single.dcm").write_bytes(rdsr_bytes(3))
+    (folder / "notes.txt").write_text("not DICOM")
+    (folder / "broken.zip").write_bytes(b"not a zip")
+    return folder
+
+
+def start_daemon(tmp_path, folder, reads):
+    daemon = IngestDaemon([str(folder)], str(tmp_path / "results.db"),
+                          patient_index_dir=str(tmp_path / "index"))
+    extract = daemon.extractor.extract_routed_data
+
+    def counting_extract(source):
+        reads.append(source)
+        return extract(source)
+    daemon.extractor.extract_routed_data = counting_extract
+    return daemon
+
+
+def sweep(daemon):
+    ingested = daemon.store.ingested_files()
+    known_paths = daemon.store.known_paths()
+    known_paths.update(ingested)
+    daemon.initial_sweep(known_paths, ingested)
+
+
+def test_restart_does_not_read_handled_files_again(tmp_path, drop_folder):
+    reads = []
+    daemon = start_daemon(tmp_path, drop_folder, reads)
+    sweep(daemon)
+    daemon.store.close()
+    # Three archive members, the single file and the text file
+    assert len(reads) == 5
+    store = ResultStore(str(tmp_path / "results.db"))
+    assert len(store.get_results("CT")) == 4
+    assert set(store.ingested_files()) == {str(drop_folder / name) for name in
+                                           ("study.zip", "single.dcm", "notes.txt", "broken.zip")}
+    store.close()
+
+    reads.clear()
+    daemon = start_daemon(tmp_path, drop_folder, reads)
+    sweep(daemon)
+    assert reads == []
+
+    # A new file and a rewritten archive are read again
+    (drop_folder / "later.dcm").write_bytes(rdsr_bytes(4))
+    with zipfile.ZipFile(drop_folder / "study.zip", 'a') as archive:
+        archive.writestr("rdsr5.dcm", rdsr_bytes(5))
+    sweep(daemon)
+    daemon.store.close()
+    assert sorted(os.path.basename(source_name(source)) for source in reads) == \
+        ["later.dcm", "rdsr0.dcm", "rdsr1.dcm", "rdsr2.dcm", "rdsr5.dcm"]
+    store = ResultStore(str(tmp_path / "results.db"))
+    assert len(store.get_results("CT")) == 6
+    store.close()
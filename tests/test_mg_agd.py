@@ -0,0 +1,64 @@
+# test_mg_agd.py
+# Expected values are K * g * c * s with g, c (women aged 50 to 64) and s as
+# tabulated by Dance et al 2000, at table points and halfway between them
+import math
+import pytest
+from mg_agd import dance_agd, apply_dance_agd, material_code
+
+
+@pytest.mark.parametrize("target, filter_, thickness_mm, hvl, expected", [
+    # 5.0 cm, HVL 0.40 mm Al: g 0.209, c 0.985, Mo/Mo s 1.000
+    ("MOLYBDENUM", "MOLYBDENUM", 50, 0.40, 10 * 0.209 * 0.985 * 1.000),
+    # 4.0 cm, HVL 0.35: g 0.235, c 0.961, Mo/Rh s 1.017
+    ("MOLYBDENUM", "RHODIUM", 40, 0.35, 10 * 0.235 * 0.961 * 1.017),
+    # 6.0 cm, HVL 0.50: g 0.214, c 1.001, W/Rh s 1.042
+    ("TUNGSTEN", "RHODIUM", 60, 0.50, 10 * 0.214 * 1.001 * 1.042),
+    # 7.0 cm, HVL 0.55: g 0.202, c 1.015, Rh/Rh s 1.061
+    ("RHODIUM", "RHODIUM", 70, 0.55, 10 * 0.202 * 1.015 * 1.061),
+    # 4.5 cm, HVL 0.375: g (0.208 + 0.232) / 2, c (0.973 + 0.971) / 2
+    ("MOLYBDENUM", "MOLYBDENUM", 45, 0.375, 10 * 0.220 * 0.972 * 1.000),
+])
+def test_dance_table_points(target, filter_, thickness_mm, hvl, expected):
+    agd = dance_agd([28], [target], [filter_], [thickness_mm], [10.0], [hvl])
+    assert math.isclose(agd[0], expected, rel_tol=1e-3)
+
+
+def test_typical_hvl_of_the_spectrum():
+    # Mo/Mo 28 kV: HVL 0.03 + 0.01 * 28 = 0.31 mm Al, 5.0 cm: g and c a fifth of the way to 0.35
+    g = 0.164 + (0.187 - 0.164) * 0.2
+    c = 1.000 + (0.990 - 1.000) * 0.2
+    agd = dance_agd([28], ["MOLYBDENUM"], ["MOLYBDENUM"], [50], [10.0])
+    assert math.isclose(agd[0], 10 * g * c, rel_tol=1e-3)
+
+
+def test_unknown_inputs_give_nan():
+    agd = dance_agd([28, 28, 28], ["MOLYBDENUM", "COPPER", "MOLYBDENUM"],
+                    ["MOLYBDENUM", "MOLYBDENUM", "MOLYBDENUM"], [50, 50, 0], [10.0, 10.0, 10.0])
+    assert not math.isnan(agd[0])
+    assert math.isnan(agd[1])
+    assert math.isnan(agd[2])
+
+
+def test_material_code():
+    assert material_code("ALUMINIUM") == "AL"
+    assert material_code(["RHODIUM", "ALUMINUM"]) == "RH"
+    assert material_code(" w ") == "W"
+
+
+def test_apply_to_rows():
+    rows = [
+        {'Modality': 'MG', 'KVP': '28', 'AnodeTargetMaterial': 'MOLYBDENUM', 'FilterMaterial': 'MOLYBDENUM',
+         'BodyPartThickness': '50', 'EntranceDoseInmGy': '10', 'HalfValueLayer': '0.40', 'OrganDose': ''},
+        # EntranceDose in dGy
+        {'Modality': 'MG', 'KVP': 28, 'AnodeTargetMaterial': 'MOLYBDENUM', 'FilterMaterial': 'MOLYBDENUM',
+         'BodyPartThickness': 50, 'EntranceDose': 0.1, 'HalfValueLayer': 0.40},
+        {'Modality': 'MG', 'OrganDose': 0.15},
+        {'Modality': 'DX', 'KVP': 70},
+    ]
+    assert apply_dance_agd(rows) == 2
+    # OrganDose is in dGy like the DICOM tag
+    assert rows[0]['OrganDose'] == round(10 * 0.209 * 0.985 / 10, 4)
+    assert rows[0]['AGDMethod'] == 'Dance'
+    assert rows[1]['OrganDose'] == rows[0]['OrganDose']
+    assert rows[2] == {'Modality': 'MG', 'OrganDose': 0.15}
+    assert 'OrganDose' not in rows[3]
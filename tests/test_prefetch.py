@@ -0,0 +1,100 @@
+# test_prefetch.py
+import os
+import time
+import threading
+import numpy as np
+import pytest
+import prefetch
+from prefetch import Prefetcher, read_header, parse_header
+from prefetch_benchmark import make_ct_image
+from dose_scanner import DoseScanner
+
+
+@pytest.fixture
+def ct_files(tmp_path):
+    paths = []
+    for index in range(6):
+        path = str(tmp_path / f"{index:03d}.dcm")
+        make_ct_image(index).save_as(path, enforce_file_format=True)
+        paths.append(path)
+    return paths
+
+
+def test_read_header_stops_at_pixel_data(ct_files):
+    path = ct_files[0]
+    buffer = read_header(path)
+    # The first chunk has the Pixel Data tag, the 512 KiB of pixels are left unread
+    assert len(buffer) == prefetch.HEADER_CHUNK < os.path.getsize(path)
+    dcm = parse_header(path, buffer)
+    assert dcm.filename == path
+    assert dcm.CTDIvol == 50
+    assert 'PixelData' not in dcm
+
+
+def test_read_header_of_file_without_pixel_data(tmp_path):
+    ds = make_ct_image(0)
+    del ds.PixelData
+    path = str(tmp_path / "nopixels.dcm")
+    ds.save_as(path, enforce_file_format=True)
+    assert len(read_header(path)) == os.path.getsize(path)
+
+
+def test_parse_header_of_garbage():
+    assert parse_header("x.dcm", b"not dicom") is None
+
+
+def test_depth_limits_reads_per_mount(tmp_path, monkeypatch):
+    slow, fast = tmp_path / "slow", tmp_path / "fast"
+    slow.mkdir()
+    fast.mkdir()
+    running = {}
+    peak = {}
+    lock = threading.Lock()
+
+    def fake_read(path):
+        mount = os.path.basename(os.path.dirname(path))
+        with lock:
+            running[mount] = running.get(mount, 0) + 1
+            peak[mount] = max(peak.get(mount, 0), running[mount])
+        time.sleep(0.01)
+        with lock:
+            running[mount] -= 1
+        return path.encode()
+
+    monkeypatch.setattr(prefetch, 'read_header', fake_read)
+    sources = [str(slow / f"{i}.dcm") for i in range(20)] + [str(fast / f"{i}.dcm") for i in range(20)]
+    prefetcher = Prefetcher({str(slow): 2, str(fast): 6}, default_depth=0)
+    items = list(prefetcher.iter(sources))
+    # Order kept, every read done once
+    assert [source for source, _ in items] == sources
+    assert [buffer for _, buffer in items] == [source.encode() for source in sources]
+    assert peak == {'slow': 2, 'fast': 6}
+
+
+def test_depth_zero_and_datasets_are_passed_through(tmp_path):
+    dataset = make_ct_image(0)
+    path = str(tmp_path / "a.dcm")
+    items = list(Prefetcher(default_depth=0).iter([path, dataset]))
+    assert items == [(path, None), (dataset, None)]
+
+
+def test_scan_reads_each_file_once(ct_files, tmp_path, monkeypatch):
+    reads = []
+    real_read = prefetch.read_header
+
+    def counting_read(path):
+        reads.append(path)
+        return real_read(path)
+
+    monkeypatch.setattr(prefetch, 'read_header', counting_read)
+    monkeypatch.setattr(DoseScanner, 'patient_index_dir', None)
+    scanner = DoseScanner("CT", "IMAGE", ssde=False)
+    scanner.start_profile()
+    directory = os.path.dirname(ct_files[0])
+    # Discovery lists paths only
+    assert sorted(scanner.find_dicom_files(directory)) == ct_files
+    reads.clear()
+    results = scanner.scan_files(directory)
+    assert sorted(row['File'] for row in results) == [os.path.basename(path) for path in ct_files]
+    assert sorted(reads) == ct_files
+    assert np.isclose(sorted(float(row['CTDIvol']) for row in results)[0], 50)
@@ -0,0 +1,67 @@
+# test_pseudonymize.py
+from datetime import date
+import pytest
+import pseudonymize
+from pseudonymize import (pseudonym, date_shift, pseudonymize_rows, shift_dates,
+                          MAX_DATE_SHIFT_DAYS, PSEUDONYM_LENGTH, SECRET_ENV)
+
+
+def clear_caches():
+    for function in (pseudonymize.load_secret, pseudonym, date_shift):
+        function.cache_clear()
+
+
+@pytest.fixture(autouse=True)
+def secret(monkeypatch):
+    monkeypatch.setenv(SECRET_ENV, "test-secret")
+    clear_caches()
+    yield
+    clear_caches()
+
+
+def days_between(first, second):
+    return (date(int(second[:4]), int(second[4:6]), int(second[6:])) -
+            date(int(first[:4]), int(first[4:6]), int(first[6:]))).days
+
+
+def test_same_id_same_pseudonym():
+    assert pseudonym("PAT001") == pseudonym("PAT001")
+    assert pseudonym(" PAT001 ") == pseudonym("PAT001")
+    assert pseudonym("PAT001") != pseudonym("PAT002")
+    assert len(pseudonym("PAT001")) == PSEUDONYM_LENGTH
+    assert pseudonym("") == ''
+
+
+def test_pseudonym_depends_on_the_secret(monkeypatch):
+    first = pseudonym("PAT001")
+    monkeypatch.setenv(SECRET_ENV, "other-secret")
+    clear_caches()
+    assert pseudonym("PAT001") != first
+
+
+def test_date_shift_within_limit():
+    shifts = [date_shift(f"PAT{index:05d}") for index in range(2000)]
+    assert all(-MAX_DATE_SHIFT_DAYS <= shift <= MAX_DATE_SHIFT_DAYS for shift in shifts)
+    # Spread over the whole range, not a constant offset
+    assert min(shifts) < -20 and max(shifts) > 20
+    assert date_shift("PAT00001") == date_shift("PAT00001")
+
+
+def test_rows_of_a_patient_keep_their_intervals():
+    rows = [{'PatientID': 'PAT001', 'StudyDate': '20240110', 'PatientName': 'Doe^Jane',
+             'PatientBirthDate': '19600101', 'StudyTime': '101500', 'File': 'IM0001',
+             'StudyInstanceUID': '1.2.3', 'CalculatedAge': 64},
+            {'PatientID': 'PAT001', 'StudyDate': '20240301'}]
+    pseudonymize_rows(rows)
+    first, second = rows
+    assert first['PatientID'] == second['PatientID'] == pseudonym('PAT001')
+    assert abs(days_between('20240110', first['StudyDate'])) <= MAX_DATE_SHIFT_DAYS
+    assert days_between(first['StudyDate'], second['StudyDate']) == days_between('20240110', '20240301')
+    assert first['PatientName'] == first['PatientBirthDate'] == first['StudyTime'] == ''
+    assert first['File'] == pseudonym('IM0001')
+    assert first['StudyInstanceUID'] == pseudonym('1.2.3')
+    assert first['CalculatedAge'] == 64
+
+
+def test_shift_dates_of_invalid_dates():
+    assert shift_dates(['20240228', '20240230', 'unknown', ''], [2, 2, 2, 2]) == ['20240301', '', '', '']
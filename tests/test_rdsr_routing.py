@@ -0,0 +1,89 @@
+# test_rdsr_routing.py
+from pydicom.dataset import Dataset
+from dose_extractor import DoseExtractor
+
+
+def code(meaning, value="0", scheme="DCM"):
+    item = Dataset()
+    item.CodeValue = value
+    item.CodingSchemeDesignator = scheme
+    item.CodeMeaning = meaning
+    return item
+
+
+def numeric(meaning, number):
+    item = Dataset()
+    item.ValueType = "NUM"
+    item.ConceptNameCodeSequence = [code(meaning)]
+    measured = Dataset()
+    measured.NumericValue = f"{number:g}"
+    item.MeasuredValueSequence = [measured]
+    return item
+
+
+def coded(meaning, value):
+    item = Dataset()
+    item.ValueType = "CODE"
+    item.ConceptNameCodeSequence = [code(meaning)]
+    item.ConceptCodeSequence = [code(value)]
+    return item
+
+
+def container(meaning, children):
+    item = Dataset()
+    item.ValueType = "CONTAINER"
+    item.ConceptNameCodeSequence = [code(meaning)]
+    item.ContentSequence = children
+    return item
+
+
+def projection_rdsr(event_type, fluoro_dap=0.0, fluoro_time=0.0):
+    """Minimal X-Ray Radiation Dose SR (TID 10001) with accumulated totals and one event"""
+    ds = Dataset()
+    ds.Modality = "SR"
+    ds.SOPClassUID = "1.2.840.10008.5.1.4.1.1.88.67"
+    template = Dataset()
+    template.MappingResource = "DCMR"
+    template.TemplateIdentifier = "10001"
+    ds.ContentTemplateSequence = [template]
+    ds.ContentSequence = [
+        coded("Procedure reported", "Projection X-Ray"),
+        container("Accumulated X-Ray Dose Data", [
+            numeric("Fluoro Dose Area Product Total", fluoro_dap),
+            numeric("Acquisition Dose Area Product Total", 0.00012),
+            numeric("Total Fluoro Time", fluoro_time),
+            numeric("Dose Area Product Total", 0.00012 + fluoro_dap)
+        ]),
+        container("Irradiation Event X-Ray Data", [
+            coded("Irradiation Event Type", event_type),
+            numeric("Dose Area Product", 0.00012)
+        ])
+    ]
+    return ds
+
+
+def test_radiography_rdsr_with_zero_fluoro_totals_is_dx():
+    ds = projection_rdsr("Stationary Acquisition")
+    assert DoseExtractor().route_dicom(ds) == ("DX", "RDSR")
+
+
+def test_fluoroscopy_event_is_xa():
+    ds = projection_rdsr("Fluoroscopy")
+    assert DoseExtractor().route_dicom(ds) == ("XA", "RDSR")
+
+
+def test_nonzero_fluoro_totals_are_xa():
+    ds = projection_rdsr("Stationary Acquisition", fluoro_dap=0.0031, fluoro_time=42)
+    assert DoseExtractor().detect_rdsr_modality(ds) == "XA"
+
+
+def test_ct_template_is_ct():
+    ds = projection_rdsr("Stationary Acquisition")
+    ds.ContentTemplateSequence[0].TemplateIdentifier = "10011"
+    assert DoseExtractor().detect_rdsr_modality(ds) == "CT"
+
+
+def test_mammography_procedure_is_mg():
+    ds = projection_rdsr("Stationary Acquisition")
+    ds.ContentSequence[0] = coded("Procedure reported", "Mammography")
+    assert DoseExtractor().detect_rdsr_modality(ds) == "MG"
@@ -0,0 +1,133 @@
+# test_scan_resume.py
+import os
+import pytest
+from prefetch_benchmark import make_ct_image
+from dicom_sources import write_file_index
+from dose_extractor import DoseExtractor
+from dose_scanner import DoseScanner
+from scan_checkpoint import ScanCheckpoint, Quarantine
+
+
+@pytest.fixture
+def scan_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(DoseScanner, 'patient_index_dir', None)
+    directory = tmp_path / "data"
+    directory.mkdir()
+    for index in range(4):
+        make_ct_image(index).save_as(str(directory / f"{index:03d}.dcm"), enforce_file_format=True)
+    return str(directory)
+
+
+def make_scanner():
+    scanner = DoseScanner("CT", "IMAGE", ssde=False)
+    scanner.start_profile()
+    return scanner
+
+
+def scan(scanner, directory):
+    results = scanner.start_checkpoint(directory)
+    try:
+        results += scanner.scan_files(directory)
+    finally:
+        scanner.checkpoint.close()
+    return results
+
+
+def poison(monkeypatch, name, extracted):
+    """Make extraction of the file name raise, recording the extracted files"""
+    real_extract = DoseExtractor.extract_patient_data
+
+    def extract_patient_data(self, dcm):
+        extracted.append(os.path.basename(dcm.filename))
+        if dcm.filename.endswith(name):
+            raise ValueError("broken dose fields")
+        return real_extract(self, dcm)
+
+    monkeypatch.setattr(DoseExtractor, 'extract_patient_data', extract_patient_data)
+
+
+def test_extraction_failure_is_quarantined(scan_dir, state_dir, monkeypatch):
+    extracted = []
+    poison(monkeypatch, "002.dcm", extracted)
+    results = scan(make_scanner(), scan_dir)
+    assert len(results) == 3
+    entry = Quarantine(state_dir).entries[os.path.join(scan_dir, "002.dcm")]
+    assert entry['error'] == 'ValueError'
+
+    extracted.clear()
+    scanner = make_scanner()
+    assert len(scan(scanner, scan_dir)) == 3
+    # The poison file is not read again until it changes
+    assert "002.dcm" not in extracted
+    assert scanner.profiler.counters['quarantine_skipped'] == 1
+
+
+def test_file_index_skips_quarantined_files(scan_dir, state_dir, tmp_path):
+    paths = sorted(os.path.join(scan_dir, name) for name in os.listdir(scan_dir))
+    index_path = str(tmp_path / "index.csv")
+    write_file_index(index_path, [{'Path': path, 'Size': os.path.getsize(path), 'Modality': 'CT',
+                                   'SOPClassUID': '', 'StudyDate': '20240101'} for path in paths])
+    quarantine = Quarantine(state_dir)
+    quarantine.add(paths[1], ValueError("broken"))
+    quarantine.save()
+    scanner = make_scanner()
+    results = scan(scanner, index_path)
+    assert sorted(row['File'] for row in results) == [os.path.basename(path) for path in paths if path != paths[1]]
+    assert scanner.profiler.counters['quarantine_skipped'] == 1
+
+
+def test_file_being_read_at_a_crash_is_quarantined(scan_dir, state_dir):
+    scanner = make_scanner()
+    scanner.start_checkpoint(scan_dir)
+    crashed = os.path.join(scan_dir, "001.dcm")
+    # A crash or killed hang leaves the mark, close is never reached
+    scanner.checkpoint.begin(os.path.join(scan_dir, "000.dcm"))
+    scanner.checkpoint.begin(crashed)
+    scanner.checkpoint.file.close()
+    scanner.checkpoint.marker.close()
+
+    scanner = make_scanner()
+    results = scan(scanner, scan_dir)
+    assert sorted(row['File'] for row in results) == ["000.dcm", "002.dcm", "003.dcm"]
+    assert Quarantine(state_dir).entries[crashed]['error'] == 'ReadAborted'
+    # A scan that closes its checkpoint leaves no mark
+    assert scanner.checkpoint.aborted_source() is None
+
+
+def test_interrupted_scan_resumes(scan_dir, monkeypatch):
+    extracted = []
+    poison(monkeypatch, "no file", extracted)
+    scanner = make_scanner()
+    scanner.start_checkpoint(scan_dir)
+
+    class Interrupt(Exception):
+        pass
+
+    def sources():
+        for source in scanner.iter_dicom_files(scan_dir, None, None, None):
+            if len(extracted) == 2:
+                raise Interrupt()
+            yield source
+
+    with pytest.raises(Interrupt):
+        scanner.extract_stream(sources())
+    scanner.checkpoint.close()
+
+    scanner = make_scanner()
+    results = scanner.start_checkpoint(scan_dir, resume=True)
+    assert len(results) == 2
+    results += scanner.scan_files(scan_dir)
+    scanner.checkpoint.close()
+    assert sorted(row['File'] for row in results) == ["000.dcm", "001.dcm", "002.dcm", "003.dcm"]
+    # Files completed before the interrupt are not extracted again
+    assert sorted(extracted) == ["000.dcm", "001.dcm", "002.dcm", "003.dcm"]
+    assert scanner.profiler.counters['checkpoint_skipped'] == 2
+
+
+def test_checkpoint_without_mark_has_no_aborted_source(tmp_path):
+    checkpoint = ScanCheckpoint("key", state_dir=str(tmp_path))
+    assert checkpoint.aborted_source() is None
+    checkpoint.begin("a.dcm")
+    assert checkpoint.aborted_source() == "a.dcm"
+    checkpoint.close()
+    assert checkpoint.aborted_source() is None
@@ -0,0 +1,40 @@
+# test_ssde.py
+import math
+import numpy as np
+from ssde import largest_region, water_equivalent_diameter
+
+
+def water_cylinder(diameter_mm, size=512):
+    """Axial image in HU of a water cylinder in air, 1 mm pixels"""
+    hu = np.full((size, size), -1000.0)
+    yy, xx = np.mgrid[:size, :size]
+    hu[(yy - size / 2) ** 2 + (xx - size / 2) ** 2 < (diameter_mm / 2) ** 2] = 0
+    return hu
+
+
+def test_largest_region_keeps_4_connected_pixels():
+    mask = np.zeros((10, 10), dtype=bool)
+    mask[1:4, 1:4] = True
+    mask[6:9, :] = True
+    mask[5, 5] = True
+    mask[4, 4] = True  # touches [5, 5] only diagonally
+    region = largest_region(mask)
+    assert region.sum() == 31
+    assert region[5, 5] and not region[1, 1] and not region[4, 4]
+
+
+def test_largest_region_joins_runs_through_a_lower_row():
+    mask = np.array([[1, 0, 1],
+                     [1, 1, 1],
+                     [0, 0, 0]], dtype=bool)
+    assert largest_region(mask).sum() == 5
+
+
+def test_dw_of_water_cylinder():
+    assert math.isclose(water_equivalent_diameter(water_cylinder(300), [1, 1]), 30.0, abs_tol=0.1)
+
+
+def test_dw_leaves_out_the_table():
+    hu = water_cylinder(300)
+    hu[440:460, 50:460] = 300
+    assert math.isclose(water_equivalent_diameter(hu, [1, 1]), 30.0, abs_tol=0.1)
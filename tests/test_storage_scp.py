@@ -0,0 +1,70 @@
+# test_storage_scp.py
+import os
+import time
+import socket
+import pytest
+from synthetic_rdsr import RDSR_SOP_CLASS, make_rdsr
+
+pytest.importorskip("pynetdicom")
+from pynetdicom import AE, evt, ALL_TRANSFER_SYNTAXES
+from storage_scp import DoseStorageSCP, STATUS_SUCCESS
+from result_store import ResultStore
+from patient_index import PatientDoseIndex
+from storescu_benchmark import send_rdsrs
+
+COUNT = 100
+# Share of the throughput of a pynetdicom SCP that discards the objects, the network
+# round trips of the same machine set the pace, extraction and the writer must keep up
+MIN_THROUGHPUT_SHARE = 0.5
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def baseline_throughput(datasets):
+    """Objects per second of a pynetdicom SCP accepting and discarding the datasets"""
+    ae = AE(ae_title="DISCARD")
+    ae.add_supported_context(RDSR_SOP_CLASS, ALL_TRANSFER_SYNTAXES)
+    port = free_port()
+    server = ae.start_server(("127.0.0.1", port), block=False,
+                             evt_handlers=[(evt.EVT_C_STORE, lambda event: STATUS_SUCCESS)])
+    try:
+        start = time.perf_counter()
+        assert send_rdsrs(datasets, port, "DISCARD") == 0
+        return len(datasets) / (time.perf_counter() - start)
+    finally:
+        server.shutdown()
+
+
+def test_scp_throughput_and_pipeline(tmp_path, state_dir):
+    datasets = [make_rdsr(index) for index in range(COUNT)]
+    baseline = baseline_throughput(datasets)
+
+    port = free_port()
+    store_path = str(tmp_path / "results.db")
+    index_dir = str(tmp_path / "index")
+    scp = DoseStorageSCP(store_path, port=port, address="127.0.0.1", patient_index_dir=index_dir)
+    scp.start(block=False)
+    try:
+        start = time.perf_counter()
+        failed = send_rdsrs(datasets, port, scp.ae_title)
+    finally:
+        # Includes the final flush of the writer
+        scp.stop()
+    throughput = COUNT / (time.perf_counter() - start)
+
+    assert failed == 0
+    store = ResultStore(store_path)
+    try:
+        assert len(store.get_results("CT")) == COUNT
+    finally:
+        store.close()
+    # Batches went through the patient index stage of the store pipeline
+    assert PatientDoseIndex(index_dir).patient_studies("BENCH0000")
+    # Index keys are pseudonyms of the test's key, not of the application's
+    assert os.path.exists(os.path.join(state_dir, "pseudonym.key"))
+    assert throughput >= MIN_THROUGHPUT_SHARE * baseline, \
+        f"{throughput:.0f} objects/s, discarding SCP {baseline:.0f} objects/s"
@@ -0,0 +1,61 @@
+# test_what_if.py
+import pandas as pd
+import pytest
+from drl_config import DRLConfiguration
+from dose_scanner import DoseScanner
+from scan_checkpoint import save_results_cache, load_results_cache
+
+pytest.importorskip("openpyxl")
+pytest.importorskip("xhtml2pdf")
+
+HEAD = {'protocol_match': ['head'], 'adult': {'DLP': 1000.0, 'CTDIvol': 60.0}, 'child': {}}
+
+
+def ct_row(index, protocol="Head", dlp=800.0):
+    return {'Modality': "CT", 'DataSource': "RDSR", 'File': f"{index}.dcm", 'PatientID': f"P{index}", 'StudyDate': "20240101",
+            'CalculatedAge': 40, 'AcquisitionProtocol': protocol, 'TotalDLP': dlp, 'CTDIvol': 50.0,
+            'DeviceObserverModelName': "Scanner"}
+
+
+@pytest.fixture
+def scanner(tmp_path):
+    scanner = DoseScanner("CT", "RDSR", ssde=False)
+    scanner.drl_config = DRLConfiguration(str(tmp_path / "current"))
+    scanner.drl_config.publish("CT", {'Head': HEAD}, save=False)
+    return scanner
+
+
+@pytest.fixture
+def cache_path(tmp_path, scanner):
+    path = str(tmp_path / "results.json")
+    save_results_cache(path, [ct_row(index) for index in range(3)], scanner.scan_params())
+    return path
+
+
+def test_what_if_of_cached_results(scanner, cache_path, tmp_path):
+    proposed = DRLConfiguration(str(tmp_path / "proposed"))
+    proposed.publish("CT", {'Head': dict(HEAD, adult={'DLP': 700.0, 'CTDIvol': 40.0})}, save=False)
+    results, _ = load_results_cache(cache_path)
+    excel_path = str(tmp_path / "what_if.xlsx")
+    assert scanner.run_recompare(results, excel_path, proposed)
+    rows = pd.read_excel(excel_path, sheet_name=None)
+    assert list(rows) == ["What-if"]
+    row = rows["What-if"].iloc[0]
+    assert (row['Protocol'], row['Current DRL'], row['Proposed DRL']) == ("Head", 1000.0, 700.0)
+    assert row['Current %'] == pytest.approx(-20.0)
+    assert row['Proposed %'] == pytest.approx(14.3)
+
+
+def test_groups_failing_to_compare_are_reported(scanner, cache_path, tmp_path, capsys):
+    # A proposed protocol without adult DRLs makes the proposed comparison raise
+    proposed = DRLConfiguration(str(tmp_path / "proposed"))
+    proposed.publish("CT", {'Head': {'protocol_match': ['head'], 'child': {}}}, save=False)
+    results, _ = load_results_cache(cache_path)
+    excel_path = str(tmp_path / "what_if.xlsx")
+    assert scanner.run_recompare(results, excel_path, proposed)
+    assert "Warning: Could not compare:\nCT with the proposed DRLs (KeyError: 'adult')" in capsys.readouterr().out
+    sheets = pd.read_excel(excel_path, sheet_name=None)
+    not_compared = sheets["Not compared"]
+    assert not_compared.to_dict('records') == [{'Modality': "CT", 'DRL set': "proposed", 'Error': "KeyError: 'adult'"}]
+    # The current comparison is still reported
+    assert sheets["What-if"]['Current DRL'].tolist() == [1000.0]
@@ -1,179 +1,344 @@
 import os
 import sys
-import pydicom
+import time
+import queue
+import struct
+import threading
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import traceback
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dicom_sources import write_file_index
+
+# Nolasāmo baitu skaits: 128 baitu preambula, DICM marķieris un pirmais elements
+SNIFF_SIZE = 140
+# Failu skaits vienā pavediena uzdevumā
+CHUNK_SIZE = 256
+# Protokola atjaunošanas intervāls (ms) un rindu skaits, kas paliek logā
+FLUSH_INTERVAL = 250
+MAX_LOG_LINES = 5000
+# Explicit VR kodi, kas var būt pirmajā elementā failiem bez preambulas
+EXPLICIT_VRS = {b'AE', b'AS', b'AT', b'CS', b'DA', b'DS', b'DT', b'FL', b'FD', b'IS', b'LO', b'LT',
+                b'OB', b'OD', b'OF', b'OL', b'OW', b'PN', b'SH', b'SL', b'SQ', b'SS', b'ST', b'TM',
+                b'UC', b'UI', b'UL', b'UN', b'UR', b'US', b'UT'}
+
+
+def pool_size(file_count):
+    """Pavedienu skaits: I/O darbam vairāk par CPU skaitu, bet ne vairāk kā uzdevumu"""
+    workers = min(32, (os.cpu_count() or 1) * 4)
+    return max(1, min(workers, (file_count + CHUNK_SIZE - 1) // CHUNK_SIZE))
+
+
+def is_dicom_header(header):
+    """Pārbauda DICM marķieri vai, failiem bez preambulas, pirmā elementa struktūru"""
+    if len(header) >= 132 and header[128:132] == b'DICM':
+        return True
+    if len(header) < 8:
+        return False
+    # Fails bez preambulas sākas ar (0002,xxxx) vai (0008,xxxx) grupas elementu
+    group, element = struct.unpack('<HH', header[:4])
+    if group not in (0x0002, 0x0008) or element > 0x0100:
+        return False
+    if header[4:6] in EXPLICIT_VRS:
+        return True
+    # Implicit VR: 4 baitu garums, pirmie elementi ir īsi
+    length = struct.unpack('<I', header[4:8])[0]
+    return length < 1024
+
 
 class DICOMRenamer:
     def __init__(self, root):
         self.root = root
         self.root.title("DICOM Failu Pārdēvētājs")
         self.root.geometry("600x400")
+        self.log_queue = queue.Queue()
+        self.counters = {}
+        self.worker = None
         self.setup_ui()
-        
+
     def setup_ui(self):
         # Virsraksts
         title_label = tk.Label(self.root, text="DICOM Failu Pārdēvētājs", font=("Helvetica", 16, "bold"))
         title_label.pack(pady=10)
-        
+
         # Pamācība
         info_text = "Šī programma pārbauda visus failus izvēlētajā mapē, \n" + \
                     "identificē DICOM failus un pievieno tiem .dcm paplašinājumu."
         info_label = tk.Label(self.root, text=info_text, font=("Helvetica", 10))
         info_label.pack(pady=10)
-        
+
         # Mapes izvēle
         frame = tk.Frame(self.root)
         frame.pack(pady=10, fill=tk.X, padx=20)
-        
+
         self.folder_path = tk.StringVar()
         folder_label = tk.Label(frame, text="Izvēlētā mape:")
         folder_label.pack(side=tk.LEFT)
-        
+
         folder_entry = tk.Entry(frame, textvariable=self.folder_path, width=40)
         folder_entry.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
-        
+
         browse_button = tk.Button(frame, text="Pārlūkot", command=self.browse_folder)
         browse_button.pack(side=tk.RIGHT)
-        
+
         # Rekursīvās meklēšanas opcija
         self.recursive = tk.BooleanVar(value=True)
         recursive_check = tk.Checkbutton(self.root, text="Iekļaut apakšmapes", variable=self.recursive)
         recursive_check.pack(pady=5)
-        
+
         # Opcija pārrakstīt esošos .dcm failus
         self.overwrite = tk.BooleanVar(value=False)
         overwrite_check = tk.Checkbutton(self.root, text="Pārrakstīt esošos .dcm failus", variable=self.overwrite)
         overwrite_check.pack(pady=5)
-        
+
+        # Indeksa režīms: failus nepārdēvē, bet saraksta DICOM failus CSV indeksā
+        self.index_only = tk.BooleanVar(value=False)
+        index_check = tk.Checkbutton(self.root, text="Tikai izveidot DICOM failu indeksu (nepārdēvēt)",
+                                     variable=self.index_only)
+        index_check.pack(pady=5)
+
         # Progress
         self.progress_var = tk.StringVar(value="Gatavs darbam")
         progress_label = tk.Label(self.root, textvariable=self.progress_var)
         progress_label.pack(pady=10)
-        
+
         # Protokols
         log_label = tk.Label(self.root, text="Darbību protokols:")
         log_label.pack(anchor=tk.W, padx=20)
-        
+
         log_frame = tk.Frame(self.root)
         log_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=(0, 10))
-        
+
         self.log_text = tk.Text(log_frame, height=10, width=60)
         self.log_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        
+
         scrollbar = tk.Scrollbar(log_frame, command=self.log_text.yview)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.log_text.config(yscrollcommand=scrollbar.set)
-        
+
         # Palaišanas poga
-        start_button = tk.Button(self.root, text="Sākt pārdēvēšanu", command=self.start_renaming, 
-                                width=20, bg="#4CAF50", fg="white")
-        start_button.pack(pady=10)
-    
+        self.start_button = tk.Button(self.root, text="Sākt pārdēvēšanu", command=self.start_renaming,
+                                      width=20, bg="#4CAF50", fg="white")
+        self.start_button.pack(pady=10)
+
     def browse_folder(self):
         folder_selected = filedialog.askdirectory()
         if folder_selected:
             self.folder_path.set(folder_selected)
             self.log("Izvēlēta mape: " + folder_selected)
-    
+
     def log(self, message):
-        self.log_text.insert(tk.END, message + "\n")
-        self.log_text.see(tk.END)
-        self.root.update_idletasks()
-    
+        """Pievieno rindu protokolam; logā tā parādās nākamajā atjaunošanas reizē"""
+        self.log_queue.put(message)
+
+    def flush_log(self):
+        """Ieraksta uzkrātās protokola rindas logā vienā reizē un atjauno skaitītājus"""
+        lines = []
+        while True:
+            try:
+                lines.append(self.log_queue.get_nowait())
+            except queue.Empty:
+                break
+        if lines:
+            self.log_text.insert(tk.END, "\n".join(lines) + "\n")
+            # Logā paliek tikai pēdējās rindas
+            line_count = int(self.log_text.index('end-1c').split('.')[0])
+            if line_count > MAX_LOG_LINES:
+                self.log_text.delete('1.0', f"{line_count - MAX_LOG_LINES}.0")
+            self.log_text.see(tk.END)
+
+        counters = self.counters
+        if counters.get('total'):
+            self.progress_var.set(f"Apstrādāti {counters['processed']}/{counters['total']} faili, "
+                                  f"DICOM: {counters['dicom']}, pārdēvēti: {counters['renamed']}, "
+                                  f"kļūdas: {counters['errors']}")
+
+        if self.worker and self.worker.is_alive():
+            self.root.after(FLUSH_INTERVAL, self.flush_log)
+        elif self.worker:
+            self.worker = None
+            self.finish()
+
     def is_dicom(self, file_path):
-        """Pārbauda, vai fails ir DICOM formātā, lasot faila sākumu"""
-        try:
-            with open(file_path, 'rb') as f:
-                # Pārlecat pirmos 128 baitus un pārbaudiet DICM marķieri
-                f.seek(128)
-                dicm_marker = f.read(4)
-                if dicm_marker == b'DICM':
-                    return True
-                
-                # Ja nav standarta DICM marķiera, mēģiniet nolasīt kā DICOM failu
-                f.seek(0)
-                try:
-                    pydicom.dcmread(file_path, force=True, stop_before_pixels=True)
-                    return True
-                except:
-                    return False
-        except:
-            return False
-    
-    def rename_file(self, file_path):
-        """Pārdēvē vienu failu, pievienojot .dcm paplašinājumu, ja tas ir DICOM fails"""
-        try:
-            if self.is_dicom(file_path):
-                base, ext = os.path.splitext(file_path)
-                if ext.lower() != '.dcm':
-                    new_path = base + '.dcm'
-                    
-                    # Pārbauda, vai jau eksistē fails ar .dcm paplašinājumu
-                    if os.path.exists(new_path) and not self.overwrite.get():
-                        return f"IZLAISTS (jau eksistē): {file_path}"
-                    
-                    os.rename(file_path, new_path)
-                    return f"PĀRDĒVĒTS: {file_path} -> {new_path}"
+        """Pārbauda, vai fails ir DICOM formātā, nolasot tikai faila sākumu"""
+        with open(file_path, 'rb') as f:
+            return is_dicom_header(f.read(SNIFF_SIZE))
+
+    def check_files(self, file_paths):
+        """Pārbauda failu grupu pavedienā, atgriež (ceļš, rezultāts) sarakstu"""
+        results = []
+        for file_path in file_paths:
+            try:
+                results.append((file_path, "dicom" if self.is_dicom(file_path) else "not_dicom"))
+            except OSError as e:
+                results.append((file_path, f"error: {str(e)}"))
+        return results
+
+    def plan_renames(self, results, overwrite):
+        """Sastāda pārdēvēšanas sarakstu no visiem pārbaudes rezultātiem"""
+        renames = []
+        targets = set()
+        for file_path, status in results:
+            if status.startswith("error"):
+                self.counters['errors'] += 1
+                self.log(f"KĻŪDA lasot {file_path}: {status[7:]}")
+                continue
+            if status != "dicom":
+                continue
+            self.counters['dicom'] += 1
+            base, ext = os.path.splitext(file_path)
+            if ext.lower() == '.dcm':
+                continue
+            new_path = base + '.dcm'
+            # Divi faili ar vienādu nosaukumu bez paplašinājuma nedrīkst pārrakstīt viens otru
+            if new_path in targets or (os.path.exists(new_path) and not overwrite):
+                self.log(f"IZLAISTS (jau eksistē): {file_path}")
+                continue
+            targets.add(new_path)
+            renames.append((file_path, new_path))
+        return renames
+
+    def apply_renames(self, renames):
+        """Pārdēvē visus failus vienā piegājienā"""
+        for file_path, new_path in renames:
+            try:
+                os.replace(file_path, new_path)
+                self.counters['renamed'] += 1
+                self.log(f"PĀRDĒVĒTS: {file_path} -> {new_path}")
+            except OSError as e:
+                self.counters['errors'] += 1
+                self.log(f"KĻŪDA pārdēvējot {file_path}: {str(e)}")
+
+    def read_index_rows(self, file_paths):
+        """Nolasa DICOM failu galvenes indeksam pavedienā, atgriež (rinda vai None, kļūda) sarakstu"""
+        import pydicom
+        results = []
+        for file_path in file_paths:
+            try:
+                dcm = pydicom.dcmread(file_path, stop_before_pixels=True, force=True,
+                                      specific_tags=['Modality', 'SOPClassUID', 'StudyDate'])
+                results.append(({
+                    'Path': os.path.abspath(file_path),
+                    'Size': os.path.getsize(file_path),
+                    'Modality': dcm.get('Modality', ''),
+                    'SOPClassUID': str(dcm.get('SOPClassUID', '')),
+                    'StudyDate': dcm.get('StudyDate', '')
+                }, None))
+            except Exception as e:
+                results.append((None, f"KĻŪDA lasot {file_path}: {str(e)}"))
+        return results
+
+    def write_index(self, results, index_path, executor):
+        """Izveido DICOM failu indeksu, failus nepārdēvējot"""
+        dicom_files = []
+        for file_path, status in results:
+            if status == "dicom":
+                dicom_files.append(file_path)
+            elif status.startswith("error"):
+                self.counters['errors'] += 1
+                self.log(f"KĻŪDA lasot {file_path}: {status[7:]}")
+        self.counters['dicom'] = len(dicom_files)
+        chunks = [dicom_files[i:i + CHUNK_SIZE] for i in range(0, len(dicom_files), CHUNK_SIZE)]
+        rows = []
+        for chunk_results in executor.map(self.read_index_rows, chunks):
+            for row, error in chunk_results:
+                if row:
+                    rows.append(row)
                 else:
-                    return f"JAU DCM: {file_path}"
-            else:
-                return f"NAV DICOM: {file_path}"
+                    self.counters['errors'] += 1
+                    self.log(error)
+        write_file_index(index_path, rows)
+        self.counters['indexed'] = len(rows)
+        self.log(f"Indekss saglabāts: {index_path}")
+
+    def collect_files(self, folder, recursive):
+        """Savāc visus mapes failus"""
+        if recursive:
+            return [os.path.join(root, filename)
+                    for root, _, files in os.walk(folder) for filename in files]
+        return [os.path.join(folder, f) for f in os.listdir(folder)
+                if os.path.isfile(os.path.join(folder, f))]
+
+    def run(self, folder, recursive, overwrite, index_path=None):
+        """Darba pavediens: failu meklēšana, pārbaude un pārdēvēšana vai indeksēšana"""
+        try:
+            start = time.perf_counter()
+            all_files = self.collect_files(folder, recursive)
+            total_files = len(all_files)
+            self.log(f"Atrasti {total_files} faili pārbaudei")
+            self.counters['total'] = total_files
+
+            # Vispirms pārbauda visus failus, tad pārdēvē vienā piegājienā
+            chunks = [all_files[i:i + CHUNK_SIZE] for i in range(0, total_files, CHUNK_SIZE)]
+            results = []
+            with ThreadPoolExecutor(max_workers=pool_size(total_files)) as executor:
+                for chunk_results in executor.map(self.check_files, chunks):
+                    results.extend(chunk_results)
+                    self.counters['processed'] += len(chunk_results)
+                if index_path:
+                    self.write_index(results, index_path, executor)
+
+            if not index_path:
+                renames = self.plan_renames(results, overwrite)
+                self.apply_renames(renames)
+            self.counters['seconds'] = time.perf_counter() - start
         except Exception as e:
-            return f"KĻŪDA pārdēvējot {file_path}: {str(e)}"
+            self.log(f"KĻŪDA: {str(e)}")
+            self.log(traceback.format_exc())
 
     def start_renaming(self):
         folder = self.folder_path.get()
         if not folder or not os.path.isdir(folder):
             messagebox.showerror("Kļūda", "Lūdzu, izvēlieties derīgu mapi!")
             return
-        
-        self.log("=== Sākam DICOM failu meklēšanu un pārdēvēšanu ===")
+        if self.worker:
+            return
+        index_path = None
+        if self.index_only.get():
+            index_path = filedialog.asksaveasfilename(defaultextension=".csv", initialfile="dicom_index.csv",
+                                                      filetypes=[("CSV files", "*.csv")])
+            if not index_path:
+                return
+
+        self.log("=== Sākam DICOM failu meklēšanu un pārdēvēšanu ===" if not index_path
+                 else "=== Sākam DICOM failu meklēšanu un indeksēšanu ===")
         self.progress_var.set("Darbojas: notiek failu meklēšana...")
-        
-        # Savākt visus failus
-        all_files = []
-        if self.recursive.get():
-            for root, _, files in os.walk(folder):
-                for filename in files:
-                    all_files.append(os.path.join(root, filename))
-        else:
-            all_files = [os.path.join(folder, f) for f in os.listdir(folder) 
-                        if os.path.isfile(os.path.join(folder, f))]
-        
-        total_files = len(all_files)
-        self.log(f"Atrasti {total_files} faili pārbaudei")
-        
-        # Izmantojam vairākus pavedienus, lai paātrinātu procesu
-        processed = 0
-        dicom_files = 0
-        renamed_files = 0
-        
-        with ThreadPoolExecutor(max_workers=min(10, os.cpu_count() + 4)) as executor:
-            future_to_file = {executor.submit(self.rename_file, file): file for file in all_files}
-            
-            for future in as_completed(future_to_file):
-                processed += 1
-                result = future.result()
-                self.log(result)
-                
-                if "PĀRDĒVĒTS" in result:
-                    renamed_files += 1
-                    dicom_files += 1
-                elif "JAU DCM" in result:
-                    dicom_files += 1
-                
-                self.progress_var.set(f"Apstrādāti {processed}/{total_files} faili")
-        
+        self.start_button.config(state=tk.DISABLED)
+        self.counters = {'total': 0, 'processed': 0, 'dicom': 0, 'renamed': 0, 'indexed': 0,
+                         'errors': 0, 'seconds': 0.0, 'index_path': index_path}
+
+        # Tk mainīgos nolasa galvenajā pavedienā, darbs notiek fonā
+        self.worker = threading.Thread(target=self.run,
+                                       args=(folder, self.recursive.get(), self.overwrite.get(), index_path),
+                                       daemon=True)
+        self.worker.start()
+        self.root.after(FLUSH_INTERVAL, self.flush_log)
+
+    def finish(self):
+        """Kopsavilkums pēc darba pavediena beigām"""
+        counters = self.counters
         self.log(f"=== PABEIGTS ===")
-        self.log(f"Kopā apstrādāti faili: {total_files}")
-        self.log(f"Atrasti DICOM faili: {dicom_files}")
-        self.log(f"Pārdēvēti faili: {renamed_files}")
-        
-        self.progress_var.set(f"Gatavs: pārdēvēti {renamed_files} faili")
-        messagebox.showinfo("Pabeigts", f"Pārdēvēšana pabeigta!\nAtrasti {dicom_files} DICOM faili\nPārdēvēti {renamed_files} faili")
+        self.log(f"Kopā apstrādāti faili: {counters['total']}")
+        self.log(f"Atrasti DICOM faili: {counters['dicom']}")
+        if counters['index_path']:
+            self.log(f"Indeksēti faili: {counters['indexed']}")
+        else:
+            self.log(f"Pārdēvēti faili: {counters['renamed']}")
+        self.log(f"Kļūdas: {counters['errors']}")
+        self.log(f"Laiks: {counters['seconds']:.1f} s")
+        self.flush_log()
+
+        self.start_button.config(state=tk.NORMAL)
+        if counters['index_path']:
+            self.progress_var.set(f"Gatavs: indeksēti {counters['indexed']} faili")
+            messagebox.showinfo("Pabeigts", f"Indeksēšana pabeigta!\nAtrasti {counters['dicom']} DICOM faili\n"
+                                            f"Indekss: {counters['index_path']}")
+        else:
+            self.progress_var.set(f"Gatavs: pārdēvēti {counters['renamed']} faili")
+            messagebox.showinfo("Pabeigts", f"Pārdēvēšana pabeigta!\nAtrasti {counters['dicom']} DICOM faili\n"
+                                            f"Pārdēvēti {counters['renamed']} faili")
 
 def main():
     root = tk.Tk()
@@ -181,4 +346,4 @@ def main():
     root.mainloop()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
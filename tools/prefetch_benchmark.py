@@ -0,0 +1,136 @@
+"""Measure scan time of a network share stand-in with and without header read-ahead
+
+Usage: python tools/prefetch_benchmark.py [count] [open latency ms] [block latency ms]
+
+Writes synthetic CT images to a local temporary directory and wraps open() of
+its files so every open and every first read of a 64 KiB block sleeps like a
+round trip to an SMB/NFS server. The scan (file search streamed into
+extraction) runs for several read-ahead depths.
+"""
+import os
+import sys
+import time
+import builtins
+import tempfile
+import numpy as np
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, CTImageStorage, generate_uid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dose_scanner import DoseScanner
+
+DEPTHS = (0, 2, 8, 32)
+BLOCK_SIZE = 64 * 1024
+
+
+def make_ct_image(index):
+    """Build a 512 x 512 CT image with the dose fields of the field spec"""
+    ds = Dataset()
+    ds.file_meta = FileMetaDataset()
+    ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds.file_meta.MediaStorageSOPClassUID = CTImageStorage
+    ds.file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    ds.SOPClassUID = CTImageStorage
+    ds.SOPInstanceUID = ds.file_meta.MediaStorageSOPInstanceUID
+    ds.Modality = "CT"
+    ds.PatientID = f"BENCH{index % 100:03d}"
+    ds.PatientName = "Bench^Patient"
+    ds.StudyDate = "20240101"
+    ds.StudyInstanceUID = f"1.2.826.0.1.3680043.10.{index // 50}"
+    ds.SeriesInstanceUID = f"1.2.826.0.1.3680043.10.{index // 50}.1"
+    ds.ProtocolName = "Head"
+    ds.KVP = 120
+    ds.CTDIvol = 50 + index % 20
+    ds.SliceLocation = index % 50
+    ds.Rows = ds.Columns = 512
+    ds.BitsAllocated = ds.BitsStored = 16
+    ds.HighBit = 15
+    ds.PixelRepresentation = 0
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.PixelData = np.zeros((512, 512), dtype=np.uint16).tobytes()
+    return ds
+
+
+class LatentFile:
+    """Binary file whose open and first read of each block wait like a network round trip"""
+    def __init__(self, f, block_latency):
+        self.f = f
+        self.block_latency = block_latency
+        self.blocks = set()
+
+    def wait(self, start, size):
+        first, last = start // BLOCK_SIZE, (start + max(size, 1) - 1) // BLOCK_SIZE
+        missing = [block for block in range(first, last + 1) if block not in self.blocks]
+        if missing:
+            time.sleep(self.block_latency)
+            self.blocks.update(missing)
+
+    def read(self, size=-1):
+        start = self.f.tell()
+        data = self.f.read(size)
+        self.wait(start, len(data))
+        return data
+
+    def readinto(self, buffer):
+        start = self.f.tell()
+        count = self.f.readinto(buffer)
+        self.wait(start, count or 0)
+        return count
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.f.close()
+
+
+def inject_latency(directory, open_latency, block_latency):
+    """Replace open() so files under directory behave like a network share"""
+    real_open = builtins.open
+    prefix = os.path.abspath(directory) + os.sep
+
+    def latent_open(file, mode='r', *args, **kwargs):
+        f = real_open(file, mode, *args, **kwargs)
+        if isinstance(file, str) and 'b' in mode and 'r' in mode and os.path.abspath(file).startswith(prefix):
+            time.sleep(open_latency)
+            return LatentFile(f, block_latency)
+        return f
+    builtins.open = latent_open
+    return real_open
+
+
+def run_scan(directory, depth):
+    scanner = DoseScanner("CT", "IMAGE", ssde=False)
+    DoseScanner.patient_index_dir = None
+    DoseScanner.prefetch_default_depth = depth
+    start = time.perf_counter()
+    results = scanner.scan_files(directory)
+    return len(results), time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    open_latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 5.0) / 1000
+    block_latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 2.0) / 1000
+    directory = tempfile.mkdtemp()
+    for index in range(count):
+        make_ct_image(index).save_as(os.path.join(directory, f"{index:05d}.dcm"), enforce_file_format=True)
+    inject_latency(directory, open_latency, block_latency)
+
+    print(f"{count} CT images, open latency {open_latency * 1000:g} ms, "
+          f"block latency {block_latency * 1000:g} ms")
+    baseline = None
+    for depth in DEPTHS:
+        results, total = run_scan(directory, depth)
+        if results != count:
+            sys.exit(f"Depth {depth}: extracted {results} of {count} files")
+        baseline = baseline or total
+        print(f"  depth {depth:>2}: scan {total:6.2f} s, {count / total:7.0f} files/s, x{baseline / total:.1f}")
+
+
+if __name__ == "__main__":
+    main()
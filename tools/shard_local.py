@@ -0,0 +1,59 @@
+"""Run a sharded scan on this machine: manifest, one worker process per shard, merge
+
+Usage: python tools/shard_local.py [shards] [directory]
+
+Without a directory, synthetic CT RDSRs are written to the shared temp directory
+first. Manifest, partial results and the merged reports are kept in it.
+"""
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(TOOLS_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, TOOLS_DIR)
+from shard_scan import write_manifest, merge_partials
+
+
+def write_synthetic_rdsrs(directory, count=200):
+    """Write synthetic CT RDSRs into a few subdirectories"""
+    from synthetic_rdsr import make_rdsr
+    for index in range(count):
+        subdirectory = os.path.join(directory, f"volume{index % 3}")
+        os.makedirs(subdirectory, exist_ok=True)
+        ds = make_rdsr(index)
+        ds.file_meta.MediaStorageSOPClassUID = ds.SOPClassUID
+        ds.file_meta.MediaStorageSOPInstanceUID = ds.SOPInstanceUID
+        ds.save_as(os.path.join(subdirectory, f"rdsr_{index:05d}.dcm"), write_like_original=False)
+
+
+def main():
+    shards = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    work_dir = tempfile.mkdtemp(prefix="dose_shards_")
+    if len(sys.argv) > 2:
+        directory = sys.argv[2]
+    else:
+        directory = os.path.join(work_dir, "archive")
+        write_synthetic_rdsrs(directory)
+    manifest_path = os.path.join(work_dir, "manifest.json")
+
+    start = time.perf_counter()
+    write_manifest([directory], shards, manifest_path)
+    # Workers run from the repository like main.py, for drl_configs and the shared scan_state
+    workers = [subprocess.Popen([sys.executable, os.path.join(ROOT_DIR, "main.py"),
+                                 "--manifest", manifest_path, "--shard", str(index)], cwd=ROOT_DIR)
+               for index in range(shards)]
+    failed = [index for index, worker in enumerate(workers) if worker.wait() != 0]
+    if failed:
+        sys.exit(f"Shard workers {failed} failed")
+    merged = merge_partials(manifest_path, os.path.join(work_dir, "DICOM_Dose_merged.xlsx"))
+    print(f"{shards} shards in {time.perf_counter() - start:.2f} s, results in {work_dir}")
+    if not merged:
+        sys.exit("No results to merge")
+
+
+if __name__ == "__main__":
+    main()
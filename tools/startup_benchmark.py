@@ -0,0 +1,66 @@
+"""Measure GUI module import time with python -X importtime
+
+Usage: python tools/startup_benchmark.py [runs]
+
+Imports main.py in fresh interpreters and reports the cumulative import time
+of main and its slowest imports, then the time the heavy modules loaded on
+first use (or by the background warm-up) would add if imported eagerly.
+"""
+import os
+import sys
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("tkcalendar", "pydicom", "pandas", "xhtml2pdf.pisa")
+
+
+def import_times(statement):
+    """Run statement with -X importtime, returns {(depth, module): cumulative microseconds}"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            cwd=ROOT_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented by two spaces per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth <= 1:
+            times[(depth, name.strip())] = int(cumulative)
+    return times
+
+
+def best_of(statement, runs):
+    """Lowest cumulative times of several runs, the first run also warms the file cache"""
+    best = {}
+    for _ in range(runs):
+        for name, value in import_times(statement).items():
+            best[name] = min(value, best.get(name, value))
+    return best
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    startup = best_of("import main", runs)
+    total = startup[(0, "main")]
+    print(f"import main: {total / 1000:.1f} ms (best of {runs})")
+    nested = [(name, value) for (depth, name), value in startup.items() if depth == 1]
+    for name, value in sorted(nested, key=lambda item: -item[1])[:10]:
+        print(f"  {name:<30} {value / 1000:>8.1f} ms")
+
+    print("\nDeferred modules (loaded on first use or by the background warm-up):")
+    for module in HEAVY_MODULES:
+        try:
+            times = best_of(f"import main, {module}", runs)
+        except RuntimeError as e:
+            print(f"  {module:<30} not available ({e})")
+            continue
+        added = sum(value for (depth, _), value in times.items() if depth == 0) \
+            - sum(value for (depth, _), value in startup.items() if depth == 0)
+        print(f"  {module:<30} {added / 1000:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Measure storage SCP throughput by sending synthetic CT RDSRs from a local pynetdicom SCU
+
+Usage: python tools/storescu_benchmark.py [count] [port]
+"""
+import os
+import sys
+import time
+import tempfile
+from pydicom.uid import ExplicitVRLittleEndian
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TOOLS_DIR))
+sys.path.insert(0, TOOLS_DIR)
+import pseudonymize
+from storage_scp import DoseStorageSCP
+from result_store import ResultStore
+from synthetic_rdsr import RDSR_SOP_CLASS, make_rdsr
+
+
+def send_rdsrs(datasets, port, ae_title):
+    """Send datasets over one association, returns the number of failed C-STOREs or None"""
+    from pynetdicom import AE
+    ae = AE(ae_title="BENCHSCU")
+    ae.add_requested_context(RDSR_SOP_CLASS, ExplicitVRLittleEndian)
+    assoc = ae.associate("127.0.0.1", port, ae_title=ae_title)
+    if not assoc.is_established:
+        return None
+    failed = 0
+    for ds in datasets:
+        status = assoc.send_c_store(ds)
+        if not status or status.Status != 0x0000:
+            failed += 1
+    assoc.release()
+    return failed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 11113
+    work_dir = tempfile.mkdtemp()
+    store_path = os.path.join(work_dir, "benchmark.db")
+    # Synthetic patients stay out of the patient index and pseudonym key of the installation
+    pseudonymize.SECRET_PATH = os.path.join(work_dir, "pseudonym.key")
+    datasets = [make_rdsr(i) for i in range(count)]
+
+    scp = DoseStorageSCP(store_path, port=port, address="127.0.0.1",
+                         patient_index_dir=os.path.join(work_dir, "patient_index"))
+    scp.start(block=False)
+
+    start = time.perf_counter()
+    failed = send_rdsrs(datasets, port, scp.ae_title)
+    if failed is None:
+        scp.stop()
+        sys.exit("Association with the storage SCP failed")
+    sent = time.perf_counter() - start
+    scp.stop()
+    total = time.perf_counter() - start
+
+    store = ResultStore(store_path)
+    stored = len(store.get_results("CT"))
+    store.close()
+    print(f"Sent {count} RDSRs in {sent:.2f} s ({count / sent:.0f} objects/s), {failed} failed")
+    print(f"Stored {stored} results, {total:.2f} s including final flush")
+    if stored != count - failed:
+        sys.exit("Stored result count does not match sent objects")
+
+
+if __name__ == "__main__":
+    main()
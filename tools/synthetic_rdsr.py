@@ -0,0 +1,51 @@
+"""Synthetic CT RDSRs for the benchmarks and tests, needs pydicom only"""
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+RDSR_SOP_CLASS = "1.2.840.10008.5.1.4.1.1.88.67"
+
+
+def code_item(value, meaning, scheme="DCM"):
+    code = Dataset()
+    code.CodeValue = value
+    code.CodingSchemeDesignator = scheme
+    code.CodeMeaning = meaning
+    return code
+
+
+def numeric_item(value, meaning, number):
+    item = Dataset()
+    item.ValueType = "NUM"
+    item.ConceptNameCodeSequence = [code_item(value, meaning)]
+    measured = Dataset()
+    measured.NumericValue = str(number)
+    item.MeasuredValueSequence = [measured]
+    return item
+
+
+def make_rdsr(index):
+    """Build a minimal CT RDSR with protocol and one irradiation event"""
+    ds = Dataset()
+    ds.file_meta = FileMetaDataset()
+    ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds.SOPClassUID = RDSR_SOP_CLASS
+    ds.SOPInstanceUID = generate_uid()
+    ds.StudyInstanceUID = generate_uid()
+    ds.SeriesInstanceUID = generate_uid()
+    ds.Modality = "SR"
+    ds.PatientID = f"BENCH{index % 1000:04d}"
+    ds.PatientName = "Bench^Patient"
+    ds.StudyDate = "20240101"
+    ds.Manufacturer = "Bench"
+
+    protocol = Dataset()
+    protocol.ValueType = "TEXT"
+    protocol.ConceptNameCodeSequence = [code_item("125203", "Acquisition Protocol")]
+    protocol.TextValue = "Head"
+    acquisition = Dataset()
+    acquisition.ValueType = "CONTAINER"
+    acquisition.ConceptNameCodeSequence = [code_item("113819", "CT Acquisition")]
+    acquisition.ContentSequence = [numeric_item("113830", "Mean CTDIvol", 50 + index % 20),
+                                   numeric_item("113838", "DLP", 800 + index % 400)]
+    ds.ContentSequence = [protocol, acquisition]
+    return ds
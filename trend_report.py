@@ -0,0 +1,143 @@
+# trend_report.py
+import os
+import time
+from datetime import datetime
+from html import escape
+import pandas as pd
+from xhtml2pdf import pisa
+from result_store import ResultStore
+from dose_stats import DRL_KEYS
+
+# Number of protocol/device series with most exams drawn as charts
+TREND_CHART_SERIES = 10
+
+TREND_COLUMNS = ['Protocol', 'Device', 'Month', 'Exams', 'Median', 'Mean', 'P75', 'Min', 'Max']
+
+
+def month_from_date(value):
+    """Convert DD.MM.YYYY date option to YYYY-MM month, '' if not set"""
+    if not value:
+        return ''
+    day, month, year = value.split('.')
+    return f"{year}-{int(month):02d}"
+
+
+def load_trend(store_path, modality, month_from=None, month_to=None):
+    """Read the monthly rollups of a modality into a trend table"""
+    store = ResultStore(store_path)
+    try:
+        rollups = store.get_rollups(modality, month_from, month_to)
+    finally:
+        store.close()
+    rows = [[protocol, device, month, stats.count, stats.quantile(0.5), stats.mean,
+             stats.quantile(0.75), stats.minimum, stats.maximum]
+            for protocol, device, month, stats in rollups]
+    return pd.DataFrame(rows, columns=TREND_COLUMNS).round(2)
+
+
+def top_series(trend):
+    """Get (protocol, device) series with most exams, most frequent first"""
+    exams = trend.groupby(['Protocol', 'Device'])['Exams'].sum().sort_values(ascending=False)
+    return list(exams.index[:TREND_CHART_SERIES])
+
+
+def write_trend_excel(trend, excel_path):
+    """Write trend table and a median per month line chart of the top series"""
+    from openpyxl.chart import LineChart, Reference
+    series = top_series(trend)
+    medians = trend.pivot(index='Month', columns=['Protocol', 'Device'], values='Median')
+    medians = medians.reindex(columns=series).sort_index()
+    medians.columns = [f"{protocol} / {device}" for protocol, device in series]
+
+    with pd.ExcelWriter(excel_path, engine='openpyxl') as writer:
+        trend.to_excel(writer, sheet_name="Trend", index=False)
+        medians.to_excel(writer, sheet_name="Median")
+        if len(medians):
+            sheet = writer.sheets["Median"]
+            chart = LineChart()
+            chart.title = "Mediana pa menesiem"
+            chart.x_axis.title = "Menesis"
+            chart.width, chart.height = 30, 15
+            chart.add_data(Reference(sheet, min_col=2, max_col=len(medians.columns) + 1,
+                                     min_row=1, max_row=len(medians) + 1), titles_from_data=True)
+            chart.set_categories(Reference(sheet, min_col=1, min_row=2, max_row=len(medians) + 1))
+            sheet.add_chart(chart, f"{chr(ord('A') + min(len(medians.columns) + 2, 25))}2")
+
+
+def build_trend_chart(rows, drl_level=None):
+    """Build HTML bar chart of the monthly medians of one series"""
+    scale = max([row.Median for row in rows.itertuples()] + [drl_level or 0]) or 1
+    html = '<table class="chart">'
+    for row in rows.itertuples():
+        width = max(int(row.Median / scale * 100), 1)
+        over = drl_level and row.Median > drl_level
+        html += f"""
+            <tr>
+                <td class="month">{row.Month}</td>
+                <td><div class="bar{' over' if over else ''}" style="width: {width}%;">&nbsp;</div></td>
+                <td class="value">{row.Median:.1f}</td>
+            </tr>"""
+    return html + "</table>"
+
+
+def write_trend_pdf(trend, pdf_path, modality, drl_config=None):
+    """Write trend report with a chart of each top series and the full table"""
+    html = f"""
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <title>DICOM Dose Trend</title>
+        <style>
+            body {{ font-family: Arial, sans-serif; }}
+            h1 {{ text-align: center; }}
+            table {{ width: 100%; border-collapse: collapse; margin: 10px 0; }}
+            th, td {{ border: 1px solid #000; padding: 3px; text-align: left; }}
+            th {{ background-color: #f2f2f2; }}
+            table.chart td {{ border: none; padding: 1px; }}
+            td.month {{ width: 15%; }}
+            td.value {{ width: 15%; text-align: right; }}
+            .bar {{ background-color: #4682B4; }}
+            .over {{ background-color: #FFB6C6; }}
+        </style>
+    </head>
+    <body>
+        <h1>DICOM Dozu Tendences</h1>
+        <p><strong>Modalitate:</strong> {modality}</p>
+        <p><strong>Datums:</strong> {datetime.now().strftime("%d.%m.%Y %H:%M")}</p>
+        <hr>
+    """
+    series = trend.groupby(['Protocol', 'Device'])
+    for protocol, device in top_series(trend):
+        drl_level = None
+        if drl_config is not None:
+            drl_protocol, drl_data = drl_config.get_matching_protocol(modality, protocol)
+            if drl_data:
+                drl_level = drl_data.get('adult', drl_data).get(DRL_KEYS.get(modality))
+        html += f"<h3>{escape(protocol)} / {escape(device)}</h3>"
+        if drl_level:
+            html += f"<p>DRL: {drl_level}</p>"
+        html += build_trend_chart(series.get_group((protocol, device)), drl_level)
+
+    html += "<h2>Menesu kopsavilkums</h2><table><tr>"
+    html += "".join(f"<th>{column}</th>" for column in TREND_COLUMNS) + "</tr>"
+    for row in trend.itertuples(index=False):
+        html += "<tr>" + "".join(f"<td>{escape(str(value))}</td>" for value in row) + "</tr>"
+    html += "</table></body></html>"
+
+    with open(pdf_path, "wb") as output_file:
+        pisa.CreatePDF(src=html, dest=output_file, encoding='utf-8')
+
+
+def write_trend_report(store_path, modality, excel_path, month_from=None, month_to=None,
+                       drl_config=None, debug=False):
+    """Write Excel and PDF trend reports from the monthly rollups of the result store"""
+    start = time.perf_counter()
+    trend = load_trend(store_path, modality, month_from, month_to)
+    if debug:
+        print(f"DEBUG: Loaded {len(trend)} monthly rollups in {time.perf_counter() - start:.3f} s")
+    write_trend_excel(trend, excel_path)
+    pdf_path = os.path.splitext(excel_path)[0] + ".pdf"
+    write_trend_pdf(trend, pdf_path, modality, drl_config)
+    if debug:
+        print(f"DEBUG: Trend report written in {time.perf_counter() - start:.3f} s")
+    return pdf_path